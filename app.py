@@ -3,6 +3,7 @@ AI MASTER MENTOR v7
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 엔진: OpenRouter (무료 최강 모델 — DeepSeek R1 등)
 실행: streamlit run app.py --server.address=0.0.0.0 --server.port=8501
+배치: python -m app batch questions.jsonl answers.jsonl  (화면 없이 — batch.py 참고)
 
 .env 파일 설정:
   OPENROUTER_API_KEY_1=sk-or-...
@@ -16,13 +17,46 @@ Streamlit Cloud Secrets:
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
 
-import os, time
+import time
+_RUN_T0 = time.perf_counter()  # 스크립트 실행 시작 — 첫 화면 표시 시간 측정용
+
+import os, sys, functools, hashlib, importlib, logging
 import streamlit as st
-from streamlit_mic_recorder import speech_to_text
 from dotenv import load_dotenv
-from openai import OpenAI
+# openai · httpx · streamlit_mic_recorder 는 무거워서 처음 쓸 때 lazy_import
+
+from context import (
+    build_messages, fallback_summary, fold_point, history_budget, precount, summary_request,
+)
+from followups import Prefetcher, parse_suggestions
+from memory import SessionMemory
+from engine import (
+    ADAPTIVE_ROUTING, HEDGE_FANOUT, RATE_LIMIT, REASONING_DISPLAY, Engine, format_wait,
+)
+from response_cache import ResponseCache
+from store import ConversationStore, new_conversation_id, valid_conversation_id
+from health import key_fingerprint
 
 load_dotenv()
+log = logging.getLogger("mentor")
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ── 시작 시간 측정 ───────────────────────────────────────────
+@st.cache_resource
+def startup_timings() -> dict:
+    """프로세스 단위 측정값 — 모듈 첫 import 시간, 콜드 스타트 첫 실행"""
+    return {}
+
+
+def lazy_import(module: str):
+    """무거운 모듈은 처음 쓰는 시점에 import하고 걸린 시간을 기록"""
+    if module in sys.modules:
+        return sys.modules[module]
+    t0  = time.perf_counter()
+    mod = importlib.import_module(module)
+    startup_timings()[f"import {module}"] = time.perf_counter() - t0
+    return mod
 
 # ══════════════════════════════════════════════════════════════
 #  ✏️  MASTER PROMPT — 페르소나를 바꾸려면 여기를 수정하세요
@@ -53,54 +87,9 @@ SYSTEM_PROMPT = """
 
 # ══════════════════════════════════════════════════════════════
 #  OPENROUTER 설정
-#  무료 모델 목록 — :free 태그 = 크레딧 차감 없음
+#  요청 엔진(모델 카탈로그 · Key/Model 로테이션 · 헬스 · 라우팅 · 요청 한도 · 지표)은 engine.py,
+#  설정 환경 변수도 그쪽에 있다.
 # ══════════════════════════════════════════════════════════════
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
-
-# 혹시 API 조회 실패할 경우를 대비한 하드코딩 백업 목록
-FALLBACK_MODELS = [
-    "meta-llama/llama-3.3-70b-instruct:free",
-    "qwen/qwen-2.5-72b-instruct:free",
-    "google/gemma-3-12b-it:free",
-    "mistralai/mistral-7b-instruct:free",
-    "nousresearch/hermes-3-llama-3.1-8b:free",
-]
-
-@st.cache_data(ttl=3600)  # 1시간마다 갱신
-def fetch_free_models(api_key: str) -> list:
-    """OpenRouter에서 현재 실제로 사용 가능한 무료 모델 목록을 가져옴"""
-    try:
-        import requests
-        resp = requests.get(
-            "https://openrouter.ai/api/v1/models",
-            headers={"Authorization": f"Bearer {api_key}"},
-            timeout=10,
-        )
-        if resp.status_code != 200:
-            return FALLBACK_MODELS
-        data = resp.json().get("data", [])
-        # :free 모델만 필터링, context 길이 큰 순서로 정렬
-        free_models = [
-            m["id"] for m in data
-            if m["id"].endswith(":free") and m.get("context_length", 0) > 0
-        ]
-        # 선호 모델 우선 정렬 (있으면 앞으로)
-        preferred = ["llama-3.3-70b", "deepseek", "qwen-2.5-72b", "gemma-3"]
-        def sort_key(mid):
-            for i, p in enumerate(preferred):
-                if p in mid:
-                    return i
-            return len(preferred)
-        free_models.sort(key=sort_key)
-        return free_models[:10] if free_models else FALLBACK_MODELS
-    except Exception:
-        return FALLBACK_MODELS
-
-def get_models() -> list:
-    if API_KEYS:
-        return fetch_free_models(API_KEYS[0])
-    return FALLBACK_MODELS
-
 def load_api_keys() -> list:
     """Streamlit Secrets → .env 순서로 키 로드"""
     keys = []
@@ -119,80 +108,133 @@ def load_api_keys() -> list:
     return keys
 
 API_KEYS = load_api_keys()
+KEY_IDS  = [key_fingerprint(k) for k in API_KEYS]  # 헬스 레지스트리용 Key 식별자
 
 
-def call_openrouter(messages: list) -> tuple[str, str]:
-    """
-    OpenRouter API 호출 + 자동 Key/Model 로테이션.
-    사용 가능한 무료 모델을 API에서 실시간으로 가져와 사용.
-    Returns: (answer, error)
-    """
-    if not API_KEYS:
-        return "", "API Key가 설정되지 않았습니다."
+@st.cache_resource  # 프로세스 전체 세션이 공유 — 한 세션의 429가 모두의 왕복을 아낌
+def get_engine() -> Engine:
+    """프로세스 공용 요청 엔진 (openai · httpx import 시간은 startup_timings에 기록)"""
+    return Engine(API_KEYS, importer=lazy_import)
 
-    models       = get_models()  # 실시간 무료 모델 목록
-    total_keys   = len(API_KEYS)
-    total_models = len(models)
-    total_tries  = total_keys * total_models
 
-    for attempt in range(total_tries):
-        ki = st.session_state.key_idx   % total_keys
-        mi = st.session_state.model_idx % total_models
+def get_catalog():
+    return get_engine().catalog
 
-        current_key   = API_KEYS[ki]
-        current_model = models[mi]
+def get_health():
+    return get_engine().health
 
-        try:
-            client = OpenAI(
-                api_key  = current_key,
-                base_url = OPENROUTER_BASE_URL,
-            )
-            resp = client.chat.completions.create(
-                model      = current_model,
-                messages   = messages,
-                max_tokens = 4096,
-                temperature= 0.7,
-                extra_headers={
-                    "HTTP-Referer": "https://ai-master-mentor.streamlit.app",
-                    "X-Title": "AI Master Mentor",
-                },
-            )
-            return resp.choices[0].message.content, ""
-
-        except Exception as e:
-            err = str(e)
-
-            # 404: 모델 없음 → 즉시 다음 모델로
-            if "404" in err:
-                st.session_state.model_idx += 1
-                mi = st.session_state.model_idx % total_models
-                st.toast(f"모델 전환 → {models[mi].split('/')[-1]}", icon="🔄")
-                if attempt < total_tries - 1:
-                    continue
-
-            # 429/503: 한도 초과 → 다음 키, 키 소진 시 다음 모델
-            elif any(c in err for c in ["429", "402", "503", "rate", "overloaded"]):
-                st.session_state.key_idx += 1
-                if st.session_state.key_idx % total_keys == 0:
-                    st.session_state.model_idx += 1
-                    mi = st.session_state.model_idx % total_models
-                    st.toast(f"모델 전환 → {models[mi].split('/')[-1]}", icon="🔄")
-                else:
-                    st.toast(f"KEY {(st.session_state.key_idx % total_keys) + 1}로 전환", icon="🔑")
-                if attempt < total_tries - 1:
-                    time.sleep(0.5)
-                    continue
-
-            else:
-                return "", f"API 오류 ({current_model.split('/')[-1]}): {err[:200]}"
-
-    return "", (
-        "⏳ **현재 사용 가능한 무료 모델이 없습니다.**\n\n"
-        "잠시 후 다시 시도하거나 "
-        "[OpenRouter 무료 모델](https://openrouter.ai/models?q=free)을 확인해 주세요."
+def get_router():
+    return get_engine().router
+
+def get_rate_limiter():
+    return get_engine().limiter
+
+def get_backends():
+    return get_engine().backends
+
+def get_metrics():
+    return get_engine().metrics
+
+def get_models(wait: bool = True) -> list | None:
+    """wait=False면 스냅샷도 첫 조회 결과도 아직 없을 때 None (화면 표시용)"""
+    return get_engine().models(wait)
+
+def get_context_length(model: str) -> int:
+    return get_engine().context_length(model)
+
+
+# 응답 캐시 — 같은 질문은 무료 한도를 쓰지 않고 저장된 답으로
+RESPONSE_CACHE       = os.getenv("RESPONSE_CACHE", "1") != "0"
+RESPONSE_CACHE_PATH  = os.getenv("RESPONSE_CACHE_PATH", os.path.join(APP_DIR, ".cache", "responses.sqlite3"))
+RESPONSE_CACHE_MB    = int(os.getenv("RESPONSE_CACHE_MB", "50"))
+RESPONSE_CACHE_DAYS  = float(os.getenv("RESPONSE_CACHE_DAYS", "7"))
+RESPONSE_CACHE_NEAR  = float(os.getenv("RESPONSE_CACHE_NEAR", "0.9"))  # 첫 질문 유사도 기준, 0 = 끔
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """프로세스 공용 SQLite 응답 캐시"""
+    return ResponseCache(
+        RESPONSE_CACHE_PATH,
+        max_bytes      = RESPONSE_CACHE_MB * 1024 * 1024,
+        ttl            = RESPONSE_CACHE_DAYS * 24 * 3600,
+        near_threshold = RESPONSE_CACHE_NEAR,
+    )
+
+
+# 대화 저장소 — 대화를 디스크에 남겨 재시작 후에도 ?c=<대화 id> 로 이어 보기
+CONVERSATION_STORE      = os.getenv("CONVERSATION_STORE", "1") != "0"
+CONVERSATION_STORE_PATH = os.getenv(
+    "CONVERSATION_STORE_PATH", os.path.join(APP_DIR, ".cache", "conversations.sqlite3"),
+)
+
+
+@st.cache_resource
+def get_store() -> ConversationStore:
+    """프로세스 공용 SQLite 대화 저장소"""
+    return ConversationStore(CONVERSATION_STORE_PATH)
+
+
+# 세션 메모리 — 탭마다 쌓이는 대화 기록의 상한 · 유휴 세션 정리 (저장소가 있어야 내리고 다시 읽음)
+MEMORY_SESSION_KB = int(os.getenv("MEMORY_SESSION_KB", "256"))     # 세션당 메모리에 둘 기록, 0 = 제한 없음
+MEMORY_IDLE_TTL   = float(os.getenv("MEMORY_IDLE_TTL", "1800"))     # 이 시간(초) 실행이 없던 세션은 기록을 비움, 0 = 끔
+
+
+@st.cache_resource
+def get_memory() -> SessionMemory:
+    """프로세스 공용 세션 메모리 집계 — 저장소를 끄면 집계만 (내리면 다시 읽을 곳이 없음)"""
+    return SessionMemory(
+        session_bytes = MEMORY_SESSION_KB * 1024 if CONVERSATION_STORE else 0,
+        idle_ttl      = MEMORY_IDLE_TTL if CONVERSATION_STORE else 0,
+    )
+
+
+@st.cache_resource
+def get_prefetcher() -> Prefetcher:
+    """프로세스 공용 미리 받기 — 받은 답은 응답 캐시에 넣어 둔다"""
+    return Prefetcher(get_engine(), get_response_cache(), record=get_metrics().record_prefetch)
+
+
+@st.cache_resource
+def system_prompt_tokens() -> int:
+    """SYSTEM_PROMPT 토큰 수 — 프로세스당 한 번만 셈"""
+    return precount(SYSTEM_PROMPT)
+
+
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1") != "0"  # 0 = 한 번에 받기
+HEDGE_DEFAULT    = os.getenv("HEDGE_REQUESTS", "0") == "1"   # 사이드바 헤징 토글 기본값 (opt-in)
+PREFETCH_DEFAULT = os.getenv("PREFETCH_FOLLOWUPS", "0") == "1"  # 사이드바 미리 받기 토글 기본값 (opt-in)
+PREFETCH_COUNT   = int(os.getenv("PREFETCH_COUNT", "1"))      # 미리 받을 제안 수 (1~2 권장)
+METRICS_PANEL    = os.getenv("METRICS_PANEL", "0") == "1"    # 사이드바 관리자 패널
+
+
+def call_openrouter(
+    messages: list, on_delta=None, hedge: bool = False, purpose: str = "chat", on_wait=None,
+    on_reasoning=None,
+) -> tuple[str, str]:
+    """
+    이 세션의 요청 — Engine.call에 로테이션 커서로 st.session_state를,
+    Key/Model 전환 알림으로 st.toast를 넘긴다. 인자와 반환값은 Engine.call 참고.
+    """
+    return get_engine().call(
+        messages, st.session_state,
+        on_delta = on_delta,
+        hedge    = hedge,
+        purpose  = purpose,
+        on_wait  = on_wait,
+        notify   = lambda text, icon: st.toast(text, icon=icon),
+        on_reasoning = on_reasoning,
     )
 
 
+# 헤드리스 배치 — python -m app batch in.jsonl out.jsonl (화면 없이 같은 엔진 · 프롬프트로 처리)
+if __name__ == "__main__" and not st.runtime.exists() and sys.argv[1:2] == ["batch"]:
+    from streamlit.logger import set_log_level
+    from batch import main as batch_main
+    set_log_level("error")  # bare 모드 경고(ScriptRunContext 없음) 숨김
+    sys.exit(batch_main(sys.argv[2:], get_engine(), SYSTEM_PROMPT))
+
+
 # ══════════════════════════════════════════════════════════════
 #  STREAMLIT 앱
 # ══════════════════════════════════════════════════════════════
@@ -207,374 +249,321 @@ st.set_page_config(
 # ──────────────────────────────────────────────────────────────
 #  CSS — THE ATELIER THEME
 # ──────────────────────────────────────────────────────────────
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Cormorant+Garamond:ital,wght@0,300;0,400;0,600;1,300&family=DM+Sans:wght@300;400;500;600&display=swap');
-
-:root {
-    --bg:     #F7F4EF;
-    --paper:  #EFEBE3;
-    --dark:   #1A1714;
-    --mid:    #4A4540;
-    --soft:   #8C8680;
-    --accent: #1B4D3E;
-    --gold:   #C4955A;
-    --line:   #D8D2C8;
-    --white:  #FFFFFF;
-    --shadow: rgba(26,23,20,0.08);
-}
-
-html, body { margin:0; padding:0; }
-
-[data-testid="stAppViewContainer"] {
-    background: var(--bg) !important;
-    font-family: 'DM Sans', sans-serif !important;
-    color: var(--dark) !important;
-}
-[data-testid="stHeader"],
-[data-testid="stToolbar"],
-[data-testid="stDecoration"]    { display: none !important; }
-[data-testid="stMain"]          { background: transparent !important; }
-[data-testid="block-container"] { max-width: 800px; padding-top: 0 !important; }
-
-/* ── Header ── */
-.app-header {
-    text-align: center;
-    padding: 44px 20px 28px;
-    border-bottom: 1.5px solid var(--line);
-    margin-bottom: 30px;
-}
-.app-eyebrow {
-    font-size: 10px;
-    font-weight: 600;
-    letter-spacing: 5px;
-    text-transform: uppercase;
-    color: var(--accent);
-    margin-bottom: 12px;
-}
-.app-title {
-    font-family: 'Cormorant Garamond', serif;
-    font-size: 48px;
-    font-weight: 300;
-    color: var(--dark);
-    line-height: 1.1;
-    margin: 0 0 8px;
-}
-.app-title em { font-style: italic; color: var(--accent); }
-.app-sub {
-    font-size: 13px;
-    color: var(--soft);
-    letter-spacing: 1.5px;
-    margin-top: 4px;
-}
-.engine-badge {
-    display: inline-block;
-    margin-top: 16px;
-    padding: 6px 18px;
-    border-radius: 2px;
-    font-size: 10px;
-    font-weight: 700;
-    letter-spacing: 2.5px;
-    text-transform: uppercase;
-    background: #1A3A5C;
-    color: #C8DEFF;
-}
-.engine-badge.warn { background: #5C1A1A; color: #FFC8C8; }
-
-/* ── Model tag ── */
-.model-tag {
-    display: inline-block;
-    background: rgba(27,77,62,0.10);
-    border: 1px solid rgba(27,77,62,0.20);
-    color: var(--accent);
-    font-size: 10px;
-    font-weight: 600;
-    letter-spacing: 1.5px;
-    padding: 3px 10px;
-    border-radius: 2px;
-    margin-left: 6px;
-    vertical-align: middle;
-}
-
-/* ── Role Labels ── */
-.role-label {
-    display: flex;
-    align-items: center;
-    gap: 10px;
-    font-size: 10px;
-    font-weight: 600;
-    letter-spacing: 3px;
-    text-transform: uppercase;
-    margin: 22px 0 8px;
-}
-.role-label .ln { flex: 0; width: 36px; height: 1px; background: var(--line); }
-.user-lbl { color: var(--gold);   justify-content: flex-end; }
-.ai-lbl   { color: var(--accent); justify-content: flex-start; }
-
-/* ── Chat Bubbles ── */
-.row-user { display: flex; justify-content: flex-end; }
-.row-ai   { display: flex; justify-content: flex-start; }
-
-.bubble {
-    padding: 17px 22px;
-    max-width: 86%;
-    line-height: 1.80;
-    font-size: 15px;
-    word-break: break-word;
-}
-.bubble-user {
-    background: var(--accent);
-    color: #EEF7F2 !important;
-    border-radius: 2px 16px 16px 16px;
-    box-shadow: 0 4px 20px rgba(27,77,62,0.20);
-}
-.bubble-ai {
-    background: var(--white);
-    color: var(--dark) !important;
-    border-radius: 16px 16px 16px 2px;
-    border: 1px solid var(--line);
-    box-shadow: 0 2px 18px var(--shadow);
-}
-
-/* AI 버블 내부 텍스트 */
-.bubble-ai p      { color: var(--dark) !important; font-size:15px; line-height:1.85; }
-.bubble-ai li     { color: var(--mid)  !important; font-size:15px; line-height:1.8; }
-.bubble-ai strong { color: var(--dark) !important; font-weight:600; }
-.bubble-ai em     { color: var(--accent); }
-.bubble-ai a      { color: var(--accent); text-underline-offset:3px; }
-.bubble-ai h1, .bubble-ai h2, .bubble-ai h3 {
-    font-family: 'Cormorant Garamond', serif !important;
-    color: var(--accent) !important;
-    font-weight: 600;
-    border-bottom: 1px solid var(--line);
-    padding-bottom: 5px;
-    margin-top: 20px;
-}
-.bubble-ai h1 { font-size:24px !important; }
-.bubble-ai h2 { font-size:20px !important; }
-.bubble-ai h3 { font-size:17px !important; }
-.bubble-ai code {
-    background: var(--paper) !important;
-    color: var(--accent) !important;
-    border: 1px solid var(--line);
-    border-radius: 4px;
-    padding: 2px 7px;
-    font-size: 13px;
-}
-.bubble-ai pre {
-    background: #12100E !important;
-    border-radius: 8px;
-    padding: 16px 18px;
-    overflow-x: auto;
-    margin: 12px 0;
-}
-.bubble-ai pre code {
-    background: transparent !important;
-    color: #A8D8C0 !important;
-    border: none;
-    padding: 0;
-}
-.bubble-ai table { width:100%; border-collapse:collapse; margin:14px 0; font-size:14px; }
-.bubble-ai th {
-    background: var(--paper) !important;
-    color: var(--accent) !important;
-    font-size:11px; font-weight:700;
-    letter-spacing:1px; text-transform:uppercase;
-    padding: 10px 14px;
-    border: 1px solid var(--line);
-}
-.bubble-ai td {
-    color: var(--dark) !important;
-    padding: 9px 14px;
-    border: 1px solid var(--line);
-    vertical-align: top;
-}
-.bubble-ai tr:nth-child(even) td { background:rgba(239,235,227,0.55) !important; }
-.bubble-ai blockquote {
-    border-left: 3px solid var(--accent);
-    padding: 4px 0 4px 16px;
-    margin: 12px 0;
-    color: var(--mid) !important;
-    font-style: italic;
-}
-
-/* ── Mic Button ── */
-div[data-testid="stButton"] > button {
-    height: 54px !important;
-    font-family: 'DM Sans', sans-serif !important;
-    font-size: 12px !important;
-    font-weight: 700 !important;
-    letter-spacing: 3px !important;
-    text-transform: uppercase !important;
-    border-radius: 2px !important;
-    background: var(--accent) !important;
-    color: #fff !important;
-    border: none !important;
-    width: 100% !important;
-    box-shadow: 0 4px 20px rgba(27,77,62,0.22) !important;
-    transition: all 0.22s ease !important;
-    touch-action: manipulation;
-}
-div[data-testid="stButton"] > button:hover {
-    background: #163D31 !important;
-    transform: translateY(-2px) !important;
-    box-shadow: 0 8px 28px rgba(27,77,62,0.32) !important;
-}
-div[data-testid="stButton"] > button:active { transform:scale(0.98) !important; }
-
-/* ── Chat Input ── */
-[data-testid="stChatInput"] {
-    border-top: 1.5px solid var(--line) !important;
-    background: var(--bg) !important;
-    padding: 10px 0 !important;
-}
-[data-testid="stChatInput"] textarea {
-    background: var(--white) !important;
-    border: 1.5px solid var(--line) !important;
-    border-radius: 2px !important;
-    color: var(--dark) !important;
-    font-family: 'DM Sans', sans-serif !important;
-    font-size: 15px !important;
-    caret-color: var(--accent) !important;
-    box-shadow: 0 2px 10px var(--shadow) !important;
-    transition: border-color 0.2s !important;
-}
-[data-testid="stChatInput"] textarea:focus  { border-color: var(--accent) !important; }
-[data-testid="stChatInput"] textarea::placeholder { color:var(--soft) !important; font-style:italic; }
-[data-testid="stChatInput"] button svg { fill: var(--accent) !important; }
-
-/* ── Sidebar ── */
-[data-testid="stSidebar"] {
-    background: #0E0C0A !important;
-    border-right: 1px solid #222018 !important;
-}
-[data-testid="stSidebar"] * {
-    color: rgba(240,235,225,0.80) !important;
-    font-family: 'DM Sans', sans-serif !important;
-}
-[data-testid="stSidebar"] h3 {
-    font-family: 'Cormorant Garamond', serif !important;
-    font-size: 20px !important;
-    font-weight: 300 !important;
-    letter-spacing: 1px;
-}
-[data-testid="stSidebar"] hr { border-color: #262218 !important; }
-[data-testid="stSidebar"] [data-testid="stButton"] > button {
-    background: rgba(255,255,255,0.05) !important;
-    border: 1px solid rgba(255,255,255,0.09) !important;
-    color: rgba(240,235,225,0.80) !important;
-    box-shadow: none !important;
-    font-size: 11px !important;
-    letter-spacing: 2px !important;
-    transform: none !important;
-}
-[data-testid="stSidebar"] [data-testid="stButton"] > button:hover {
-    background: rgba(255,255,255,0.10) !important;
-    transform: none !important;
-    box-shadow: none !important;
-}
-
-/* ── Spinner ── */
-[data-testid="stSpinner"] p {
-    color: var(--accent) !important;
-    font-size: 12px !important;
-    letter-spacing: 2px !important;
-}
-
-/* ── OR Divider ── */
-.or-divider {
-    display: flex;
-    align-items: center;
-    gap: 12px;
-    margin: 18px 0;
-    font-size: 9px;
-    font-weight: 600;
-    letter-spacing: 4px;
-    text-transform: uppercase;
-    color: var(--soft);
-}
-.or-divider::before,
-.or-divider::after { content:''; flex:1; height:1px; background:var(--line); }
-
-/* ── Setup Card ── */
-.setup-card {
-    background: var(--white);
-    border: 1px solid var(--line);
-    border-left: 3px solid var(--accent);
-    border-radius: 2px;
-    padding: 24px 28px;
-    margin: 16px 0;
-    font-size: 14px;
-    line-height: 1.9;
-    color: var(--mid);
-}
-.setup-card h4 {
-    font-family: 'Cormorant Garamond', serif;
-    font-size: 20px;
-    color: var(--accent);
-    margin: 0 0 14px;
-    font-weight: 600;
-}
-.setup-card code {
-    background: var(--paper);
-    border: 1px solid var(--line);
-    border-radius: 3px;
-    padding: 2px 8px;
-    font-size: 12px;
-    color: var(--accent);
-}
-.setup-card pre {
-    background: #12100E;
-    color: #A8D8C0;
-    padding: 14px 16px;
-    border-radius: 4px;
-    font-size: 12px;
-    line-height: 2;
-    margin: 10px 0;
-    overflow-x: auto;
-}
-
-.scroll-pad { height: 30px; }
-
-@media (max-width: 640px) {
-    .app-title { font-size: 32px; }
-    .bubble    { font-size:14px; max-width:96%; padding:13px 15px; }
-}
-</style>
-""", unsafe_allow_html=True)
+CSS_PATH = os.path.join(APP_DIR, "static", "atelier.css")
+
+# 웹 폰트 — <head>에 preconnect + stylesheet <link>로 걸어 테마 CSS와 나란히 받는다.
+# CSS 안의 @import면 페이지 → atelier.css → fonts.googleapis.com으로 왕복이 이어져 테마가 늦게 칠해짐.
+# st.html은 <link>를 걸러 내므로 짧은 스크립트로 한 번만 추가 (요소 자리는 atelier.css가 숨김)
+FONTS_URL = "https://fonts.googleapis.com/css2?family=Cormorant+Garamond:ital,wght@0,300;0,400;0,600;1,300&family=DM+Sans:wght@300;400;500;600&display=swap"
+FONT_LINKS_HTML = f"""<span id="atelier-fonts"></span><script>
+(() => {{
+  if (document.head.querySelector("link[data-atelier-fonts]")) return;
+  const add = (rel, href, cross) => {{
+    const link = document.createElement("link");
+    link.rel = rel;
+    link.href = href;
+    if (cross) link.crossOrigin = "anonymous";
+    link.setAttribute("data-atelier-fonts", "");
+    document.head.appendChild(link);
+  }};
+  add("preconnect", "https://fonts.googleapis.com");
+  add("preconnect", "https://fonts.gstatic.com", true);
+  add("stylesheet", "{FONTS_URL}");
+}})();
+</script>"""
+
+
+@st.cache_resource
+def css_version() -> str:
+    """CSS 내용 해시 — 파일이 바뀌면 URL이 바뀌어 브라우저 캐시가 갱신됨"""
+    with open(CSS_PATH, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:10]
+
+
+if st.get_option("server.enableStaticServing"):
+    # 브라우저가 한 번 받아 캐시 — rerun마다 ~10KB CSS를 다시 보내지 않음
+    st.html(f"<style>@import url('app/static/atelier.css?v={css_version()}');</style>")
+else:
+    st.html(CSS_PATH)  # 정적 서빙이 꺼진 배포 환경 — 인라인 주입
+st.html(FONT_LINKS_HTML, unsafe_allow_javascript=True)
 
 # ──────────────────────────────────────────────────────────────
 #  SESSION STATE 초기화
 # ──────────────────────────────────────────────────────────────
+HISTORY_WINDOW   = 20  # 전체 rerun 때 그릴 최근 메시지 수 (이전 대화는 버튼으로 펼침)
+LIVE_TURNS_LIMIT = 8   # fragment에 쌓인 메시지가 이만큼이면 전체 rerun으로 정리
+
 defaults = {
     "messages":   [],
     "key_idx":    0,   # rerun 후에도 유지
     "model_idx":  0,   # rerun 후에도 유지
+    "last_call":  None,  # 마지막 호출의 모델 · 첫 토큰 · 전체 시간
+    "last_route": None,  # 마지막 라우팅 결정 (1순위 모델 · 탐색 여부)
+    "hedge":      HEDGE_DEFAULT,  # 동시 요청(헤징) 사용 여부
+    "prefetch":   PREFETCH_DEFAULT,  # 다음 단계 제안 미리 받기 사용 여부
+    "summary":      "",  # 예산 밖으로 밀려난 대화의 누적 요약
+    "summary_upto": 0,   # 이 순번 이전 메시지는 요약에 반영됨
+    "history_window": HISTORY_WINDOW,  # 처음 그릴 최근 메시지 수
+    "live_from":      0,               # 이 인덱스부터는 chat_area fragment가 그림
+    "models_pending": False,           # 모델 목록 백그라운드 조회 중
+    "conversation_id": None,           # 대화 저장소 id (URL ?c=)
+    "msg_base":        0,              # messages[0]의 대화 내 순번 — 그 이전은 저장소에만 있음
+    "memory":          None,           # 세션 메모리 집계 (memory.Holding) — messages를 열 때 만듦
 }
 for k, v in defaults.items():
     if k not in st.session_state:
         st.session_state[k] = v
 
+# summary_upto · live_from 은 msg_base와 같은 대화 내 순번 기준
+# (messages 인덱스 = 순번 - msg_base)
+
+
+def open_conversation(cid: str | None) -> None:
+    """
+    대화 열기 — 저장소에 있으면 이어 보기, 없거나 형식이 틀리면 새 대화.
+    메모리에는 요약에 아직 안 들어간 구간과 첫 화면에 그릴 구간만 올리고,
+    그 이전은 '이전 대화 더 보기' 때 저장소에서 읽는다.
+    """
+    if not valid_conversation_id(cid):
+        cid = new_conversation_id()
+    state = (
+        get_store().load_state(cid) if CONVERSATION_STORE
+        else {"summary": "", "summary_upto": 0, "count": 0}
+    )
+    base     = min(state["summary_upto"], max(0, state["count"] - HISTORY_WINDOW))
+    messages = get_store().page(cid, base) if state["count"] else []
+    st.session_state.update(
+        conversation_id = cid,
+        messages        = messages,
+        memory          = get_memory().hold(messages, st.session_state.memory),
+        msg_base        = base,
+        summary         = state["summary"],
+        summary_upto    = state["summary_upto"],
+        history_window  = HISTORY_WINDOW,
+        live_from       = state["count"],
+    )
+    if CONVERSATION_STORE:
+        st.query_params["c"] = cid
+
+
+def message_count() -> int:
+    """대화 전체 메시지 수 (저장소에만 있는 이전 구간 포함)"""
+    return st.session_state.msg_base + len(st.session_state.messages)
+
+
+def add_message(msg: dict) -> None:
+    """대화 끝에 메시지 추가 — 메모리와 저장소에 함께. 세션 상한을 넘으면 앞부분을 내림."""
+    st.session_state.messages.append(msg)
+    if CONVERSATION_STORE:
+        get_store().append(st.session_state.conversation_id, msg)
+    if get_memory().add(st.session_state.memory, msg):
+        spill_history()
+
+
+def spill_history() -> None:
+    """
+    요약에 들어갔고 이미 화면에 그린 앞부분을 메모리에서 뺌 (저장소에는 남아 있음).
+    요청 컨텍스트(summary_upto 이후)와 fragment가 그릴 구간(live_from 이후)은 그대로 둔다.
+    messages는 제자리에서 줄인다 — 메모리 집계(Holding)가 같은 list를 들고 있음.
+    """
+    ss  = st.session_state
+    cut = min(ss.summary_upto, ss.live_from) - ss.msg_base
+    if cut <= 0:
+        return
+    dropped = ss.messages[:cut]
+    del ss.messages[:cut]
+    ss.msg_base += cut
+    get_memory().spilled(ss.memory, dropped)
+
+
+def ensure_resident() -> None:
+    """이 세션의 대화 기록을 메모리에 — 유휴 정리로 비워졌으면 저장소에서 다시 연다"""
+    if st.session_state.conversation_id is None:
+        open_conversation(st.query_params.get("c"))
+    elif not get_memory().touch(st.session_state.memory):
+        open_conversation(st.session_state.conversation_id)
+
+
+ensure_resident()
+
 # ──────────────────────────────────────────────────────────────
 #  SIDEBAR
 # ──────────────────────────────────────────────────────────────
-with st.sidebar:
-    st.markdown("### ◆ 설정")
-    st.markdown("---")
+CATALOG_SOURCE_LABELS = {"live": "최신", "snapshot": "스냅샷", "fallback": "기본 목록", "loading": "조회 중"}
+
+def catalog_status_line() -> str:
+    """모델 목록 출처 · 갱신 시각 (갱신 실패 중이면 표시)"""
+    cs  = get_catalog().status()
+    cnt = f' · {cs["count"]}개' if cs["count"] else ""
+    age = "" if cs["age"] is None else f' · {cs["age"] / 60:.0f}분 전'
+    err = " · 갱신 실패, 재시도 중" if cs["last_error"] else ""
+    return (
+        f'<div style="font-size:10px;color:#5A6060;line-height:1.6;margin-top:4px">'
+        f'모델 목록 {CATALOG_SOURCE_LABELS[cs["source"]]}{cnt}{age}{err}</div>'
+    )
+
+
+def route_rows(models: list, limit: int = 4) -> str:
+    """라우터 점수 상위 모델 — 예상 시간 · 첫 토큰 · 속도 · 실패율"""
+    route = st.session_state.last_route or {}
+    rows  = ""
+    for r in get_router().snapshot(models)[:limit]:
+        name    = r["model"].split("/")[-1].replace(":free", "")
+        fail    = r["error_rate"] + r["timeout_rate"]
+        detail  = " · ".join(filter(None, [
+            f'첫 토큰 {r["ttft"]:.1f}s' if r["ttft"] is not None else "",
+            f'{r["tps"]:.0f} tok/s' if r["tps"] is not None else "",
+            f"실패 {fail:.0%}" if fail >= 0.01 else "",
+        ])) or "측정 전"
+        mark    = " 🔍" if route.get("explored") == r["model"] else ""
+        rows += (
+            f'<div style="font-size:10px;color:#5A6060;line-height:1.6">'
+            f'~{r["score"]:.1f}s {name}{mark}<br>'
+            f'<span style="color:#444">&nbsp;&nbsp;{detail}</span></div>'
+        )
+    return (
+        f'<div style="margin-top:10px;font-size:9px;letter-spacing:2px;color:#555">'
+        f'라우팅 (예상 시간 순)</div>{rows}'
+    )
+
+
+def backend_rows() -> str:
+    """추가 백엔드 — 사용 중 자리/상한 · 넘겨받아 답한 수 · 가장 빠른 모델의 예상 시간"""
+    rows = ""
+    for b in get_backends().status():
+        if b["models"] == 0:
+            detail = "모델 없음 · 서버 확인 필요"
+        elif b["models"] is None:
+            detail = "아직 사용 전"
+        else:
+            best   = b["best"]
+            speed  = f' · ~{best["score"]:.1f}s {best["model"].split("/")[-1]}' if best and best["samples"] else ""
+            detail = f'{b["in_flight"]}/{b["limit"]} 사용 중 · 답변 {b["served"]}건{speed}'
+        rows += (
+            f'<div style="font-size:11px;color:#5A6060;line-height:1.8">'
+            f'🖥️ {b["name"]} <span style="color:#444">· {detail}</span></div>'
+        )
+    return (
+        f'<div style="margin-top:10px;font-size:9px;letter-spacing:2px;color:#555">'
+        f'추가 백엔드 (무료 한도 포화 시)</div>{rows}'
+    )
+
+
+def metrics_table(title: str, rows: dict, label) -> str:
+    """관리자 패널 표 — 이름 · p50 · p95 · 첫 토큰 p50 · 프롬프트 캐시 적중률 · 시도 오류율"""
+    sec  = lambda v: "—" if v is None else f"{v:.1f}s"
+    pct  = lambda v: "—" if v is None else f"{v:.0%}"
+    cell = 'style="padding:1px 6px 1px 0;text-align:right"'
+    body = "".join(
+        f'<tr><td style="padding:1px 6px 1px 0">{label(name)}</td>'
+        f'<td {cell}>{sec(r["p50"])}</td><td {cell}>{sec(r["p95"])}</td>'
+        f'<td {cell}>{sec(r["ttft_p50"])}</td><td {cell}>{pct(r["cache_rate"])}</td>'
+        f'<td {cell}>{r["error_rate"]:.0%} ({r["errors"]}/{r["attempts"]})</td></tr>'
+        for name, r in sorted(rows.items(), key=lambda kv: -kv[1]["attempts"])
+    )
+    return (
+        f'<div style="font-size:9px;letter-spacing:2px;color:#555;margin:8px 0 4px">{title}</div>'
+        f'<table style="font-size:10px;color:#8A9090;border-collapse:collapse">'
+        f'<tr style="color:#555"><td></td><td {cell}>p50</td><td {cell}>p95</td>'
+        f'<td {cell}>첫 토큰</td><td {cell}>캐시</td><td {cell}>오류율</td></tr>{body}</table>'
+    )
+
+
+def metrics_panel() -> None:
+    """관리자용 — 최근 1시간 모델별 · Key별 지연 시간과 오류율 · 세션 메모리 (METRICS_PANEL=1)"""
+    summary   = get_metrics().summary()
+    key_names = {kid: f"KEY {i+1}" for i, kid in enumerate(KEY_IDS)}
+    with st.expander(f"📊 요청 지표 · 최근 1시간 {summary['requests']}건"):
+        st.markdown(
+            metrics_table("모델", summary["models"], lambda m: m.split("/")[-1].replace(":free", ""))
+            + metrics_table("KEY", summary["keys"], lambda k: key_names.get(k, k))
+            + memory_line(),
+            unsafe_allow_html=True,
+        )
 
+
+def memory_line() -> str:
+    """관리자 패널 — 세션 대화 기록 메모리 · 프로세스 RSS"""
+    ms  = get_memory().status()
+    kb  = lambda b: f"{b / 1024:,.0f} KB"
+    rss = f' · RSS {ms["rss"] / 1024 / 1024:,.0f} MB' if ms["rss"] is not None else ""
+    cap = f' / 한도 {kb(ms["session_limit"])}' if ms["session_limit"] else ""
+    return (
+        f'<div style="font-size:10px;color:#8A9090;line-height:1.8;margin-top:8px">'
+        f'🧠 세션 기록 {ms["sessions"]}개 · {kb(ms["bytes"])}{rss}<br>'
+        f'가장 큰 세션 {kb(ms["largest"])}{cap}<br>'
+        f'내림 {ms["spilled"]}건 ({kb(ms["spilled_bytes"])}) · 유휴 정리 {ms["evicted"]}세션</div>'
+    )
+
+
+def rate_limit_tag(rs: dict) -> str:
+    """Key 줄 뒤에 붙는 남은 요청 수 (오늘 남은/한도 · 분당). 마우스를 올리면 모델별 오늘 사용량."""
+    parts = []
+    if rs["day_left"] is not None:
+        parts.append(f'오늘 {rs["day_left"]}/{rs["day_limit"]} 남음')
+    if rs["minute_left"] is not None:
+        parts.append(f'분 {rs["minute_left"]}')
+    if not parts:
+        return ""
+    by_model = " · ".join(
+        f'{m.split("/")[-1].replace(":free", "")} {n}'
+        for m, n in sorted(rs["models"].items(), key=lambda kv: -kv[1])
+    )
+    return (
+        f'<span style="color:#5A6060;font-size:11px" title="오늘 사용 {rs["day_used"]}회'
+        f'{" — " + by_model if by_model else ""}"> · {" · ".join(parts)}</span>'
+    )
+
+
+def key_status_panel():
+    """API KEY 상태 + 현재 모델. 모델 목록 조회가 끝나면 전체 rerun으로 헤더도 갱신."""
+    models     = get_models(wait=False)
     total_keys = len(API_KEYS)
-    cur_ki     = st.session_state.key_idx   % max(total_keys, 1)
-    cur_mi     = st.session_state.model_idx % len(get_models())
-    cur_model  = get_models()[cur_mi].split("/")[-1].replace(":free", "") if API_KEYS else "—"
+    cur_ki     = st.session_state.key_idx % max(total_keys, 1)
+    if not API_KEYS:
+        cur_model = "—"
+    elif models is None:
+        cur_model = "모델 목록 불러오는 중…"
+    else:
+        cur_model = models[st.session_state.model_idx % len(models)].split("/")[-1].replace(":free", "")
+    if models is not None and st.session_state.models_pending:
+        st.session_state.models_pending = False
+        st.rerun()
+    catalog_line = catalog_status_line() if API_KEYS else ""
+    queue_len    = get_rate_limiter().status(KEY_IDS[0])["queue"] if RATE_LIMIT and API_KEYS else 0
+    queue_line   = (
+        f'<div style="font-size:11px;color:#B07A3A;margin-top:6px">⏳ 대기열 {queue_len}건</div>'
+        if queue_len else ""
+    )
+    routing      = route_rows(models) if ADAPTIVE_ROUTING and API_KEYS and models else ""
+    backends     = backend_rows() if get_backends() else ""
 
     # Key 상태
     key_rows = ""
     for i in range(3):
         if i < total_keys:
+            state, wait_s = get_health().key_status(KEY_IDS[i])
+            rs     = get_rate_limiter().status(KEY_IDS[i]) if RATE_LIMIT else None
             is_cur = (i == cur_ki)
+            if rs and rs["day_left"] == 0:
+                key_rows += (
+                    f'<div style="font-size:12px;color:#B07A3A;margin:5px 0">'
+                    f'⏸ KEY {i+1} · 오늘 한도 소진 · {format_wait(rs["reset_in"])} 후 초기화</div>'
+                )
+                continue
+            if state == "open":
+                key_rows += (
+                    f'<div style="font-size:12px;color:#B07A3A;margin:5px 0">'
+                    f'⏸ KEY {i+1} · 쿨다운 {wait_s:.0f}s</div>'
+                )
+                continue
             color  = "#5DBF8A" if is_cur else "#5A6060"
-            mark   = " ← 사용중" if is_cur else ""
-            key_rows += f'<div style="font-size:12px;color:{color};margin:5px 0">● KEY {i+1}{mark}</div>'
+            # 남은 한도를 알면 그걸 표시 (사용 중인 Key는 색으로 구분)
+            quota  = rate_limit_tag(rs) if rs else ""
+            mark   = " ← 사용중" if is_cur and not quota else ""
+            key_rows += (
+                f'<div style="font-size:12px;color:{color};margin:5px 0">● KEY {i+1}{mark}{quota}</div>'
+            )
         else:
             key_rows += f'<div style="font-size:12px;color:#333;margin:5px 0">○ KEY {i+1} (미등록)</div>'
 
@@ -583,15 +572,59 @@ with st.sidebar:
         f'border-radius:4px;padding:14px 16px;line-height:2">'
         f'<div style="font-size:9px;letter-spacing:3px;color:#555;margin-bottom:8px">API KEY 상태</div>'
         f'{key_rows}'
+        f'{queue_line}'
         f'<div style="margin-top:12px;font-size:9px;letter-spacing:2px;color:#555">현재 모델</div>'
         f'<div style="font-size:12px;color:#A8D8C0;font-weight:500;margin-top:4px">{cur_model}</div>'
+        f'{catalog_line}'
+        f'{routing}'
+        f'{backends}'
         f'</div>',
         unsafe_allow_html=True,
     )
 
+
+with st.sidebar:
+    st.markdown("### ◆ 설정")
+    st.markdown("---")
+
+    # 모델 목록이 아직 조회 중이면 1초마다 이 패널만 다시 그림
+    loading = get_models(wait=False) is None
+    st.session_state.models_pending = loading
+    st.fragment(run_every=1 if loading else None)(key_status_panel)()
+
+    st.toggle(
+        "⚡ 동시 요청 (헤징)",
+        key  = "hedge",
+        help = f"상위 {HEDGE_FANOUT}개 Key·Model 조합에 같은 질문을 보내 가장 빠른 답을 사용합니다. "
+               "응답은 빨라지지만 무료 한도를 더 씁니다.",
+    )
+
+    if RESPONSE_CACHE:
+        st.toggle(
+            "💡 다음 질문 미리 받기",
+            key  = "prefetch",
+            help = f"답변의 [다음 단계 제안] 중 상위 {PREFETCH_COUNT}개를 읽는 동안 미리 받아 둡니다. "
+                   "Key 여유가 있을 때만 보내고, 다른 질문을 하면 취소합니다.",
+        )
+
+    if RESPONSE_CACHE:
+        cs   = get_response_cache().stats()
+        near = f' · 유사 {cs["near_hits"]}' if cs["near_hits"] else ""
+        st.markdown(
+            f'<div style="font-size:11px;color:#5A6060;line-height:1.9;margin-top:10px">'
+            f'응답 캐시 · 적중 {cs["hits"]}/{cs["lookups"]} ({cs["hit_rate"]:.0%}){near}<br>'
+            f'절약 {cs["bytes_saved"] / 1024:.1f} KB · 저장 {cs["entries"]}건 '
+            f'{cs["bytes"] / 1024 / 1024:.1f} MB</div>',
+            unsafe_allow_html=True,
+        )
+
+    if METRICS_PANEL and API_KEYS:
+        metrics_panel()
+
     st.markdown("---")
     if st.button("↺  대화 초기화", use_container_width=True):
-        st.session_state.messages  = []
+        # 새 대화로 전환 — 이전 대화는 저장소에 남아 그 URL로 다시 열 수 있음
+        open_conversation(None)
         st.session_state.key_idx   = 0
         st.session_state.model_idx = 0
         st.rerun()
@@ -604,16 +637,21 @@ with st.sidebar:
         '한도 초과 시<br>Key → Model 자동 전환</div>',
         unsafe_allow_html=True,
     )
+    timing_slot = st.empty()  # 스크립트 끝에서 로딩 시간 리포트를 채움
 
 # ──────────────────────────────────────────────────────────────
 #  HEADER
 # ──────────────────────────────────────────────────────────────
 key_count = len(API_KEYS)
 if key_count:
-    cur_model_short = get_models()[
-        st.session_state.model_idx % len(get_models())
-    ].split("/")[-1].replace(":free", "")
+    models = get_models(wait=False)
+    cur_model_short = models[
+        st.session_state.model_idx % len(models)
+    ].split("/")[-1].replace(":free", "") if models else "…"
     badge = f'<span class="engine-badge">⬡ OpenRouter  ·  {key_count}/3 Key  ·  {cur_model_short}</span>'
+elif get_backends():
+    names = ", ".join(b.name for b in get_backends().backends)
+    badge = f'<span class="engine-badge">⬡ 로컬 서버  ·  {names}</span>'
 else:
     badge = '<span class="engine-badge warn">⚠ API Key 설정 필요</span>'
 
@@ -625,11 +663,12 @@ st.markdown(f"""
     {badge}
 </div>
 """, unsafe_allow_html=True)
+first_paint = time.perf_counter() - _RUN_T0  # 헤더까지 그린 시점
 
 # ──────────────────────────────────────────────────────────────
-#  API KEY 없을 때 설정 안내
+#  API KEY 없을 때 설정 안내 (추가 백엔드만으로도 답할 수 있으면 생략)
 # ──────────────────────────────────────────────────────────────
-if not API_KEYS:
+if not API_KEYS and not get_backends():
     st.markdown("""
 <div class="setup-card">
 <h4>🔧 OpenRouter API Key를 설정해 주세요</h4>
@@ -657,94 +696,311 @@ OPENROUTER_API_KEY_3 = "sk-or-여기에_키_입력"</pre>
 # ──────────────────────────────────────────────────────────────
 #  대화 기록 렌더링
 # ──────────────────────────────────────────────────────────────
-for msg in st.session_state.messages:
+REASONING_LABEL = "💭 추론 과정"
+
+
+class ReasoningPanel:
+    """
+    추론 모델의 생각 과정을 AI 버블 위 접힌 패널에 실시간 표시.
+    추론 텍스트가 처음 올 때 패널을 만든다 — 일반 모델 답변에는 아무것도 그리지 않음.
+    """
+
+    def __init__(self):
+        self.slot = st.empty()
+        self.text = ""
+        self.box  = None
+
+    def update(self, text: str) -> None:
+        if self.box is None:
+            self.status = self.slot.status("💭 추론 중…", expanded=False)
+            self.box    = self.status.empty()
+        self.text = text
+        self.box.markdown(text)
+
+    def close(self) -> None:
+        if self.box is not None:
+            self.status.update(label=REASONING_LABEL, state="complete")
+
+
+def timing_tag(timing: dict) -> str:
+    """AI 버블 아래 모델 · 첫 토큰(TTFT) · 전체 시간 태그"""
+    model = timing["model"].split("/")[-1].replace(":free", "")
+    if timing.get("cached"):
+        source = "미리 받은 답변" if timing.get("prefetched") else "캐시 응답"
+        return f'<span class="model-tag">{model}  ·  {source}  ·  {timing["total"]:.2f}s</span>'
+    shared  = "  ·  같은 질문과 함께 받음" if timing.get("shared") else ""
+    backend = f'  ·  {timing["backend"]} 서버' if timing.get("backend") else ""
+    return (
+        f'<span class="model-tag">{model}{backend}  ·  첫 토큰 {timing["ttft"]:.1f}s'
+        f'  ·  전체 {timing["total"]:.1f}s{shared}</span>'
+    )
+
+@functools.lru_cache(maxsize=2048)  # 내용 해시 기준 — rerun마다 HTML을 다시 만들지 않음
+def user_bubble_html(content: str) -> str:
+    return f'<div class="row-user"><div class="bubble bubble-user">{content}</div></div>'
+
+
+def render_message(msg: dict) -> None:
     if msg["role"] == "user":
         st.markdown(
             '<div class="role-label user-lbl"><span class="ln"></span>✦ 나의 질문</div>',
             unsafe_allow_html=True,
         )
-        st.markdown(
-            f'<div class="row-user"><div class="bubble bubble-user">{msg["content"]}</div></div>',
-            unsafe_allow_html=True,
-        )
+        st.markdown(user_bubble_html(msg["content"]), unsafe_allow_html=True)
     else:
         st.markdown(
             '<div class="role-label ai-lbl">◈ 마스터 멘토<span class="ln"></span></div>',
             unsafe_allow_html=True,
         )
+        if msg.get("reasoning"):
+            with st.expander(REASONING_LABEL):
+                st.markdown(msg["reasoning"])
         st.markdown('<div class="bubble bubble-ai">', unsafe_allow_html=True)
         st.markdown(msg["content"])
         st.markdown('</div>', unsafe_allow_html=True)
+        if msg.get("timing"):
+            st.markdown(timing_tag(msg["timing"]), unsafe_allow_html=True)
+
+
+# 전체 rerun 때만 그리는 구간 — 최근 history_window개만, 그 이전은 버튼으로 펼침
+messages  = st.session_state.messages
+base      = st.session_state.msg_base
+live_from = message_count()
+start     = max(0, live_from - st.session_state.history_window)
+if start:
+    with st.container(key="load-older"):
+        if st.button(f"▲  이전 대화 {start}개 더 보기", key="load_older", use_container_width=True):
+            st.session_state.history_window += HISTORY_WINDOW
+            st.rerun()
+# 메모리에 없는 이전 구간은 저장소에서 그 페이지만 읽어 그림
+older = get_store().page(st.session_state.conversation_id, start, base) if start < base else []
+for msg in older + messages[max(0, start - base):]:
+    render_message(msg)
+st.session_state.live_from = live_from  # 이후 메시지는 chat_area fragment가 그림
 
 st.markdown('<div class="scroll-pad"></div>', unsafe_allow_html=True)
 
 # ──────────────────────────────────────────────────────────────
 #  메시지 처리
 # ──────────────────────────────────────────────────────────────
+def build_context(model: str) -> list:
+    """
+    선택된 모델의 컨텍스트 길이에 맞춘 요청 메시지.
+    원문 대화가 예산을 넘으면 오래된 구간을 누적 요약에 접어 넣는다 (증분 갱신).
+    """
+    history = st.session_state.messages
+    base    = st.session_state.msg_base
+    budget  = history_budget(get_context_length(model), system_prompt_tokens())
+    upto    = st.session_state.summary_upto - base
+    fold_to = fold_point(history, upto, budget)
+
+    if fold_to > upto:
+        dropped = history[upto:fold_to]
+        with st.spinner("◈  이전 대화 정리 중"):
+            summary, error = call_openrouter(
+                summary_request(st.session_state.summary, dropped), purpose="summary",
+            )
+        if error or not summary:
+            summary = fallback_summary(st.session_state.summary, dropped)
+        st.session_state.summary      = summary.strip()
+        st.session_state.summary_upto = base + fold_to
+        if CONVERSATION_STORE:
+            get_store().save_summary(
+                st.session_state.conversation_id, st.session_state.summary, base + fold_to,
+            )
+
+    return build_messages(
+        SYSTEM_PROMPT, st.session_state.summary, history[st.session_state.summary_upto - base:],
+    )
+
+
+@functools.lru_cache(maxsize=256)  # rerun마다 같은 답변을 다시 파싱하지 않음
+def suggestions(answer: str) -> tuple:
+    return tuple(parse_suggestions(answer))
+
+
+def followup_requests(questions) -> list:
+    """
+    다음 질문 후보 → [(질문, 그 질문을 보냈을 때의 요청 메시지)] — build_context와 똑같이 만든다.
+    그 질문에서 요약을 다시 접어야 하면 요청이 달라져 캐시에 안 맞으므로 뺀다.
+    """
+    models  = get_models()
+    model   = models[st.session_state.model_idx % len(models)]
+    budget  = history_budget(get_context_length(model), system_prompt_tokens())
+    upto    = st.session_state.summary_upto - st.session_state.msg_base
+    result  = []
+    for question in questions:
+        history = st.session_state.messages + [{"role": "user", "content": question}]
+        if fold_point(history, upto, budget) > upto:
+            continue
+        result.append((question, build_messages(SYSTEM_PROMPT, st.session_state.summary, history[upto:])))
+    return result
+
+
+def followup_buttons(slot) -> str | None:
+    """마지막 답변의 다음 단계 제안을 한 번에 보내는 버튼으로 — 누른 제안을 반환"""
+    messages  = st.session_state.messages
+    questions = suggestions(messages[-1]["content"]) if messages and messages[-1]["role"] == "assistant" else ()
+    if not questions:
+        slot.empty()
+        return None
+    clicked = None
+    with slot.container():
+        for i, question in enumerate(questions):
+            if st.button(f"→  {question}", key=f"followup_{message_count()}_{i}", use_container_width=True):
+                clicked = question
+    return clicked
+
+
 def handle_message(user_text: str):
     if not user_text.strip():
         return
+    # 미리 받던 제안 중 이 질문이 아닌 것은 취소 (이 질문이면 응답 캐시 · 진행 중 요청에서 받음)
+    prefetched = RESPONSE_CACHE and get_prefetcher().claim(st.session_state.conversation_id, user_text)
 
     # 사용자 버블
     st.markdown(
         '<div class="role-label user-lbl"><span class="ln"></span>✦ 나의 질문</div>',
         unsafe_allow_html=True,
     )
-    st.markdown(
-        f'<div class="row-user"><div class="bubble bubble-user">{user_text}</div></div>',
-        unsafe_allow_html=True,
-    )
-    st.session_state.messages.append({"role": "user", "content": user_text})
-
-    # OpenRouter 메시지 구성
-    or_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    for m in st.session_state.messages:
-        or_messages.append({"role": m["role"], "content": m["content"]})
+    st.markdown(user_bubble_html(user_text), unsafe_allow_html=True)
+    add_message({"role": "user", "content": user_text})
 
     # 현재 모델명
     models    = get_models()
-    cur_model = models[
-        st.session_state.model_idx % len(models)
-    ].split("/")[-1].replace(":free", "")
-
-    with st.spinner(f"◈  분석 중  ·  {cur_model}"):
-        answer, error = call_openrouter(or_messages)
-
-    if error:
-        answer = f"**⚠️ 오류**\n\n{error}"
+    cur_id    = models[st.session_state.model_idx % len(models)]
+    cur_model = cur_id.split("/")[-1].replace(":free", "")
 
-    st.session_state.messages.append({"role": "assistant", "content": answer})
+    # OpenRouter 메시지 구성 — 최근 대화 원문 + 오래된 대화 요약
+    or_messages = build_context(cur_id)
 
-    # AI 버블
+    # AI 버블 — 스트리밍 중에는 placeholder를 부분 답변으로 계속 갱신
     st.markdown(
         '<div class="role-label ai-lbl">◈ 마스터 멘토<span class="ln"></span></div>',
         unsafe_allow_html=True,
     )
+    thinking = ReasoningPanel()
     st.markdown('<div class="bubble bubble-ai">', unsafe_allow_html=True)
-    st.markdown(answer)
+    placeholder = st.empty()
     st.markdown('</div>', unsafe_allow_html=True)
 
+    on_delta = (lambda text: placeholder.markdown(text + " ▌")) if STREAM_RESPONSES else None
+    on_wait  = lambda pos, eta: placeholder.markdown(
+        f"⏳ 요청이 몰려 대기 중 · **{pos}번째** · 약 {format_wait(eta)} 남음"
+    )
+    st.session_state.last_call = None
+    t0     = time.perf_counter()
+    cached = get_response_cache().lookup(or_messages, models) if RESPONSE_CACHE else None
+    if cached:
+        get_metrics().record_cache_hit()
+        answer, error = cached[0], ""
+        elapsed = time.perf_counter() - t0
+        st.session_state.last_call = {
+            "model": cached[1], "ttft": elapsed, "total": elapsed, "cached": True,
+            **({"prefetched": True} if prefetched else {}),
+        }
+        if prefetched:
+            get_metrics().record_prefetch("used")
+    else:
+        with st.spinner(f"◈  분석 중  ·  {cur_model}"):
+            answer, error = call_openrouter(
+                or_messages, on_delta=on_delta, hedge=st.session_state.hedge, on_wait=on_wait,
+                on_reasoning=thinking.update if REASONING_DISPLAY != "hide" else None,
+            )
+        if RESPONSE_CACHE and answer and not error:
+            get_response_cache().put(or_messages, st.session_state.last_call["model"], answer)
+
+    if error:
+        # 스트림이 중간에 끊긴 경우 받은 부분까지는 남겨 둔다
+        answer = (answer + "\n\n" if answer else "") + f"**⚠️ 오류**\n\n{error}"
+
+    timing = st.session_state.last_call
+    reply  = {"role": "assistant", "content": answer, "timing": timing}
+    if thinking.text:
+        reply["reasoning"] = thinking.text
+    add_message(reply)
+    thinking.close()
+
+    placeholder.markdown(answer)
+    if timing:
+        st.markdown(timing_tag(timing), unsafe_allow_html=True)
+
+    # 사용자가 읽는 동안 다음 단계 제안 상위 항목을 미리 받아 둠
+    if st.session_state.prefetch and RESPONSE_CACHE and not error:
+        requests = followup_requests(suggestions(answer)[:PREFETCH_COUNT])
+        if requests:
+            get_prefetcher().start(
+                st.session_state.conversation_id, requests,
+                (st.session_state.key_idx, st.session_state.model_idx),
+            )
+
 # ──────────────────────────────────────────────────────────────
 #  INPUT — 음성 + 텍스트
 # ──────────────────────────────────────────────────────────────
-_, col_c, _ = st.columns([1, 3, 1])
-with col_c:
-    voice = speech_to_text(
-        language="ko",
-        start_prompt="🎙  음성으로 질문하기",
-        stop_prompt="⏹  녹음 중지",
-        just_once=True,
-        use_container_width=True,
-        key="mic",
-    )
+@st.fragment
+def chat_area():
+    """
+    입력 위젯 + 이번 전체 rerun 이후 추가된 대화.
+    fragment라서 질문할 때마다 위쪽 대화 기록을 다시 그리지 않는다.
+    새 턴은 위젯보다 먼저 만든 turns 컨테이너에 그려 입력창 위에 표시.
+    """
+    ensure_resident()  # fragment만 다시 실행될 때도 (오래 쉬다 바로 질문)
+    turns = st.container()
+    with turns:
+        for msg in st.session_state.messages[st.session_state.live_from - st.session_state.msg_base:]:
+            render_message(msg)
+    chips   = st.empty()  # 마지막 답변의 다음 단계 제안 버튼
+    clicked = followup_buttons(chips)
+
+    _, col_c, _ = st.columns([1, 3, 1])
+    with col_c:
+        voice = lazy_import("streamlit_mic_recorder").speech_to_text(
+            language="ko",
+            start_prompt="🎙  음성으로 질문하기",
+            stop_prompt="⏹  녹음 중지",
+            just_once=True,
+            use_container_width=True,
+            key="mic",
+        )
+
+    st.markdown('<div class="or-divider">or type below</div>', unsafe_allow_html=True)
+
+    user_input = st.chat_input("무엇이든 질문하세요  —  깊이 있는 통찰로 답변드립니다")
+    text = voice or user_input or clicked
+    if text:
+        chips.empty()
+        with turns:
+            handle_message(text)
+        followup_buttons(chips)
+        # fragment 구간이 길어지면 전체 rerun으로 기록 쪽에 넘김 (사이드바 상태도 갱신)
+        if message_count() - st.session_state.live_from >= LIVE_TURNS_LIMIT:
+            st.rerun()
+
 
-if voice:
-    handle_message(voice)
-    st.rerun()
+chat_area()
+
+# ──────────────────────────────────────────────────────────────
+#  로딩 시간 리포트
+# ──────────────────────────────────────────────────────────────
+def timing_report(first_paint: float, total: float) -> None:
+    """이번 실행 · 프로세스 콜드 스타트 · 모듈 첫 import 시간 (ms)"""
+    timings = startup_timings()
+    if "콜드 스타트 · 첫 화면" not in timings:
+        timings["콜드 스타트 · 첫 화면"] = first_paint
+        timings["콜드 스타트 · 전체"]   = total
+        log.info(
+            "cold start: first paint %.0f ms, script %.0f ms",
+            first_paint * 1000, total * 1000,
+        )
+    rows = [("이번 실행 · 첫 화면", first_paint), ("이번 실행 · 전체", total)]
+    rows += sorted(timings.items())
+    with timing_slot.expander("⏱ 로딩 시간"):
+        st.markdown(
+            '<div style="font-size:11px;line-height:1.9;color:#5A6060">'
+            + "<br>".join(f"{name} · {sec * 1000:.0f} ms" for name, sec in rows)
+            + "</div>",
+            unsafe_allow_html=True,
+        )
 
-st.markdown('<div class="or-divider">or type below</div>', unsafe_allow_html=True)
 
-user_input = st.chat_input("무엇이든 질문하세요  —  깊이 있는 통찰로 답변드립니다")
-if user_input:
-    handle_message(user_input)
-    st.rerun()
\ No newline at end of file
+timing_report(first_paint, time.perf_counter() - _RUN_T0)
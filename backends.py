@@ -0,0 +1,228 @@
+"""
+추가 백엔드 — OpenAI 호환 서버로 넘기기
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+OpenRouter 무료 한도가 포화일 때 사용자를 실패시키거나 대기열에 세우는 대신
+LAN · localhost의 OpenAI 호환 서버(llama.cpp server · vLLM · Ollama 등)로 보낸다.
+
+  Backend         : 이름 · base_url · Key 목록 · 모델 목록 · 동시 요청 상한 ·
+                    모델별 지연 시간 통계 (백엔드마다 LatencyRouter 하나)
+  BackendRegistry : 설정한 백엔드 전체 — 넘길 (백엔드, 모델) 후보를 예상 시간 순으로
+  load_backends   : BACKENDS_PATH(JSON) · LOCAL_LLM_* 간단 설정 → Backend 목록
+
+OpenRouter는 기본 경로(engine.py의 Key/Model 로테이션 · 요청 한도 · 헬스)이고,
+엔진은 아래 경우에만 여기로 넘긴다
+  · Key 요청 한도가 모두 차 대기열에 서야 할 때
+  · 모든 Key의 오늘 한도가 찼을 때
+  · 모든 (Key, Model) 조합이 차단 중이거나 실패했을 때
+  · OpenRouter Key가 없을 때
+동시 요청 상한이 찬 백엔드는 건너뛴다 — 로컬 GPU를 넘치게 하지 않고, 자리가 없으면
+원래 경로(대기열 · 오류 안내)로 돌아간다. 헬스(차단)는 엔진의 HealthRegistry를
+Key 식별자 "<이름>/<번호>"로 같이 쓴다.
+Streamlit에 의존하지 않는다.
+
+BACKENDS_PATH JSON 예:
+  [{"name": "gpu-box", "base_url": "http://10.0.0.5:8000/v1", "api_keys": ["token"],
+    "models": [{"id": "Qwen/Qwen2.5-14B-Instruct", "context_length": 32768}],
+    "max_concurrency": 4}]
+  models를 빼면 GET {base_url}/models로 조회 (vLLM max_model_len도 읽음).
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import json
+import logging
+import threading
+import time
+
+from context import DEFAULT_CONTEXT_LENGTH
+from router import LatencyRouter
+
+log = logging.getLogger("mentor.backends")
+
+MODELS_RETRY    = 60.0   # /models 조회 실패 후 다시 시도할 간격(초)
+MODELS_TIMEOUT  = 3.0    # /models 조회 타임아웃(초) — 사용자 요청 경로에서 불릴 수 있음
+NO_KEY          = "none" # Key 없는 서버에도 Authorization 헤더는 보냄 (openai SDK가 요구)
+
+
+def fetch_models(base_url: str, api_key: str = "", timeout: float = MODELS_TIMEOUT) -> list:
+    """GET {base_url}/models → [{"id", "context_length"}]. 실패는 예외로."""
+    import requests  # 지연 import — 처음 넘길 때만 사용
+
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    resp = requests.get(f"{base_url.rstrip('/')}/models", headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    return [
+        {
+            "id":             m["id"],
+            "context_length": m.get("context_length") or m.get("max_model_len") or DEFAULT_CONTEXT_LENGTH,
+        }
+        for m in resp.json().get("data", [])
+    ]
+
+
+def _model_info(models: list) -> list:
+    """설정의 models — 문자열 또는 {"id", "context_length"} → 메타데이터 목록"""
+    return [
+        {"id": m, "context_length": DEFAULT_CONTEXT_LENGTH} if isinstance(m, str)
+        else {"context_length": DEFAULT_CONTEXT_LENGTH, **m}
+        for m in models
+    ]
+
+
+class Backend:
+    """
+    OpenAI 호환 서버 1개.
+    models: 설정한 모델 목록 (없으면 첫 사용 때 /models 조회)
+    max_concurrency: 이 서버에 동시에 보낼 요청 수 상한 (스트림이 끝날 때까지 자리를 차지)
+    """
+
+    def __init__(
+        self, name: str, base_url: str, api_keys: list = None, models: list = None,
+        max_concurrency: int = 2,
+    ):
+        self.name            = name
+        self.base_url        = base_url.rstrip("/")
+        self.api_keys        = list(api_keys or []) or [NO_KEY]
+        self.key_ids         = [f"{name}/{i + 1}" for i in range(len(self.api_keys))]
+        self.max_concurrency = max(1, max_concurrency)
+        self.router          = LatencyRouter(explore=0.0)  # 이 서버 모델들의 지연 시간 통계
+        self._info           = _model_info(models) if models else None
+        self._fetched_at     = 0.0
+        self._in_flight      = 0
+        self._served         = 0
+        self._next_key       = 0
+        self._clients        = {}
+        self._lock           = threading.Lock()
+
+    # ── 모델 ─────────────────────────────────────────────────
+    def model_info(self) -> list:
+        """모델 메타데이터 — 설정에 없으면 /models 조회 (실패하면 빈 목록, MODELS_RETRY 뒤 재시도)"""
+        with self._lock:
+            if self._info is not None:
+                return self._info
+            if time.time() - self._fetched_at < MODELS_RETRY:
+                return []
+            self._fetched_at = time.time()
+        try:
+            info = fetch_models(self.base_url, self.api_keys[0] if self.api_keys[0] != NO_KEY else "")
+        except Exception as e:
+            log.warning("backend %s: /models 조회 실패: %s", self.name, e)
+            return []
+        with self._lock:
+            self._info = info
+        return info
+
+    def models(self) -> list:
+        return [m["id"] for m in self.model_info()]
+
+    def info(self, model: str) -> dict | None:
+        return next((m for m in self.model_info() if m["id"] == model), None)
+
+    def context_length(self, model: str) -> int:
+        info = self.info(model)
+        return info["context_length"] if info else DEFAULT_CONTEXT_LENGTH
+
+    # ── 자리 · Key · 클라이언트 ──────────────────────────────
+    def try_acquire(self) -> bool:
+        """동시 요청 자리 하나 — 상한이 찼으면 False (기다리지 않음)"""
+        with self._lock:
+            if self._in_flight >= self.max_concurrency:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, served: bool = False) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._served    += served
+
+    def next_key(self) -> int:
+        """요청마다 Key를 돌려 가며 사용"""
+        with self._lock:
+            ki = self._next_key % len(self.api_keys)
+            self._next_key += 1
+            return ki
+
+    def client(self, ki: int, make):
+        """Key별 장수명 클라이언트 — make(api_key, base_url)로 만듦 (엔진의 _make_client)"""
+        with self._lock:
+            if ki not in self._clients:
+                self._clients[ki] = make(self.api_keys[ki], self.base_url)
+            return self._clients[ki]
+
+    def status(self) -> dict:
+        """사이드바 표시용 — 사용 중 자리 · 넘겨받아 답한 수 · 가장 빠른 모델의 예상 시간"""
+        with self._lock:
+            in_flight, served, info, fetched = self._in_flight, self._served, self._info, self._fetched_at
+        best = self.router.snapshot([m["id"] for m in info])[:1] if info else []
+        return {
+            "name":      self.name,
+            "in_flight": in_flight,
+            "limit":     self.max_concurrency,
+            "served":    served,
+            "models":    len(info) if info is not None else (0 if fetched else None),  # None = 조회 전 · 0 = 조회 실패
+            "best":      best[0] if best else None,
+        }
+
+
+class BackendRegistry:
+    """설정한 추가 백엔드 전체. 비어 있으면 거짓 — 엔진이 넘기기를 건너뜀."""
+
+    def __init__(self, backends: list):
+        self.backends = list(backends)
+
+    def __bool__(self) -> bool:
+        return bool(self.backends)
+
+    def candidates(self) -> list:
+        """
+        넘길 (백엔드, 모델) 후보 — 각 백엔드 라우터의 예상 시간 순.
+        같으면 설정 순서 (앞에 적은 백엔드 · 모델 우선). 상한이 찬 백엔드도 포함 —
+        자리는 보낼 때 try_acquire로 확인.
+        """
+        scored = []
+        for bi, backend in enumerate(self.backends):
+            for mi, row in enumerate(backend.router.snapshot(backend.models())):
+                scored.append((row["score"], bi, mi, backend, row["model"]))
+        scored.sort(key=lambda s: s[:3])
+        return [(backend, model) for *_, backend, model in scored]
+
+    def status(self) -> list:
+        return [b.status() for b in self.backends]
+
+
+def load_backends(
+    path: str = "", local_url: str = "", local_models: str = "", local_key: str = "",
+    local_concurrency: int = 2,
+) -> list:
+    """
+    path: 백엔드 목록 JSON 파일 (위 형식) · local_url: 서버 하나를 환경 변수만으로 —
+    이름 "local", local_models는 쉼표 구분 (비우면 /models 조회).
+    설정 오류는 로그만 남기고 그 백엔드를 뺀다 (앱은 OpenRouter만으로 계속 동작).
+    """
+    backends = []
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)
+            for e in entries:
+                backends.append(Backend(
+                    name            = e["name"],
+                    base_url        = e["base_url"],
+                    api_keys        = e.get("api_keys"),
+                    models          = e.get("models"),
+                    max_concurrency = e.get("max_concurrency", 2),
+                ))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.error("BACKENDS_PATH %s 읽기 실패: %s", path, e)
+    if local_url:
+        backends.append(Backend(
+            name            = "local",
+            base_url        = local_url,
+            api_keys        = [local_key] if local_key else None,
+            models          = [m.strip() for m in local_models.split(",") if m.strip()] or None,
+            max_concurrency = local_concurrency,
+        ))
+    names = [b.name for b in backends]
+    if len(set(names)) != len(names):
+        log.error("백엔드 이름이 겹칩니다: %s — 헬스 · 지표가 섞입니다", names)
+    return backends
@@ -0,0 +1,180 @@
+"""
+헤드리스 배치 실행
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+JSONL 질문 목록을 웹 화면과 같은 엔진 · 시스템 프롬프트로 처리한다 (야간 콘텐츠 생성 등).
+
+  python -m app batch questions.jsonl answers.jsonl --concurrency 4
+
+입력 한 줄: {"id": "q1", "prompt": "질문"}  또는  {"id": "q1", "messages": [{"role", "content"}, ...]}
+            id가 없으면 줄 번호. messages에 system이 없으면 SYSTEM_PROMPT를 앞에 붙임.
+출력 한 줄: {"id", "answer", "error", "model", "ttft", "total", "ts"} — 끝나는 순서대로 바로 기록.
+
+체크포인트는 출력 파일 자체. 중단 후 다시 실행하면 이미 성공한 id는 건너뛰고
+나머지(실패 포함)만 처리한다. 같은 id가 여러 줄이면 마지막 줄이 최종 결과.
+동시에 --concurrency건까지 보내고, Key별 분당 · 일일 한도는 엔진의 요청 한도가 지킨다
+(한도가 차면 작업이 대기열에서 --max-wait초까지 차례를 기다림 — 추가 백엔드를 설정했으면
+그 서버에 자리가 있는 동안은 그쪽으로 넘김, backends.py).
+스트리밍하지 않으므로 답변 전체가 --deadline초 안에 와야 한다 (대기열 시간 제외).
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from context import build_messages
+from engine import Engine, Session
+
+
+def load_items(path: str) -> list:
+    """입력 JSONL → 작업 목록 (id는 문자열로 통일)"""
+    items, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not row.get("prompt") and not row.get("messages"):
+                raise ValueError(f"{path}:{n}: prompt 또는 messages가 필요합니다")
+            item_id = str(row.get("id", n))
+            if item_id in seen:
+                raise ValueError(f"{path}:{n}: id 중복 — {item_id}")
+            seen.add(item_id)
+            items.append({**row, "id": item_id})
+    return items
+
+
+def completed_ids(path: str) -> set:
+    """출력 파일에서 이미 성공한 id (마지막 줄 기준, 쓰다 끊긴 줄은 무시)"""
+    if not os.path.exists(path):
+        return set()
+    last = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            last[row.get("id")] = row
+    return {item_id for item_id, row in last.items() if row.get("answer") and not row.get("error")}
+
+
+def _ends_mid_line(path: str) -> bool:
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return False
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def request_messages(item: dict, system_prompt: str) -> list:
+    if item.get("messages"):
+        history = [{"role": m["role"], "content": m["content"]} for m in item["messages"]]
+        if history[0]["role"] == "system":
+            return history
+        return build_messages(system_prompt, "", history)
+    return build_messages(system_prompt, "", [{"role": "user", "content": item["prompt"]}])
+
+
+def answer_item(
+    engine: Engine, item: dict, system_prompt: str, key_idx: int, max_wait: float, deadline: float,
+) -> dict:
+    """작업 1건 — 작업마다 새 Session (시작 Key를 돌려 가며 부하 분산)"""
+    session = Session(key_idx=key_idx)
+    try:
+        answer, error = engine.call(
+            request_messages(item, system_prompt), session,
+            purpose="batch", queue_max_wait=max_wait, deadline=deadline,
+        )
+    except Exception as e:  # 한 건의 예외로 배치 전체가 멈추지 않도록
+        answer, error = "", f"{type(e).__name__}: {e}"
+    call = session.last_call or {}
+    return {
+        "id":     item["id"],
+        "answer": answer,
+        "error":  error,
+        "model":  call.get("model"),
+        "ttft":   call.get("ttft"),
+        "total":  call.get("total"),
+        "ts":     time.time(),
+    }
+
+
+def run(
+    items: list, out_path: str, engine: Engine, system_prompt: str,
+    concurrency: int = 4, max_wait: float = 3600.0, deadline: float = 300.0,
+) -> dict:
+    """남은 작업을 처리하며 결과를 out_path에 한 줄씩 추가. Returns: {"skipped", "ok", "error"}"""
+    done  = completed_ids(out_path)
+    todo  = [it for it in items if it["id"] not in done]
+    stats = {"skipped": len(items) - len(todo), "ok": 0, "error": 0}
+    if stats["skipped"]:
+        print(f"이미 완료 {stats['skipped']}건 건너뜀", file=sys.stderr)
+    if not todo:
+        return stats
+
+    keys = max(len(engine.api_keys), 1)
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    t0   = time.perf_counter()
+    with open(out_path, "a", encoding="utf-8") as out:
+        if _ends_mid_line(out_path):
+            out.write("\n")  # 직전 실행이 줄 중간에 끊김 — 그 줄을 닫고 이어 씀
+        futures = [
+            pool.submit(answer_item, engine, it, system_prompt, n % keys, max_wait, deadline)
+            for n, it in enumerate(todo)
+        ]
+        try:
+            for n, fut in enumerate(as_completed(futures), 1):
+                row = fut.result()
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                out.flush()
+                ok = not row["error"]
+                stats["ok" if ok else "error"] += 1
+                detail = (
+                    f"{(row['model'] or '').split('/')[-1]} · {row['total'] or 0:.1f}s" if ok
+                    else row["error"].splitlines()[0][:120]
+                )
+                print(f"[{n}/{len(todo)}] {'✓' if ok else '✗'} {row['id']} · {detail}", file=sys.stderr)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            print("중단됨 — 같은 명령으로 다시 실행하면 이어서 처리합니다", file=sys.stderr)
+            raise
+    pool.shutdown()
+    print(
+        f"완료 {stats['ok']} · 실패 {stats['error']} · {time.perf_counter() - t0:.1f}s",
+        file=sys.stderr,
+    )
+    return stats
+
+
+def main(argv: list, engine: Engine, system_prompt: str) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app batch", description="JSONL 질문 목록을 화면 없이 처리",
+    )
+    parser.add_argument("input", help="입력 JSONL (id · prompt 또는 messages)")
+    parser.add_argument("output", help="출력 JSONL — 체크포인트 겸용, 다시 실행하면 이어서 처리")
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 보낼 질문 수 (기본 4)")
+    parser.add_argument(
+        "--max-wait", type=float, default=3600.0,
+        help="요청 한도가 찼을 때 질문 1건이 대기열에서 기다릴 최대 시간(초, 기본 3600)",
+    )
+    parser.add_argument(
+        "--deadline", type=float, default=300.0,
+        help="질문 1건의 답변을 받을 때까지 쓸 최대 시간(초, 대기열 제외, 기본 300)",
+    )
+    args = parser.parse_args(argv)
+
+    if not engine.api_keys and not engine.backends:
+        print("OPENROUTER_API_KEY_1~3 또는 LOCAL_LLM_BASE_URL · BACKENDS_PATH를 설정해 주세요.", file=sys.stderr)
+        return 2
+    try:
+        stats = run(
+            load_items(args.input), args.output, engine, system_prompt,
+            concurrency=max(1, args.concurrency), max_wait=args.max_wait, deadline=args.deadline,
+        )
+    except KeyboardInterrupt:
+        return 130
+    return 1 if stats["error"] else 0
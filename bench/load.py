@@ -0,0 +1,255 @@
+"""
+동시 접속 부하 테스트
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+`streamlit run app.py` 프로세스 하나가 동시 사용자 몇 명까지 버티는지 잰다.
+로컬 mock 서버(bench/mock_server.py)를 상대로 세션 N개를 동시에 돌리고
+N을 단계적으로 늘린다.
+
+  세션       : AppTest 하나 = 브라우저 탭 하나. 스레드마다 세션 1개가
+               생각 시간(지수 분포) → 질문 → 답변 완료를 반복
+  업스트림   : 첫 토큰 지연은 로그정규 분포(--latency · --latency-sigma),
+               429는 요청 비율(--rate-429)로 주입 — Key · 모델 전환까지 포함해 측정
+  단계별 보고 : 완료 턴 수 · 처리량(턴/초) · 턴 지연 p50/p95/p99 · 오류 턴 ·
+               업스트림 요청 · 429 수 · CPU(%) · RSS(현재 · 최대)
+
+한 프로세스에서 돈다 — 단계 사이에 캐시 자원(헬스 · 라우터 · 클라이언트 등)을
+비우지 않아 실제 서버 프로세스처럼 상태가 이어진다. CPU에는 같은 프로세스의
+mock 서버 몫(요청당 JSON 몇 개)도 들어간다.
+
+AppTest는 한 번에 한 세션만 도는 것을 가정한다 — 실행마다 ScriptCache(app.py 컴파일)와
+mock Runtime을 새로 만들고, 끝나면 전역 Runtime을 지운다. 실제 서버는 둘 다 프로세스에
+하나이므로 여기서도 같이 쓰게 바꾼다 (_share_process_state). 그대로 두면 동시에 도는
+세션이 서로의 Runtime을 지우고, 동시 ast.parse로 CPython이 SystemError를 내기도 한다.
+세션은 단계 시작 전에 하나씩 만들고, 측정 시계는 모든 세션이 준비된 뒤에 시작한다.
+
+결과는 JSON (bench/results/load-<시각>.json) — --compare로 이전 결과와 p50 비교.
+
+실행:
+  python bench/load.py
+  python bench/load.py --steps 1 4 16 32 --duration 60 --latency 0.8 --latency-sigma 0.6
+  python bench/load.py --rate-429 0.2 --env HEDGE_REQUESTS=1
+  python bench/load.py --compare bench/results/load-20260101-120000.json
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import tempfile
+import threading
+import time
+
+from mock_server import Fault, MockServer
+from run import APP_PATH, BENCH_DIR, _git_rev, app_env, compare, logging_quiet, summarize
+
+from memory import process_rss  # run이 ROOT를 sys.path에 넣은 뒤
+
+QUESTIONS = [
+    "파이썬 리스트와 튜플의 차이가 뭐야? ({u}-{t})",
+    "신규 서비스 출시 마케팅 전략을 단계별로 세워 줘. 사용자 {u}, 질문 {t}",
+    "데이터 분석 팀에서 A/B 테스트 결과를 해석할 때 주의할 점을 알려 주세요. ({u}-{t})",
+    "REST API 설계 원칙을 비교해서 자세히 설명해 줘. #{u}.{t}",
+    "오늘 공부 계획을 어떻게 잡으면 좋을까요? 세션 {u} 턴 {t}",
+]
+
+ERROR_MARK = "⚠️ 오류"  # app.py가 모든 조합 실패 시 답변 자리에 남기는 표시
+
+
+def _answer(at) -> str:
+    """세션 기록의 마지막 assistant 메시지 본문"""
+    messages = at.session_state["messages"]
+    return messages[-1]["content"] if messages and messages[-1]["role"] == "assistant" else ""
+
+
+def _share_process_state() -> None:
+    """
+    AppTest 실행들이 실제 서버처럼 ScriptCache · Runtime 하나를 같이 쓰게 한다.
+    Runtime은 처음 만들어진 mock을 계속 돌려줌 — 다른 세션의 실행이 끝나며 지워도 유지.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    shared = local_script_runner.ScriptCache()
+    local_script_runner.ScriptCache = app_test.ScriptCache = lambda: shared
+
+    pinned = []
+
+    def instance(cls):
+        if not pinned and cls._instance is not None:
+            pinned.append(cls._instance)
+        if not pinned:
+            raise RuntimeError("Runtime hasn't been created!")
+        return pinned[0]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists   = classmethod(lambda cls: bool(pinned) or cls._instance is not None)
+    # 이제 메인 스레드(세션 조작)에서도 Runtime이 있다고 보므로 나오는 경고 — 측정과 무관.
+    # streamlit이 실행마다 로그 레벨을 다시 정하므로 레벨 대신 필터로 거른다
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage()
+    )
+
+
+# ── 세션 ─────────────────────────────────────────────────────
+class User:
+    """세션 1개 — 생각하고, 묻고, 답이 끝날 때까지 기다리기를 반복"""
+
+    def __init__(self, uid: int, think: float, rng: random.Random):
+        from streamlit.testing.v1 import AppTest
+
+        self.uid   = uid
+        self.think = think
+        self.rng   = rng
+        self.at    = AppTest.from_file(APP_PATH, default_timeout=120)
+        self.at.run()
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].value)
+
+    def loop(self, deadline: float, turns: list, lock: threading.Lock) -> None:
+        t = 0
+        while True:
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+            if time.perf_counter() >= deadline:
+                return
+            question = self.rng.choice(QUESTIONS).format(u=self.uid, t=t)
+            t0 = time.perf_counter()
+            try:
+                self.at.chat_input[0].set_value(question).run()
+                ok = not self.at.exception and ERROR_MARK not in _answer(self.at)
+            except Exception:
+                ok = False  # 타임아웃 등 — 이 세션은 계속 쓸 수 있다고 보고 이어감
+            with lock:
+                turns.append((time.perf_counter() - t0, ok))
+            t += 1
+
+
+# ── 단계 ─────────────────────────────────────────────────────
+def run_step(server: MockServer, concurrency: int, duration: float, think: float, seed: int) -> dict:
+    users = [User(i, think, random.Random(seed * 1000 + i)) for i in range(concurrency)]
+
+    turns: list = []
+    lock = threading.Lock()
+    server.reset_counters()
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    deadline = wall0 + duration
+    threads = [
+        threading.Thread(target=u.loop, args=(deadline, turns, lock), name=f"load-user-{u.uid}")
+        for u in users
+    ]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()  # 마감 때 진행 중이던 턴은 끝까지 기다려 집계
+    wall = time.perf_counter() - wall0
+    cpu  = time.process_time() - cpu0
+
+    latencies = [s for s, ok in turns if ok]
+    rss = process_rss()
+    return {
+        "concurrency":       concurrency,
+        "wall_s":            round(wall, 2),
+        "turns":             len(turns),
+        "errors":            sum(1 for _, ok in turns if not ok),
+        "throughput":        round(len(latencies) / wall, 3),  # 성공 턴/초
+        "turn_latency":      summarize(latencies) if latencies else None,
+        "upstream_requests": server.requests,
+        "upstream_429":      server.by_status[429],
+        "cpu_percent":       round(100 * cpu / wall, 1),  # 100 = 코어 하나를 꽉 씀
+        "rss_mb":            round(rss / 2**20, 1) if rss else None,
+        "peak_rss_mb":       round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _print_row(r: dict) -> None:
+    lat = r["turn_latency"] or {}
+    print(
+        f"{r['concurrency']:>5}{r['turns']:>7}{r['errors']:>7}{r['throughput']:>9.2f}"
+        f"{lat.get('p50', 0):>10.0f}{lat.get('p95', 0):>10.0f}{lat.get('p99', 0):>10.0f}"
+        f"{r['upstream_429']:>7}{r['cpu_percent']:>7.1f}{r['rss_mb'] or 0:>9.1f}{r['peak_rss_mb']:>9.1f}",
+        flush=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Master Mentor 동시 접속 부하 테스트")
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="단계별 동시 세션 수")
+    parser.add_argument("--duration", type=float, default=30, help="단계별 측정 시간(초)")
+    parser.add_argument("--think", type=float, default=1.0, help="턴 사이 평균 생각 시간(초, 지수 분포)")
+    parser.add_argument("--latency", type=float, default=0.5, help="mock 첫 토큰까지 중앙값(초)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="첫 토큰 시간 로그정규 σ")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--rate-429", type=float, default=0.05, help="업스트림 요청 중 429 비율")
+    parser.add_argument("--seed", type=int, default=1, help="세션별 생각 시간 · 질문 순서 시드")
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE",
+        help="앱 환경 변수 덮어쓰기 — 예: HEDGE_REQUESTS=1 · RATE_LIMIT=1",
+    )
+    parser.add_argument("--out", help="결과 JSON 경로 (기본: bench/results/load-<시각>.json)")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON")
+    args = parser.parse_args()
+
+    logging_quiet()
+    _share_process_state()
+    workdir = tempfile.mkdtemp(prefix="mentor-load-")
+    server  = MockServer(
+        latency        = args.latency,
+        latency_sigma  = args.latency_sigma,
+        tokens_per_sec = args.tokens_per_sec,
+        answer_tokens  = args.answer_tokens,
+    ).start()
+    env = app_env(server.url, workdir)
+    env.update(kv.split("=", 1) for kv in args.env)
+    os.environ.update(env)
+
+    # 버리는 1턴 — 지연 import · 카탈로그 적재가 첫 단계 측정에 섞이지 않도록
+    User(-1, 0, random.Random(0)).at.chat_input[0].set_value("워밍업").run()
+    server.faults = [Fault(429, rate=args.rate_429)] if args.rate_429 > 0 else []
+
+    print(f"{'conc':>5}{'turns':>7}{'err':>7}{'turn/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}"
+          f"{'429':>7}{'cpu%':>7}{'rss MB':>9}{'peak':>9}")
+    results = {}
+    started = time.time()
+    for n in args.steps:
+        results[f"c{n}"] = run_step(server, n, args.duration, args.think, args.seed)
+        _print_row(results[f"c{n}"])
+    server.stop()
+
+    report = {
+        "meta": {
+            "timestamp":     time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_rev":       _git_rev(),
+            "python":        platform.python_version(),
+            "platform":      platform.platform(),
+            "cpus":          os.cpu_count(),
+            "steps":         args.steps,
+            "step_duration": args.duration,
+            "think":         args.think,
+            "latency":       args.latency,
+            "latency_sigma": args.latency_sigma,
+            "rate_429":      args.rate_429,
+            "seed":          args.seed,
+            "env":           args.env,
+            "duration":      round(time.time() - started, 1),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join(
+        BENCH_DIR, "results", time.strftime("load-%Y%m%d-%H%M%S.json"),
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"→ {out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
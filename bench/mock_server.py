@@ -0,0 +1,294 @@
+"""
+벤치마크용 OpenAI 호환 mock 서버
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+네트워크 없이 요청 엔진을 측정하기 위한 로컬 서버.
+
+  GET  /models            : 무료 모델 목록 (OpenRouter 형식)
+  POST /chat/completions  : 일반 · 스트리밍(SSE) 응답
+  · 응답 시간: 첫 토큰까지 latency초, 이후 tokens_per_sec 속도로 answer_tokens개
+    (latency_sigma > 0이면 첫 토큰 시간을 중앙값 latency인 로그정규 분포에서 뽑음 — 실제 꼬리 지연 흉내)
+  · 오류 주입: Fault 규칙 — 모델/Key 부분 문자열이 맞으면 status 반환
+    (비율 rate, 남은 횟수 times, Retry-After 헤더)
+  · 프롬프트 캐시 흉내: 이전 요청과 같은 메시지 앞부분을 usage.prompt_tokens_details.cached_tokens로 보고
+  · 집계: 요청 수 · 주입한 오류 수 · 상태 코드별 오류 수 (by_status)
+
+단독 실행:
+  python bench/mock_server.py --port 18080 --latency 0.2 --latency-sigma 0.5 --fault llama=429:0.5
+  → OPENROUTER_BASE_URL=http://127.0.0.1:18080 streamlit run app.py
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODELS = [
+    {"id": "meta-llama/llama-3.3-70b-instruct:free", "context_length": 131072},
+    {"id": "deepseek/deepseek-r1:free",              "context_length": 163840},
+    {"id": "qwen/qwen-2.5-72b-instruct:free",        "context_length": 32768},
+]
+
+_ERROR_MESSAGES = {
+    404: "No endpoints found for this model",
+    429: "Rate limit exceeded: free-models-per-min",
+    503: "Provider returned error: overloaded",
+}
+
+
+@dataclass
+class Fault:
+    """model · key 부분 문자열이 모두 맞는 요청에 오류 응답 (빈 문자열 = 전부)"""
+    status:      int
+    model:       str          = ""
+    key:         str          = ""
+    rate:        float        = 1.0    # 이 비율로만 실패
+    times:       int | None   = None   # 남은 적용 횟수 (None = 무제한)
+    retry_after: float | None = None   # Retry-After 헤더(초)
+
+    def matches(self, model: str, key: str) -> bool:
+        if self.times is not None and self.times <= 0:
+            return False
+        return self.model in model and self.key in key and random.random() < self.rate
+
+
+def _text(message: dict) -> str:
+    """content가 문자열이든 text part 목록(cache_control 표시)이든 본문만"""
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(p.get("text", "") for p in content)
+    return content
+
+
+def parse_fault(spec: str) -> Fault:
+    """'llama=429:0.5' · '=503' · 'key:sk-x=429' 형식 → Fault"""
+    target, _, rest = spec.partition("=")
+    status, _, rate = rest.partition(":")
+    fault = Fault(status=int(status), rate=float(rate) if rate else 1.0)
+    if target.startswith("key:"):
+        fault.key = target[4:]
+    else:
+        fault.model = target
+    return fault
+
+
+class MockServer:
+    """
+    별도 스레드에서 도는 mock 서버. with 문 또는 start()/stop().
+    latency · faults 등은 실행 중에 바꿔도 다음 요청부터 반영된다.
+    """
+
+    def __init__(
+        self,
+        port:           int   = 0,      # 0 = 빈 포트 자동 선택
+        latency:        float = 0.05,   # 첫 토큰까지(초) — latency_sigma > 0이면 중앙값
+        latency_sigma:  float = 0.0,    # 로그정규 분포의 σ (0 = 항상 latency)
+        tokens_per_sec: float = 200.0,
+        answer_tokens:  int   = 60,
+        models:         list  = None,
+        faults:         list  = None,
+        retry_after:    float | None = None,  # 규칙에 없을 때 429에 붙일 기본값
+    ):
+        self.latency        = latency
+        self.latency_sigma  = latency_sigma
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens  = answer_tokens
+        self.models         = models or DEFAULT_MODELS
+        self.faults         = faults or []
+        self.retry_after    = retry_after
+        self.requests       = 0
+        self.failures       = 0
+        self.by_status      = Counter()  # 주입한 오류의 상태 코드별 수
+        self._prefixes: set = set()   # 지금까지 본 메시지 앞부분의 해시
+        self._lock   = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = self.failures = 0
+            self.by_status.clear()
+
+    def _pick_fault(self, model: str, key: str) -> Fault | None:
+        with self._lock:
+            self.requests += 1
+            for f in self.faults:
+                if f.matches(model, key):
+                    if f.times is not None:
+                        f.times -= 1
+                    self.failures += 1
+                    self.by_status[f.status] += 1
+                    return f
+        return None
+
+    def first_token_delay(self) -> float:
+        """이번 요청의 첫 토큰까지 시간(초)"""
+        if self.latency_sigma <= 0:
+            return self.latency
+        return self.latency * random.lognormvariate(0, self.latency_sigma)
+
+    def _cached_tokens(self, messages: list) -> int:
+        """이전 요청들과 겹치는 가장 긴 메시지 앞부분의 길이 (글자 수를 토큰으로 간주)"""
+        h, cached, hit = hashlib.sha256(), 0, True
+        with self._lock:
+            for m in messages:
+                h.update(json.dumps(m, sort_keys=True, ensure_ascii=False).encode())
+                digest = h.hexdigest()
+                if hit and digest in self._prefixes:
+                    cached += len(_text(m))
+                else:
+                    hit = False
+                    self._prefixes.add(digest)
+        return cached
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status: int, body: dict, headers: dict = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._json(200, {"data": mock.models})
+                else:
+                    self._json(404, {"error": {"message": "not found", "code": 404}})
+
+            def do_POST(self):
+                size = int(self.headers.get("Content-Length", 0))
+                req  = json.loads(self.rfile.read(size) or b"{}")
+                model = req.get("model", "")
+                fault = mock._pick_fault(model, self.headers.get("Authorization", ""))
+                if fault is not None:
+                    headers = {}
+                    retry_after = fault.retry_after if fault.retry_after is not None else mock.retry_after
+                    if fault.status == 429 and retry_after is not None:
+                        headers["Retry-After"] = f"{retry_after:g}"
+                    message = _ERROR_MESSAGES.get(fault.status, "injected error")
+                    self._json(
+                        fault.status,
+                        {"error": {"message": message, "code": fault.status}},
+                        headers,
+                    )
+                    return
+
+                time.sleep(mock.first_token_delay())
+                words = [f"토큰{i}" for i in range(mock.answer_tokens)]
+                words.append(f"(model={model}, n={len(req.get('messages', []))})")
+                usage = {
+                    "prompt_tokens":     sum(len(_text(m)) for m in req.get("messages", [])),
+                    "completion_tokens": mock.answer_tokens,
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                usage["prompt_tokens_details"] = {"cached_tokens": mock._cached_tokens(req.get("messages", []))}
+                if req.get("stream"):
+                    self._stream(model, words, usage)
+                else:
+                    time.sleep(mock.answer_tokens / mock.tokens_per_sec)
+                    self._json(200, {
+                        "id": "mock", "object": "chat.completion", "created": int(time.time()),
+                        "model": model, "usage": usage,
+                        "choices": [{
+                            "index": 0, "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": " ".join(words)},
+                        }],
+                    })
+
+            def _stream(self, model: str, words: list, usage: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                delay = 1 / mock.tokens_per_sec
+                for i, word in enumerate(words):
+                    self._event({
+                        "id": "mock", "object": "chat.completion.chunk", "created": 0, "model": model,
+                        "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                    })
+                    if i:
+                        time.sleep(delay)
+                self._event({
+                    "id": "mock", "object": "chat.completion.chunk", "created": 0, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+                })
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _event(self, body: dict):
+                self.wfile.write(f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode())
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 호환 mock 서버")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=0.05, help="첫 토큰까지(초)")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="첫 토큰 시간 로그정규 σ (0 = 고정)")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--retry-after", type=float, default=None, help="429 응답의 Retry-After(초)")
+    parser.add_argument(
+        "--fault", action="append", default=[], metavar="TARGET=STATUS[:RATE]",
+        help="오류 주입 — 예: llama=429:0.5 · =503:0.1 · key:sk-or-x=402",
+    )
+    args = parser.parse_args()
+    server = MockServer(
+        port           = args.port,
+        latency        = args.latency,
+        latency_sigma  = args.latency_sigma,
+        tokens_per_sec = args.tokens_per_sec,
+        answer_tokens  = args.answer_tokens,
+        faults         = [parse_fault(f) for f in args.fault],
+        retry_after    = args.retry_after,
+    )
+    print(f"mock server: {server.url}")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
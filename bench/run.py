@@ -0,0 +1,337 @@
+"""
+오프라인 마이크로벤치마크
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+로컬 mock 서버(bench/mock_server.py)를 상대로 앱의 자체 오버헤드를 잰다.
+네트워크 · API Key 불필요.
+
+  engine      질문 1턴 시간 — 정상 / 오류 주입(404 · 429 · 503 · Retry-After)
+              → 로테이션 한 단계(실패 1회 후 전환)의 오버헤드
+  context     요청 메시지 구성 비용 (요약 경계 · 메시지 조립 · 토큰 계산 · 캐시 키)
+              vs 대화 길이
+  render      rerun 1회 시간 vs 저장된 대화 길이 (AppTest)
+  cold_start  새 프로세스에서 streamlit import + 첫 실행
+
+결과는 JSON (bench/results/bench-<시각>.json) — --compare로 이전 결과와 비교.
+
+실행:
+  python bench/run.py
+  python bench/run.py --only engine render --reps 5
+  python bench/run.py --compare bench/results/bench-20260101-120000.json
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT      = os.path.dirname(BENCH_DIR)
+APP_PATH  = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+from mock_server import Fault, MockServer  # noqa: E402
+
+BENCH_KEYS = ["sk-bench-1", "sk-bench-2"]
+
+ENGINE_SCENARIOS = {
+    # 이름: (주입할 오류, 설명)
+    "clean":           (lambda: [], "오류 없음"),
+    "not_found_1":     (lambda: [Fault(404, model="llama")], "404 모델 1개 → 1단계 전환"),
+    "overloaded_2":    (lambda: [Fault(503, model="llama"), Fault(503, model="deepseek")],
+                        "503 모델 2개 → 2단계 전환"),
+    "rate_limited_key": (lambda: [Fault(429, key=BENCH_KEYS[0])], "KEY 1만 429 → Key 전환"),
+    "retry_after":     (lambda: [Fault(429, times=6, retry_after=0.5)],
+                        "모든 조합 429 + Retry-After 0.5s → 대기 후 재시도"),
+}
+
+
+# ── 공통 ─────────────────────────────────────────────────────
+def summarize(samples: list) -> dict:
+    """초 단위 표본 → ms 통계"""
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "unit": "ms",
+        "n":    len(ms),
+        "min":  round(ms[0], 3),
+        "p50":  round(statistics.median(ms), 3),
+        "p95":  round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "p99":  round(ms[min(len(ms) - 1, int(len(ms) * 0.99))], 3),
+        "mean": round(statistics.fmean(ms), 3),
+        "max":  round(ms[-1], 3),
+    }
+
+
+def logging_quiet() -> None:
+    """AppTest bare 모드 경고 등 측정과 무관한 로그 숨김"""
+    import logging
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+
+def app_env(server_url: str, workdir: str) -> dict:
+    """mock 서버 · 임시 저장 경로 · 결정적 라우팅으로 앱을 실행할 환경 변수"""
+    env = {
+        "OPENROUTER_BASE_URL":     server_url,
+        "MODEL_CATALOG_PATH":      os.path.join(workdir, "models.json"),
+        "CONVERSATION_STORE_PATH": os.path.join(workdir, "conversations.sqlite3"),
+        "RESPONSE_CACHE":          "0",  # 매 턴 실제 호출을 재도록
+        "HEDGE_REQUESTS":          "0",
+        "ROUTER_EXPLORE":          "0",  # 모델 순서를 카탈로그 순으로 고정
+        "RATE_LIMIT":              "0",  # 수백 번 호출해도 로컬 한도에 걸리지 않도록
+        "SHARED_STATE":            "0",  # 시나리오마다 헬스 상태를 새로 시작
+    }
+    for i, key in enumerate(BENCH_KEYS, 1):
+        env[f"OPENROUTER_API_KEY_{i}"] = key
+    return env
+
+
+def _fresh_app(query: dict = None):
+    """프로세스 공용 캐시(헬스 · 라우터 · 클라이언트 등)를 비우고 새 세션으로 첫 실행"""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    for k, v in (query or {}).items():
+        at.query_params[k] = v
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return at
+
+
+# ── engine ───────────────────────────────────────────────────
+def bench_engine(server: MockServer, reps: int) -> dict:
+    # 버리는 1턴 — 지연 import(openai · httpx)가 첫 시나리오 측정에 섞이지 않도록
+    server.faults = []
+    _fresh_app().chat_input[0].set_value("워밍업").run()
+
+    results = {}
+    for name, (faults, desc) in ENGINE_SCENARIOS.items():
+        samples, hops = [], []
+        for i in range(reps):
+            server.faults = []
+            at = _fresh_app()
+            server.faults = faults()
+            server.reset_counters()
+            t0 = time.perf_counter()
+            at.chat_input[0].set_value(f"벤치마크 질문 {name} {i}").run()
+            samples.append(time.perf_counter() - t0)
+            hops.append(server.failures)
+            if at.exception:
+                raise RuntimeError(at.exception[0].value)
+        results[name] = {**summarize(samples), "failed_requests": statistics.fmean(hops), "desc": desc}
+
+    # 실패 1회당 추가 시간 — 전환 단계 수가 분명한 시나리오로 계산
+    clean = results["clean"]["p50"]
+    per_hop = [
+        (results[n]["p50"] - clean) / results[n]["failed_requests"]
+        for n in ("not_found_1", "overloaded_2", "rate_limited_key")
+        if results[n]["failed_requests"]
+    ]
+    results["rotation_overhead_per_hop"] = {
+        "unit": "ms",
+        "p50":  round(statistics.median(per_hop), 3) if per_hop else None,
+        "desc": "오류 응답 1회 → 다음 조합 전환에 더해지는 시간 (mock 왕복 포함)",
+    }
+    return results
+
+
+# ── context ──────────────────────────────────────────────────
+def _system_prompt() -> str:
+    """app.py를 실행하지 않고 SYSTEM_PROMPT 문자열만 읽음"""
+    with open(APP_PATH, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", "") == "SYSTEM_PROMPT":
+            return ast.literal_eval(node.value)
+    raise LookupError("SYSTEM_PROMPT not found in app.py")
+
+
+def _synthetic_history(n: int) -> list:
+    user = "데이터 분석 파이프라인에서 A/B 테스트 결과를 어떻게 해석해야 할까요? 표본 크기는 {i}입니다."
+    bot  = ("좋은 질문입니다. 통계적 유의성(p-value)과 효과 크기(effect size)를 함께 보세요. " * 6
+            + "[다음 단계 제안] 검정력 분석을 해 보세요. #{i}")
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": (user if i % 2 == 0 else bot).format(i=i)}
+        for i in range(n)
+    ]
+
+
+def bench_context(reps: int, lengths=(10, 50, 200, 1000)) -> dict:
+    import context
+    from response_cache import ResponseCache
+
+    system        = _system_prompt()
+    system_tokens = context.precount(system)  # 앱처럼 프로세스당 한 번
+
+    def build(history):
+        budget = context.history_budget(32768, system_tokens)
+        upto   = context.fold_point(history, 0, budget)
+        msgs   = context.build_messages(system, "요약", history[upto:])
+        context.count_message_tokens(msgs)
+        ResponseCache.make_key(msgs, "meta-llama/llama-3.3-70b-instruct:free")
+
+    results = {}
+    for n in lengths:
+        history = _synthetic_history(n)
+        cold, warm = [], []
+        for _ in range(max(reps, 20)):
+            context.count_tokens.cache_clear()
+            t0 = time.perf_counter(); build(history); cold.append(time.perf_counter() - t0)
+            t0 = time.perf_counter(); build(history); warm.append(time.perf_counter() - t0)
+        results[f"history_{n}"] = {"cold": summarize(cold), "warm": summarize(warm)}
+    return results
+
+
+# ── render ───────────────────────────────────────────────────
+def bench_render(workdir: str, reps: int, lengths=(0, 20, 100, 400)) -> dict:
+    from store import ConversationStore, new_conversation_id
+
+    store   = ConversationStore(os.path.join(workdir, "conversations.sqlite3"))
+    history = _synthetic_history(max(lengths))
+    results = {}
+    for n in lengths:
+        cid = new_conversation_id()
+        for msg in history[:n]:
+            store.append(cid, msg)
+        at = _fresh_app({"c": cid})
+        windowed, full = [], []
+        for _ in range(reps):
+            t0 = time.perf_counter(); at.run(); windowed.append(time.perf_counter() - t0)
+        at.session_state["history_window"] = max(n, 1)  # 전체 기록을 한 번에 그릴 때
+        for _ in range(reps):
+            t0 = time.perf_counter(); at.run(); full.append(time.perf_counter() - t0)
+        results[f"history_{n}"] = {"windowed": summarize(windowed), "full": summarize(full)}
+    return results
+
+
+# ── cold start ───────────────────────────────────────────────
+_COLD_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import streamlit
+t1 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+t2 = time.perf_counter()
+at.run()
+t3 = time.perf_counter()
+print(json.dumps({"import_streamlit": t1 - t0, "first_run": t3 - t2, "total": t3 - t0,
+                  "openai_loaded": "openai" in sys.modules}))
+"""
+
+
+def bench_cold_start(env: dict, reps: int) -> dict:
+    runs = []
+    for _ in range(reps):
+        out = subprocess.run(
+            [sys.executable, "-c", _COLD_SCRIPT, APP_PATH],
+            env={**os.environ, **env}, capture_output=True, text=True, check=True, cwd=ROOT,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        **{k: summarize([r[k] for r in runs]) for k in ("import_streamlit", "first_run", "total")},
+        "openai_loaded_on_first_paint": any(r["openai_loaded"] for r in runs),
+    }
+
+
+# ── 결과 비교 ────────────────────────────────────────────────
+def _flatten(tree: dict, prefix: str = "") -> dict:
+    """{"engine": {"clean": {"p50": ...}}} → {"engine.clean": p50}"""
+    flat = {}
+    for k, v in tree.items():
+        if isinstance(v, dict) and "p50" in v:
+            flat[prefix + k] = v["p50"]
+        elif isinstance(v, dict):
+            flat.update(_flatten(v, f"{prefix}{k}."))
+    return flat
+
+
+def compare(base: dict, new: dict) -> None:
+    old, cur = _flatten(base["results"]), _flatten(new["results"])
+    print(f"\n{'metric':<48}{'base p50':>12}{'new p50':>12}{'ratio':>8}")
+    for k in sorted(cur):
+        if k in old and old[k] and cur[k] is not None:
+            ratio = cur[k] / old[k]
+            flag  = "  ▲" if ratio > 1.2 else ("  ▼" if ratio < 0.8 else "")
+            print(f"{k:<48}{old[k]:>12.2f}{cur[k]:>12.2f}{ratio:>8.2f}{flag}")
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Master Mentor 오프라인 벤치마크")
+    parser.add_argument(
+        "--only", nargs="+", choices=["engine", "context", "render", "cold_start"],
+        default=["engine", "context", "render", "cold_start"],
+    )
+    parser.add_argument("--reps", type=int, default=5, help="시나리오별 반복 횟수")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock 첫 토큰까지(초)")
+    parser.add_argument("--out", help="결과 JSON 경로 (기본: bench/results/bench-<시각>.json)")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON")
+    args = parser.parse_args()
+
+    logging_quiet()
+    workdir = tempfile.mkdtemp(prefix="mentor-bench-")
+    server  = MockServer(latency=args.latency).start()
+    env     = app_env(server.url, workdir)
+    os.environ.update(env)
+
+    results = {}
+    started = time.time()
+    for name in args.only:
+        print(f"▶ {name} …", flush=True)
+        if name == "engine":
+            results[name] = bench_engine(server, args.reps)
+        elif name == "context":
+            results[name] = bench_context(args.reps)
+        elif name == "render":
+            results[name] = bench_render(workdir, args.reps)
+        else:
+            results[name] = bench_cold_start(env, args.reps)
+    server.stop()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_rev":   _git_rev(),
+            "python":    platform.python_version(),
+            "platform":  platform.platform(),
+            "reps":      args.reps,
+            "latency":   args.latency,
+            "duration":  round(time.time() - started, 1),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join(
+        BENCH_DIR, "results", time.strftime("bench-%Y%m%d-%H%M%S.json"),
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for metric, p50 in _flatten(results).items():
+        print(f"  {metric:<48}{p50 if p50 is not None else '-':>12}")
+    print(f"→ {out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
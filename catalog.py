@@ -0,0 +1,197 @@
+"""
+모델 카탈로그
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+OpenRouter 무료 모델 목록을 백그라운드 스레드가 주기적으로 갱신한다.
+
+  · stale-while-revalidate: 조회는 네트워크를 기다리지 않고 마지막으로 성공한
+    목록을 즉시 반환, 갱신은 스레드가 ttl마다 (실패 시 retry마다) 수행
+  · 디스크 스냅샷: 성공할 때마다 저장 → 재시작 직후에도 네트워크 없이 바로 사용.
+    같은 스냅샷 파일을 쓰는 다른 워커 프로세스가 먼저 갱신했으면 조회 대신 그 결과를 씀
+  · 갱신 실패: 이전 목록 유지 + 짧은 간격으로 재시도.
+    한 번도 받은 적이 없을 때만 하드코딩 fallback 사용
+  · 메타데이터 보존: context_length · pricing · architecture(modalities) ·
+    top_provider · supported_parameters
+  · 헬스 정리: is_usable(model)이 False인 모델(404 · 과부하 등으로 차단 중)은
+    목록에서 제외 — 차단이 풀리면(half-open) 다시 포함되어 실제 요청이 탐침이 됨
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger("mentor.catalog")
+
+# 스냅샷에 남길 메타데이터 필드
+META_FIELDS = (
+    "id", "name", "context_length", "pricing", "architecture",
+    "top_provider", "supported_parameters",
+)
+
+# 선호 모델 우선 정렬 (있으면 앞으로)
+PREFERRED = ["llama-3.3-70b", "deepseek", "qwen-2.5-72b", "gemma-3"]
+
+
+def fetch_openrouter_models(base_url: str, api_key: str = "", timeout: float = 10) -> list:
+    """GET {base_url}/models → :free 모델의 메타데이터 목록. 실패는 예외로."""
+    import requests  # 지연 import — 백그라운드 스레드에서만 사용
+
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    resp = requests.get(f"{base_url}/models", headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    return [
+        {k: m[k] for k in META_FIELDS if k in m}
+        for m in resp.json().get("data", [])
+        if m["id"].endswith(":free") and m.get("context_length", 0) > 0
+    ]
+
+
+def _preference(model: dict) -> int:
+    for i, p in enumerate(PREFERRED):
+        if p in model["id"]:
+            return i
+    return len(PREFERRED)
+
+
+class ModelCatalog:
+    """
+    fetch: 인자 없이 전체 무료 모델 메타데이터를 돌려주는 함수 (실패 시 예외)
+    models(): 선호 순 정렬 + 헬스 정리 후 상위 max_models개
+    """
+
+    def __init__(
+        self,
+        fetch,
+        snapshot_path: str,
+        fallback:      list,
+        ttl:           float = 3600,  # 성공 후 다음 갱신까지(초)
+        retry:         float = 60,    # 실패 후 재시도까지(초)
+        max_models:    int   = 10,
+        is_usable           = None,   # model_id -> bool
+    ):
+        self.fetch         = fetch
+        self.snapshot_path = snapshot_path
+        self.fallback      = fallback
+        self.ttl           = ttl
+        self.retry         = retry
+        self.max_models    = max_models
+        self.is_usable     = is_usable or (lambda model: True)
+
+        self._lock       = threading.Lock()
+        self._ready      = threading.Event()  # 스냅샷 또는 첫 조회 결과가 생김
+        self._wake       = threading.Event()  # 즉시 갱신 요청
+        self._models     = None
+        self._fetched_at = 0.0
+        self._source     = ""                 # live · snapshot · fallback
+        self._last_error = ""
+        self._refreshing = False
+
+        self._load_snapshot()
+        threading.Thread(target=self._run, name="model-catalog", daemon=True).start()
+
+    # ── 스냅샷 ───────────────────────────────────────────────
+    def _load_snapshot(self) -> bool:
+        """디스크 스냅샷이 지금 가진 목록보다 새로우면 채택"""
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not snap.get("models"):
+            return False
+        if self._models is not None and snap.get("fetched_at", 0.0) <= self._fetched_at:
+            return False
+        with self._lock:
+            self._models     = snap["models"]
+            self._fetched_at = snap.get("fetched_at", 0.0)
+            self._source     = "snapshot"
+        self._ready.set()
+        return True
+
+    def _save_snapshot(self, models: list, fetched_at: float) -> None:
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": fetched_at, "models": models}, f, ensure_ascii=False)
+        os.replace(tmp, self.snapshot_path)  # 원자적 교체 — 쓰다 죽어도 이전 스냅샷 유지
+
+    # ── 백그라운드 갱신 ──────────────────────────────────────
+    def _refresh(self) -> bool:
+        with self._lock:
+            self._refreshing = True
+        try:
+            models = self.fetch()
+            if not models:
+                raise ValueError("빈 모델 목록")
+        except Exception as e:
+            with self._lock:
+                self._last_error = str(e)[:200]
+                self._refreshing = False
+            log.warning("model catalog refresh failed: %s", e)
+            return False
+
+        now = time.time()
+        with self._lock:
+            self._models, self._fetched_at, self._source = models, now, "live"
+            self._last_error = ""
+            self._refreshing = False
+        try:
+            self._save_snapshot(models, now)
+        except OSError as e:
+            log.warning("model catalog snapshot not saved: %s", e)
+        return True
+
+    def _run(self) -> None:
+        # 스냅샷이 아직 신선하면 남은 시간만큼 기다렸다 갱신, 없으면 바로 조회
+        delay = 0.0 if self._models is None else self.ttl - (time.time() - self._fetched_at)
+        while True:
+            if self._wake.wait(timeout=max(0.0, delay)):
+                self._wake.clear()
+            elif self._load_snapshot() and time.time() - self._fetched_at < self.ttl:
+                # 다른 프로세스가 그 사이 갱신함 — 그 시각 기준으로 ttl을 다시 잼
+                delay = self.ttl - (time.time() - self._fetched_at)
+                continue
+            ok = self._refresh()
+            self._ready.set()  # 첫 조회가 실패해도 대기 중인 조회는 fallback으로 진행
+            delay = self.ttl if ok else self.retry
+
+    def refresh_now(self) -> None:
+        """다음 조회를 기다리지 않고 바로 갱신"""
+        self._wake.set()
+
+    # ── 조회 ─────────────────────────────────────────────────
+    def all_models(self, wait: bool = True, timeout: float = 15) -> list | None:
+        """정리 전 전체 무료 모델 메타데이터. wait=False면 첫 조회 전에는 None."""
+        if not self._ready.is_set():
+            if not wait:
+                return None
+            self._ready.wait(timeout=timeout)
+        with self._lock:
+            return self._models or self.fallback
+
+    def models(self, wait: bool = True) -> list | None:
+        """선호 순 + 헬스 정리 후 상위 max_models개. 전부 차단이면 정리 없이 반환."""
+        data = self.all_models(wait)
+        if data is None:
+            return None
+        ordered = sorted(data, key=_preference)
+        usable  = [m for m in ordered if self.is_usable(m["id"])]
+        return (usable or ordered)[: self.max_models]
+
+    def info(self, model_id: str) -> dict | None:
+        for m in self.all_models(wait=False) or self.fallback:
+            if m["id"] == model_id:
+                return m
+        return None
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "source":     self._source or ("fallback" if self._ready.is_set() else "loading"),
+                "age":        time.time() - self._fetched_at if self._fetched_at else None,
+                "count":      len(self._models or []),
+                "refreshing": self._refreshing,
+                "last_error": self._last_error,
+            }
@@ -0,0 +1,179 @@
+"""
+대화 컨텍스트 관리
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+매 턴 전체 대화를 보내는 대신 토큰 예산 안에서
+  · 최근 대화는 원문 그대로
+  · 예산 밖으로 밀려난 오래된 대화는 누적 요약(running summary)으로
+보낸다. 요약은 새로 밀려난 구간만 기존 요약에 합쳐 갱신(증분)하고,
+한 번 접을 때 예산의 LOW_WATERMARK까지 넉넉히 접어 매 턴 요약하지 않게 한다.
+
+요청은 업스트림 프롬프트 캐시가 앞부분을 재사용하도록 배치한다:
+시스템 프롬프트(고정) → 누적 요약(접을 때만 바뀜) → 대화 원문(뒤에 추가만 됨).
+명시적 표시가 필요한 모델에는 with_cache_breakpoints()로 cache_control을 붙인다.
+
+토큰 수는 tiktoken이 설치돼 있으면 cl100k 기준, 없으면 보수적 추정치.
+Streamlit에 의존하지 않는다 (요약 호출은 app.py가 넘겨줌).
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import functools
+import os
+
+DEFAULT_CONTEXT_LENGTH = 8192   # 모델 정보가 없을 때 가정하는 컨텍스트 길이
+MAX_OUTPUT_TOKENS      = 4096   # 답변 최대 길이
+MIN_OUTPUT_TOKENS      = 512    # 이보다 답변 여유가 작으면 그 모델은 건너뜀
+HISTORY_TOKEN_BUDGET   = int(os.getenv("CONTEXT_HISTORY_TOKENS", "6000"))  # 원문 대화 상한
+SUMMARY_TOKEN_BUDGET   = 600    # 누적 요약 자리
+CONTEXT_MARGIN         = 256    # 토큰 추정 오차 여유
+LOW_WATERMARK          = 0.6    # 접을 때 원문 대화를 예산의 60%까지 줄임
+MESSAGE_OVERHEAD       = 4      # 메시지당 role·구분자 토큰
+
+SUMMARY_PROMPT = """너는 대화 기록 정리 담당이다.
+[기존 요약]과 그 뒤에 이어진 [새 대화]를 합쳐 하나의 갱신된 요약을 작성하라.
+- 사용자의 목표·상황·선호, 주요 질문, 멘토가 내린 결론과 핵심 수치를 보존
+- 인사말·반복 설명·예시 문장은 생략
+- 한국어 개조식, 600자 이내
+- 요약 본문만 출력"""
+
+
+@functools.lru_cache(maxsize=1)
+def _encoder():
+    """tiktoken 인코더 (선택 의존성 — 없거나 로드 실패 시 None)"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=8192)  # 지난 메시지는 매 턴 다시 세지 않음
+def count_tokens(text: str) -> int:
+    """텍스트 토큰 수. tiktoken이 없으면 ASCII 4자당 1, 그 외(한글 등) 1자당 1로 추정."""
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text))
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+_PINNED: dict[str, int] = {}  # 고정 텍스트(시스템 프롬프트 등) — LRU에서 밀려나지 않음
+
+
+def precount(text: str) -> int:
+    """매 요청에 들어가는 고정 텍스트의 토큰 수를 한 번만 세어 고정"""
+    if text not in _PINNED:
+        _PINNED[text] = count_tokens(text)
+    return _PINNED[text]
+
+
+def count_message_tokens(messages: list) -> int:
+    """OpenAI 형식 메시지 목록의 프롬프트 토큰 수"""
+    return 3 + sum(
+        MESSAGE_OVERHEAD + (_PINNED.get(m["content"]) or count_tokens(m["content"]))
+        for m in messages
+    )
+
+
+def output_budget(context_length: int, prompt_tokens: int, cap: int = MAX_OUTPUT_TOKENS) -> int:
+    """이 모델에서 답변에 쓸 수 있는 max_tokens, 최대 cap (MIN_OUTPUT_TOKENS 미만이면 0)"""
+    room = min(cap, context_length - prompt_tokens - CONTEXT_MARGIN)
+    return room if room >= MIN_OUTPUT_TOKENS else 0
+
+
+def history_budget(context_length: int, system_tokens: int) -> int:
+    """원문으로 보낼 대화 기록의 토큰 예산 (system_tokens: 시스템 프롬프트 토큰 수)"""
+    fixed = (
+        system_tokens + SUMMARY_TOKEN_BUDGET
+        + min(MAX_OUTPUT_TOKENS, context_length // 2) + CONTEXT_MARGIN
+    )
+    return max(MIN_OUTPUT_TOKENS, min(HISTORY_TOKEN_BUDGET, context_length - fixed))
+
+
+def _suffix_start(history: list, budget: int) -> int:
+    """history[i:]가 budget 안에 들어가는 가장 작은 i (마지막 메시지는 항상 포함)"""
+    used = 0
+    for i in range(len(history) - 1, -1, -1):
+        used += MESSAGE_OVERHEAD + count_tokens(history[i]["content"])
+        if used > budget:
+            return min(i + 1, len(history) - 1)
+    return 0
+
+
+def fold_point(history: list, summary_upto: int, budget: int) -> int:
+    """
+    요약에 접어 넣어야 할 경계. history[:반환값]은 요약, 나머지는 원문.
+    원문이 예산 안이면 summary_upto를 그대로 돌려줌 (요약 갱신 불필요).
+    넘치면 LOW_WATERMARK까지 접고, 원문이 user 메시지로 시작하도록 맞춤.
+    """
+    if _suffix_start(history, budget) <= summary_upto:
+        return summary_upto
+    cut = max(_suffix_start(history, int(budget * LOW_WATERMARK)), summary_upto)
+    while cut < len(history) - 1 and history[cut]["role"] != "user":
+        cut += 1
+    return cut
+
+
+def summary_request(summary: str, dropped: list) -> list:
+    """누적 요약 갱신용 메시지"""
+    lines = [
+        f"{'사용자' if m['role'] == 'user' else '멘토'}: {m['content']}"
+        for m in dropped
+    ]
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": (
+            f"[기존 요약]\n{summary or '(없음)'}\n\n[새 대화]\n" + "\n\n".join(lines)
+        )},
+    ]
+
+
+def fallback_summary(summary: str, dropped: list, max_chars: int = 160) -> str:
+    """요약 호출 실패 시 — 메시지 앞부분만 이어 붙인 추출 요약"""
+    lines = [
+        f"- {'사용자' if m['role'] == 'user' else '멘토'}: "
+        f"{m['content'][:max_chars].strip()}{'…' if len(m['content']) > max_chars else ''}"
+        for m in dropped
+    ]
+    merged = "\n".join(filter(None, [summary, *lines]))
+    # 요약 자리를 넘으면 가장 오래된 줄부터 버림
+    while count_tokens(merged) > SUMMARY_TOKEN_BUDGET and "\n" in merged:
+        merged = merged.split("\n", 1)[1]
+    return merged
+
+
+def build_messages(system_prompt: str, summary: str, recent: list) -> list:
+    """
+    시스템 프롬프트 → 누적 요약 → 최근 대화 원문 순서의 요청 메시지.
+    바뀌지 않는 것부터 앞에 둬서, 요약을 다시 접기 전까지는
+    이전 턴의 요청이 이번 요청의 앞부분과 글자 그대로 같다 (프롬프트 캐시 적중).
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        messages.append({"role": "system", "content": f"[이전 대화 요약]\n{summary}"})
+    messages += [{"role": m["role"], "content": m["content"]} for m in recent]
+    return messages
+
+
+def with_cache_breakpoints(messages: list) -> list:
+    """
+    cache_control 표시를 붙인 사본 (Anthropic · Gemini처럼 명시적 표시가 필요한 모델용).
+    표시 위치 최대 세 곳 (Anthropic 상한 4개):
+      시스템 프롬프트 — 요약이 바뀌어도 재사용
+      앞쪽 system 블록(요약)의 끝
+      이번 질문 직전 — 이전 턴까지의 대화 전체
+    표시한 메시지의 content는 text part 목록으로 바뀐다.
+    """
+    marks = set()
+    fixed = 0
+    while fixed < len(messages) and messages[fixed]["role"] == "system":
+        fixed += 1
+    if fixed:
+        marks.update({0, fixed - 1})
+    if len(messages) - 2 >= fixed:
+        marks.add(len(messages) - 2)
+    return [
+        {**m, "content": [{
+            "type": "text", "text": m["content"], "cache_control": {"type": "ephemeral"},
+        }]} if i in marks else m
+        for i, m in enumerate(messages)
+    ]
@@ -0,0 +1,1010 @@
+"""
+요청 엔진
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+OpenRouter 호출 · Key/Model 로테이션 · 헤징 · 요청 한도 대기열.
+Streamlit에 의존하지 않는다 — 웹 화면(app.py)과 배치 CLI(batch.py)가 같은 엔진을 쓴다.
+
+  Engine  : 프로세스 공용 부품 (카탈로그 · 헬스 · 라우터 · 요청 한도 · 지표 ·
+            Key별 클라이언트 · 스레드 풀). 프로세스당 하나.
+  Session : 호출자별 상태 — 로테이션 커서 · 마지막 호출 기록 · 라우팅 결정.
+            st.session_state처럼 같은 속성을 가진 객체면 무엇이든 된다.
+
+화면 표시는 호출자 몫: on_delta(부분 답변) · on_wait(대기열 순번) · notify(전환 알림).
+설정은 환경 변수로 (아래 상수).
+
+한 호스트에서 워커 프로세스 여러 개(streamlit run 여러 개 · 배치)를 띄우면
+Key 헬스 · 요청 한도 · 모델 카탈로그를 SHARED_STATE_PATH 파일로 함께 쓴다 (state.py).
+
+OpenRouter 무료 한도가 포화면 설정한 추가 백엔드(LAN · localhost의 OpenAI 호환 서버)로
+넘긴다 (backends.py).
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+from backends import BackendRegistry, load_backends
+from catalog import ModelCatalog, fetch_openrouter_models
+from context import (
+    DEFAULT_CONTEXT_LENGTH, MAX_OUTPUT_TOKENS, count_message_tokens, count_tokens, output_budget,
+    with_cache_breakpoints,
+)
+from health import (
+    EmptyResponse, HealthRegistry, classify_error, error_headers, key_fingerprint,
+    KIND_LABELS, OTHER, RATE_LIMITED, DAILY_LIMIT, PAYMENT, CONNECTION, TIMEOUT,
+)
+from metrics import MetricsRegistry
+from profiles import GenerationProfile, REASONING_TOKENS, generation_profile, question_kind
+from ratelimit import RateLimiter, Ticket
+from response_cache import flight_key
+from router import LatencyRouter
+from singleflight import FlightCancelled, SingleFlight
+from state import SharedState
+
+load_dotenv()  # 설정 상수를 읽기 전에 .env 반영
+log = logging.getLogger("mentor.engine")
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ══════════════════════════════════════════════════════════════
+#  OPENROUTER 설정
+#  무료 모델 목록 — :free 태그 = 크레딧 차감 없음
+# ══════════════════════════════════════════════════════════════
+# 로컬 mock 서버 · 다른 호환 서버로 바꿀 때: OPENROUTER_BASE_URL=http://127.0.0.1:18080
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# 혹시 API 조회 실패할 경우를 대비한 하드코딩 백업 목록
+FALLBACK_MODELS = [
+    "meta-llama/llama-3.3-70b-instruct:free",
+    "qwen/qwen-2.5-72b-instruct:free",
+    "google/gemma-3-12b-it:free",
+    "mistralai/mistral-7b-instruct:free",
+    "nousresearch/hermes-3-llama-3.1-8b:free",
+]
+
+FALLBACK_MODEL_INFO = [
+    {"id": m, "context_length": DEFAULT_CONTEXT_LENGTH} for m in FALLBACK_MODELS
+]
+
+MODEL_CATALOG_TTL  = 3600  # 1시간마다 백그라운드 갱신
+MODEL_CATALOG_PATH = os.getenv("MODEL_CATALOG_PATH", os.path.join(ENGINE_DIR, ".cache", "models.json"))
+
+# 프로세스 간 공유 — 같은 파일을 쓰는 워커끼리 브레이커 · 요청 한도 버킷을 맞춤 (0이면 프로세스별)
+SHARED_STATE      = os.getenv("SHARED_STATE", "1") != "0"
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", os.path.join(ENGINE_DIR, ".cache", "engine_state.sqlite3"))
+
+# 커넥션 풀 — 프로세스 전체 세션이 Key별 클라이언트 하나를 공유 (httpx.Limits 인자)
+HTTP_POOL_LIMITS = dict(
+    max_connections           = 32,
+    max_keepalive_connections = 16,
+    keepalive_expiry          = 120,  # 유휴 연결 유지(초) — 매 질문 TLS 핸드셰이크 방지
+)
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://ai-master-mentor.streamlit.app",
+    "X-Title": "AI Master Mentor",
+}
+
+# 추가 백엔드 (backends.py) — OpenRouter 무료 한도가 포화일 때 넘길 OpenAI 호환 서버
+SPILLOVER             = os.getenv("SPILLOVER", "1") != "0"   # 0 = 설정이 있어도 넘기지 않음
+BACKENDS_PATH         = os.getenv("BACKENDS_PATH", "")       # 백엔드 목록 JSON (형식은 backends.py)
+LOCAL_LLM_BASE_URL    = os.getenv("LOCAL_LLM_BASE_URL", "")  # 서버 하나만 쓸 때 — 예: http://127.0.0.1:8080/v1
+LOCAL_LLM_MODELS      = os.getenv("LOCAL_LLM_MODELS", "")    # 쉼표 구분, 비우면 /models 조회
+LOCAL_LLM_API_KEY     = os.getenv("LOCAL_LLM_API_KEY", "")
+LOCAL_LLM_CONCURRENCY = int(os.getenv("LOCAL_LLM_CONCURRENCY", "2"))  # 동시 요청 상한
+
+HEALTH_MAX_WAIT = 5.0  # 모든 조합이 차단일 때, 이 시간 안에 풀리면 기다렸다 재시도(초)
+
+# 마감 시간 — 질문 1건이 답변을 시작할 때까지 쓸 수 있는 시간. 시도마다 남은 시간을
+# 타임아웃으로 넘기고(스트리밍은 첫 토큰까지만 — 이후 청크 사이는 평소 ATTEMPT_TIMEOUT),
+# 다 쓰면 로테이션을 멈춘다.
+# 최악의 경우 첫 출력까지 = 요청 한도 대기열(QUEUE_MAX_WAIT) + REQUEST_DEADLINE.
+# 스트리밍은 첫 토큰 이후에도 청크 사이가 ATTEMPT_TIMEOUT을 넘으면 끊는다.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "45"))  # 질문 1건 마감(초)
+ATTEMPT_TIMEOUT  = float(os.getenv("ATTEMPT_TIMEOUT", "20"))   # 스트리밍 시도 1회 상한 — 한 모델이 마감을 다 쓰지 않도록
+CONNECT_TIMEOUT  = 5.0   # 연결 타임아웃(초)
+MIN_ATTEMPT_TIME = 2.0   # 남은 시간이 이보다 짧으면 새 시도를 시작하지 않음(초)
+
+# 요청 한도 — Key마다 분당 · 일일 요청 수를 로컬에서 지켜 429 연쇄를 막음
+# 기본값은 OpenRouter 무료 모델 한도 (분당 20 · 크레딧 10달러 미만 계정은 하루 50, 이상이면 1000)
+RATE_LIMIT     = os.getenv("RATE_LIMIT", "1") != "0"
+RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "20"))     # Key당 분당 요청 수, 0 = 제한 없음
+RATE_LIMIT_RPD = int(os.getenv("RATE_LIMIT_RPD", "50"))     # Key당 일일 요청 수, 0 = 제한 없음
+QUEUE_MAX_WAIT = float(os.getenv("QUEUE_MAX_WAIT", "90"))   # 한도가 찼을 때 대기열에서 기다릴 최대 시간(초)
+
+# 프롬프트 캐시 — 업스트림이 매 턴 같은 앞부분(시스템 프롬프트 · 이전 대화)을 다시 처리하지 않도록
+# OpenAI · DeepSeek 등은 앞부분이 같으면 자동 캐시, 아래 모델은 cache_control 표시가 있어야 캐시
+PROMPT_CACHE         = os.getenv("PROMPT_CACHE", "1") != "0"
+CACHE_CONTROL_MODELS = ("anthropic/", "google/gemini")
+
+STREAM_RENDER_INTERVAL = 0.05  # 부분 답변 렌더링 최소 간격(초)
+
+# 생성 프로필 (profiles.py) — 질문 유형 · 모델에 맞춘 max_tokens · temperature · 추론 effort
+ADAPTIVE_OUTPUT   = os.getenv("ADAPTIVE_OUTPUT", "1") != "0"          # 0 = 모든 질문에 max_tokens 4096 · 0.7
+REASONING_DISPLAY = os.getenv("REASONING_DISPLAY", "panel")           # panel = 추론 과정 표시 · hide = 받지 않음
+MAX_REASONING_OUTPUT = MAX_OUTPUT_TOKENS + max(REASONING_TOKENS.values())  # 추론 모델의 max_tokens 상한
+
+# 헤징 — 같은 질문을 여러 (Key, Model) 조합에 동시에 보내고 가장 빠른 답만 사용
+HEDGE_FANOUT = int(os.getenv("HEDGE_FANOUT", "2"))      # 동시에 경쟁시킬 조합 수 (2~3 권장)
+HEDGE_DELAY  = float(os.getenv("HEDGE_DELAY", "1.5"))   # 다음 후보 투입 전 대기(초), 0 = 즉시 동시 발사
+
+# 라우팅 — 실측 지연 시간으로 모델 순서 결정 (0이면 기존 로테이션 순서)
+ADAPTIVE_ROUTING = os.getenv("ADAPTIVE_ROUTING", "1") != "0"
+ROUTER_EXPLORE   = float(os.getenv("ROUTER_EXPLORE", "0.1"))  # 1순위가 아닌 모델을 다시 재볼 확률
+
+# 진행 중인 같은 요청 합치기 — 여러 세션이 동시에 같은 질문을 보내면 업스트림 호출 1번을 함께 씀
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "1") != "0"
+
+# 지표 — 요청마다 트레이스를 남기고 Prometheus /metrics · JSONL로 내보냄
+METRICS_PORT  = int(os.getenv("METRICS_PORT", "0"))      # 0 = /metrics 서버 끔
+METRICS_JSONL = os.getenv("METRICS_JSONL", "")            # 경로를 주면 트레이스를 JSONL로 추가
+
+DEADLINE_MESSAGE = (
+    "⏱ **{seconds:.0f}초 안에 답변을 받지 못했습니다.**\n\n"
+    "무료 모델이 응답하지 않거나 붐비는 중입니다. 잠시 후 다시 시도해 주세요."
+)
+
+NO_MODEL_MESSAGE = (
+    "⏳ **현재 사용 가능한 무료 모델이 없습니다.**\n\n"
+    "{hint} "
+    "[OpenRouter 무료 모델](https://openrouter.ai/models?q=free)을 확인해 주세요."
+)
+
+
+@dataclass
+class Session:
+    """호출자별 로테이션 상태 (배치 작업 1건 · 테스트용). 웹에서는 st.session_state를 그대로 넘김."""
+    key_idx:    int         = 0
+    model_idx:  int         = 0
+    last_call:  dict | None = None   # {"model", "ttft", "total"}
+    last_route: dict | None = None   # {"model", "explored"}
+
+
+@dataclass
+class CallOptions:
+    """
+    호출 1건의 설정. 합쳐진 요청은 이 객체 하나를 보며 진행하고, 나중에 합류한 호출자가
+    더 넉넉한 설정을 가져오면 take_over로 넓힌다 — 미리 받기에 합류한 사용자 질문이
+    미리 받기 설정(대기열 없음 · 추가 백엔드 없음)에 묶이지 않도록.
+    """
+    purpose:        str   = "chat"
+    hedge:          bool  = False
+    queue_max_wait: float = QUEUE_MAX_WAIT
+    deadline:       float = REQUEST_DEADLINE
+
+    def take_over(self, other: "CallOptions") -> None:
+        """
+        합류한 호출자의 설정으로 넓힘 — 진행 중인 호출은 다음 판단(대기열 · 마감 · 넘기기)부터 따른다.
+        헤징은 시작할 때 정해지므로 이어받지 않는다.
+        """
+        if self.purpose == "prefetch":
+            self.purpose = other.purpose
+        self.queue_max_wait = max(self.queue_max_wait, other.queue_max_wait)
+        self.deadline       = max(self.deadline, other.deadline)
+
+
+def format_wait(seconds: float) -> str:
+    """대기 시간 안내 문구 — 초 · 분 · 시간"""
+    if seconds < 90:
+        return f"{max(seconds, 1):.0f}초"
+    if seconds < 5400:
+        return f"{seconds / 60:.0f}분"
+    return f"{seconds / 3600:.1f}시간"
+
+
+def _delta_text(chunk) -> str:
+    """스트림 청크에서 본문 텍스트만 추출"""
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def _reasoning_text(item) -> str:
+    """스트림 청크의 delta · 일반 응답의 message에서 추론 텍스트 추출 (OpenRouter reasoning · reasoning_content)"""
+    return getattr(item, "reasoning", None) or getattr(item, "reasoning_content", None) or ""
+
+
+def _open_attempt(
+    client, model: str, messages: list, streaming: bool, profile: GenerationProfile, on_headers=None,
+    timeout=None, on_reasoning=None,
+):
+    """
+    요청 1회 시작. 일반 호출은 응답 객체를, 스트리밍은 첫 토큰까지 받은
+    (stream, chunks, first, reasoning)을 반환 — reasoning은 본문 전에 온 추론 텍스트.
+    첫 토큰 전 실패 · 중단은 스트림을 닫고 예외로 올라감.
+    profile: 이 모델에 보낼 생성 설정 (max_tokens · temperature · reasoning · 추가 지시)
+    on_headers(응답 헤더)는 응답이 시작되면 호출 (일일 한도 집계용).
+    on_reasoning(누적 추론 텍스트)은 첫 토큰을 기다리는 동안 호출.
+    timeout: 이 시도의 httpx.Timeout (없으면 클라이언트 기본값).
+    스레드 풀에서도 호출된다.
+    """
+    if PROMPT_CACHE and model.startswith(CACHE_CONTROL_MODELS):
+        messages = with_cache_breakpoints(messages)
+    if profile.hint:  # 캐시되는 앞부분은 그대로 두고 맨 뒤에 붙임
+        messages = [*messages, {"role": "system", "content": profile.hint}]
+    extra_body = {"usage": {"include": True}}  # 캐시 적중 · 추론 토큰 수까지 받음
+    if profile.reasoning is not None:
+        extra_body["reasoning"] = profile.reasoning
+    params = dict(
+        model      = model,
+        messages   = messages,
+        max_tokens = profile.max_tokens,
+        temperature= profile.temperature,
+        extra_body = extra_body,
+    )
+    if timeout is not None:
+        params["timeout"] = timeout
+    if not streaming:
+        raw = client.chat.completions.with_raw_response.create(**params)
+        if on_headers is not None:
+            on_headers(raw.headers)
+        return raw.parse()
+
+    stream = client.chat.completions.create(**params, stream=True)
+    try:
+        if on_headers is not None:
+            on_headers(stream.response.headers)
+        started   = time.perf_counter()
+        chunks    = iter(stream)
+        reasoning = ""
+        last_render = 0.0
+        for chunk in chunks:
+            first = _delta_text(chunk)
+            if first:
+                return stream, chunks, first, reasoning
+            if chunk.choices and (thought := _reasoning_text(chunk.choices[0].delta)):
+                reasoning += thought
+                if on_reasoning is not None and time.perf_counter() - last_render >= STREAM_RENDER_INTERVAL:
+                    on_reasoning(reasoning)
+                    last_render = time.perf_counter()
+            # 본문 없는 청크(추론 · keep-alive)가 계속 오면 읽기 타임아웃이 안 걸림 — 첫 토큰까지 직접 잼
+            if timeout is not None and time.perf_counter() - started > timeout.read:
+                import openai  # 클라이언트를 만들 때 이미 로드됨
+                raise openai.APITimeoutError(request=stream.response.request)
+        raise EmptyResponse("빈 응답 스트림")
+    except BaseException:
+        stream.close()  # 첫 토큰 전 실패 · 중단(on_reasoning의 FlightCancelled 등) — 연결을 풀에 반납
+        raise
+
+
+def _close_attempt(result) -> None:
+    """경쟁에서 진 스트림의 연결을 닫아 풀에 반납"""
+    if isinstance(result, tuple):
+        result[0].close()
+
+
+class Engine:
+    """
+    api_keys: OpenRouter Key 목록 (없으면 모델 목록만 백업 목록으로 동작)
+    importer: 무거운 모듈(openai · httpx) import 함수 — app.py는 시간 측정용 lazy_import를 넘김
+    """
+
+    def __init__(self, api_keys: list, importer=importlib.import_module):
+        self.api_keys = list(api_keys)
+        self.key_ids  = [key_fingerprint(k) for k in self.api_keys]  # 헬스 레지스트리용 Key 식별자
+        self.importer = importer
+        self.shared   = SharedState(SHARED_STATE_PATH) if SHARED_STATE else None
+        self.health   = HealthRegistry(shared=self.shared)
+        self.router   = LatencyRouter(explore=ROUTER_EXPLORE)
+        self.limiter  = RateLimiter(
+            self.key_ids, rpm=RATE_LIMIT_RPM, rpd=RATE_LIMIT_RPD, shared=self.shared,
+        ) if RATE_LIMIT else None
+        self.metrics  = MetricsRegistry(jsonl_path=METRICS_JSONL or None)
+        if METRICS_PORT:
+            self.metrics.serve(METRICS_PORT)
+        self.pool     = ThreadPoolExecutor(max_workers=32, thread_name_prefix="mentor")
+        self.flights  = SingleFlight()
+        self.backends = BackendRegistry(load_backends(
+            BACKENDS_PATH, LOCAL_LLM_BASE_URL, LOCAL_LLM_MODELS, LOCAL_LLM_API_KEY, LOCAL_LLM_CONCURRENCY,
+        ) if SPILLOVER else [])
+        # 카탈로그 — 백그라운드 스레드가 갱신하고 MODEL_CATALOG_PATH에 스냅샷.
+        # 조회는 네트워크를 기다리지 않음 (재시작 직후에도 스냅샷으로 바로 표시).
+        self.catalog  = ModelCatalog(
+            fetch         = lambda: fetch_openrouter_models(
+                OPENROUTER_BASE_URL, self.api_keys[0] if self.api_keys else "",
+            ),
+            snapshot_path = MODEL_CATALOG_PATH,
+            fallback      = FALLBACK_MODEL_INFO,
+            ttl           = MODEL_CATALOG_TTL,
+            is_usable     = lambda model: not self.health.model_blocked(model),
+        )
+        self._clients = {}
+        self._lock    = threading.Lock()
+
+    # ── 모델 · 클라이언트 ────────────────────────────────────
+    def model_info(self, wait: bool = True) -> list | None:
+        """wait=False면 스냅샷도 첫 조회 결과도 아직 없을 때 None (화면 표시용)"""
+        if not self.api_keys:
+            return FALLBACK_MODEL_INFO
+        return self.catalog.models(wait)
+
+    def models(self, wait: bool = True) -> list | None:
+        info = self.model_info(wait)
+        return None if info is None else [m["id"] for m in info]
+
+    def context_length(self, model: str) -> int:
+        info = self.catalog.info(model) if self.api_keys else None
+        return info["context_length"] if info else DEFAULT_CONTEXT_LENGTH
+
+    def client(self, ki: int):
+        """Key별 장수명 OpenAI 클라이언트 (keep-alive, 가능하면 HTTP/2). thread-safe라 모든 호출이 공유."""
+        with self._lock:
+            if ki not in self._clients:
+                self._clients[ki] = self._make_client(self.api_keys[ki])
+            return self._clients[ki]
+
+    def _make_client(self, api_key: str, base_url: str = OPENROUTER_BASE_URL):
+        openai = self.importer("openai")
+        httpx  = self.importer("httpx")
+        try:
+            import h2  # noqa: F401 — 설치돼 있을 때만 HTTP/2 사용
+            http2 = True
+        except ImportError:
+            http2 = False
+        return openai.OpenAI(
+            api_key         = api_key,
+            base_url        = base_url,
+            default_headers = OPENROUTER_HEADERS if base_url == OPENROUTER_BASE_URL else None,
+            http_client     = openai.DefaultHttpxClient(
+                http2=http2, limits=httpx.Limits(**HTTP_POOL_LIMITS),
+            ),
+            timeout         = self._timeout(ATTEMPT_TIMEOUT),  # SDK 기본값(10분) 대신
+            max_retries     = 0,  # 재시도는 SDK가 아닌 로테이션 + 헬스 레지스트리가 담당
+        )
+
+    def _timeout(self, seconds: float):
+        """시도 1회의 httpx.Timeout — 읽기 · 쓰기는 seconds, 연결은 CONNECT_TIMEOUT까지"""
+        return self.importer("httpx").Timeout(seconds, connect=min(CONNECT_TIMEOUT, seconds))
+
+    def _open(
+        self, client, model: str, messages: list, streaming: bool, profile: GenerationProfile,
+        on_headers, seconds: float, on_reasoning=None,
+    ):
+        """
+        _open_attempt + 이 시도의 타임아웃(seconds초).
+        httpx 읽기 타임아웃은 요청을 보낼 때 정해져 스트림 끝까지 가므로, 마감이 가까워
+        평소(ATTEMPT_TIMEOUT)보다 짧아진 스트리밍 시도는 읽기 타임아웃을 평소대로 두고
+        첫 토큰만 seconds 안에 기다린다 (스레드 풀) — 첫 토큰 이후 청크 사이의 평범한 멈춤에
+        답이 잘리지 않도록. 첫 토큰이 늦으면 TimeoutError, 뒤늦게 열린 스트림은 닫는다.
+        이때 추론 과정은 실시간으로 보내지 않는다 (받은 것은 _finish_attempt가 한 번에 전달).
+        """
+        if not streaming or seconds >= ATTEMPT_TIMEOUT:
+            return _open_attempt(
+                client, model, messages, streaming, profile, on_headers, self._timeout(seconds), on_reasoning,
+            )
+        fut = self.pool.submit(
+            _open_attempt, client, model, messages, streaming, profile, on_headers,
+            self._timeout(ATTEMPT_TIMEOUT),
+        )
+        try:
+            return fut.result(timeout=seconds)
+        except FutureTimeout:
+            fut.cancel()
+            fut.add_done_callback(
+                lambda f: not f.cancelled() and f.exception() is None and _close_attempt(f.result())
+            )
+            raise TimeoutError(f"첫 토큰 마감 ({seconds:.0f}초)") from None
+
+    # ── 시도 결과 처리 ───────────────────────────────────────
+    def _drain_stream(self, session, chunks, first: str, on_delta, t0: float, kid: str, model: str, router):
+        """
+        첫 토큰 이후의 스트림을 끝까지 읽으며 on_delta로 누적 답변을 전달.
+        이미 화면에 출력 중이므로 중간에 끊겨도 로테이션하지 않고 부분 답변을 반환.
+        청크 사이가 읽기 타임아웃(항상 평소 ATTEMPT_TIMEOUT — _open 참고)을 넘으면
+        멈춘 스트림이므로 그 모델의 타임아웃으로 기록.
+        kid: 헬스 레지스트리용 Key 식별자 · router: 지연 시간을 기록할 라우터 (추가 백엔드는 그 백엔드 것)
+        Returns: (answer, error, usage) — usage는 마지막 청크의 토큰 집계 (없으면 None)
+        """
+        ttft   = time.perf_counter() - t0
+        answer = first
+        error  = ""
+        usage  = None
+        on_delta(answer)
+        last_render = time.perf_counter()
+        try:
+            for chunk in chunks:
+                usage = getattr(chunk, "usage", None) or usage
+                text  = _delta_text(chunk)
+                if not text:
+                    continue
+                answer += text
+                now = time.perf_counter()
+                if now - last_render >= STREAM_RENDER_INTERVAL:
+                    on_delta(answer)
+                    last_render = now
+        except FlightCancelled:
+            raise  # 기다리는 세션이 모두 떠남 — 모델 탓이 아님
+        except Exception as e:
+            kind  = classify_error(e)[0]
+            kind  = kind if kind in (TIMEOUT, CONNECTION) else CONNECTION
+            error = f"응답 스트림 중단 ({model.split('/')[-1]} · {KIND_LABELS[kind]}): {str(e)[:200]}"
+        on_delta(answer)
+        total = time.perf_counter() - t0
+        session.last_call = {"model": model, "ttft": ttft, "total": total}
+        if error:
+            router.record_failure(model, kind)
+            if kind == TIMEOUT:
+                self.health.record_failure(kid, model, TIMEOUT)
+        else:
+            router.record_success(model, ttft, total, count_tokens(answer))
+        return answer, error, usage
+
+    def _finish_attempt(
+        self, session, result, kid: str, model: str, t0: float, on_delta, trace, on_reasoning=None,
+        router=None,
+    ):
+        """
+        성공한 시도의 결과를 (answer, error)로 마무리하고 트레이스에 기록.
+        받은 추론 텍스트는 본문보다 먼저 on_reasoning으로 한 번 더 전달 (헤징에서 이긴 시도 것).
+        router: 지연 시간을 기록할 라우터 (없으면 OpenRouter 모델용 self.router)
+        """
+        router = router or self.router
+        trace.first_token()
+        if on_delta is not None:
+            stream, chunks, first, reasoning = result
+            try:
+                if reasoning and on_reasoning is not None:
+                    on_reasoning(reasoning)
+                answer, error, usage = self._drain_stream(
+                    session, chunks, first, on_delta, t0, kid, model, router,
+                )
+            except FlightCancelled:
+                stream.close()
+                raise
+        else:
+            elapsed = time.perf_counter() - t0
+            message = result.choices[0].message
+            answer, error, usage = message.content or "", "", result.usage
+            if on_reasoning is not None and (reasoning := _reasoning_text(message)):
+                on_reasoning(reasoning)
+            session.last_call = {"model": model, "ttft": elapsed, "total": elapsed}
+            # 일반 호출은 첫 토큰 시각을 모름 — 생성 속도만 갱신
+            router.record_success(model, None, elapsed, count_tokens(answer))
+        trace.succeeded(kid, model, count_tokens(answer), usage)
+        return answer, error
+
+    def _record_failure(self, ki: int, model: str, exc: Exception, cut_short: bool = False) -> str:
+        """
+        실패한 시도를 헬스 레지스트리와 라우터에 기록하고 오류 종류를 반환.
+        cut_short: 마감이 가까워 평소보다 짧은 타임아웃으로 보낸 시도 — 타임아웃이면 모델 탓으로 치지 않음.
+        """
+        kind, retry_after = classify_error(exc)
+        if kind == TIMEOUT and cut_short:
+            self.health.release(self.key_ids[ki], model)
+            return kind
+        self.health.record_failure(self.key_ids[ki], model, kind, retry_after)
+        self.router.record_failure(model, kind)
+        if self.limiter:
+            self.limiter.observe(self.key_ids[ki], error_headers(exc))
+            if kind == DAILY_LIMIT:
+                self.limiter.exhaust(self.key_ids[ki], retry_after)
+        return kind
+
+    def _on_headers(self, ki: int):
+        """응답 헤더의 일일 한도 정보를 요청 한도에 반영하는 콜백 (한도를 끄면 None)"""
+        if not self.limiter:
+            return None
+        return lambda headers: self.limiter.observe(self.key_ids[ki], headers)
+
+    def _sent(self, ki: int, model: str) -> None:
+        """요청을 실제로 보냄 — Key × 모델 오늘 사용량 집계"""
+        if self.limiter:
+            self.limiter.count_model(self.key_ids[ki], model)
+
+    # ── 생성 프로필 ──────────────────────────────────────────
+    def _profiles(self, models: list, trace) -> dict:
+        """모델별 생성 프로필 — 요청이 컨텍스트에 안 들어가는 모델은 None"""
+        return {
+            m: self._profile(trace, m, self.context_length(m), self.catalog.info(m) if self.api_keys else None)
+            for m in models
+        }
+
+    def _profile(self, trace, model: str, context_length: int, info: dict | None) -> GenerationProfile | None:
+        """
+        모델 1개의 생성 프로필 (trace.kind 기준).
+        ADAPTIVE_OUTPUT=0이면 남은 컨텍스트만큼(최대 4096) · temperature 0.7.
+        """
+        if not ADAPTIVE_OUTPUT:
+            budget = output_budget(context_length, trace.prompt_tokens)
+            return GenerationProfile("standard", budget, 0.7) if budget else None
+        room = output_budget(context_length, trace.prompt_tokens, cap=MAX_REASONING_OUTPUT)
+        return generation_profile(
+            trace.kind, model, info, room, show_reasoning=REASONING_DISPLAY != "hide",
+        ) if room else None
+
+    # ── 시도 순서 ────────────────────────────────────────────
+    def _rotation_order(self, session, total_models: int) -> list:
+        """
+        세션 커서(key_idx, model_idx)부터 시작하는 시도 순서.
+        같은 모델에서 Key를 먼저 돌고, Key를 다 돌면 다음 모델로 (기존 로테이션 규칙).
+        ADAPTIVE_ROUTING=0일 때의 순서.
+        """
+        total_keys = len(self.api_keys)
+        ki = session.key_idx   % total_keys
+        mi = session.model_idx % total_models
+        return [
+            ((ki + k) % total_keys, (mi + m) % total_models)
+            for m in range(total_models)
+            for k in range(total_keys)
+        ]
+
+    def _attempt_order(self, session, models: list) -> list:
+        """
+        (key_idx, model_idx) 시도 순서. 모델은 라우터의 예상 시간 순,
+        Key는 세션 커서부터 — 같은 모델에서 Key를 먼저 돈다.
+        라우팅 결정은 session.last_route에 남김 (사이드바 표시).
+        """
+        if not ADAPTIVE_ROUTING:
+            return self._rotation_order(session, len(models))
+        total_keys = len(self.api_keys)
+        ranked, explored = self.router.rank(models)
+        session.last_route = {"model": ranked[0], "explored": explored}
+        ki = session.key_idx % total_keys
+        return [
+            ((ki + k) % total_keys, models.index(m))
+            for m in ranked
+            for k in range(total_keys)
+        ]
+
+    # ── 헤징 ─────────────────────────────────────────────────
+    def _race_attempts(
+        self, pairs: list, models: list, messages: list, streaming: bool, profiles: dict,
+        trace, ticket: Ticket, attempt_timeout,
+    ):
+        """
+        (key_idx, model_idx) 후보들에 같은 요청을 HEDGE_DELAY 간격으로 투입해 경쟁.
+        실패한 후보가 나오면 대기 없이 다음 후보를 바로 투입.
+        가장 먼저 성공한 시도만 남기고 나머지는 취소하거나 연결을 닫는다.
+        모든 결과는 헬스 레지스트리 · 트레이스에 기록 (진 후보도 끝나는 대로 기록).
+        profiles: 모델별 생성 프로필
+        attempt_timeout(): 지금 시작하는 시도의 타임아웃(초) — 마감이 다 됐으면 None (더 투입 안 함)
+                           스트리밍은 첫 토큰을 기다리는 한도로도 씀 — 마감이면 남은 후보를 버리고 반환
+        요청 한도가 찬 Key의 후보는 투입하지 않는다 (헤징은 대기열을 서지 않음).
+        Returns: (ki, mi, t0, result) — 모두 실패하면 None
+        """
+        health  = self.health
+        limiter = self.limiter
+        key_ids = self.key_ids
+        pending = {}
+        queue   = list(pairs)
+        winner  = None
+
+        def launch():
+            while queue:
+                timeout = attempt_timeout()
+                if timeout is None:
+                    queue.clear()
+                    return
+                ki, mi = queue.pop(0)
+                if limiter and not limiter.try_acquire(key_ids[ki], ticket):
+                    continue  # 요청 한도 소진
+                if not health.acquire(key_ids[ki], models[mi]):
+                    if limiter:
+                        limiter.refund(key_ids[ki])
+                    continue  # 고르는 사이 다른 세션이 차단시킴
+                self._sent(ki, models[mi])
+                fut = self.pool.submit(  # 스트리밍은 읽기 타임아웃을 평소대로 — 첫 토큰 마감은 아래 wait가 지킴
+                    _open_attempt, self.client(ki), models[mi], messages, streaming, profiles[models[mi]],
+                    self._on_headers(ki), self._timeout(ATTEMPT_TIMEOUT if streaming else timeout),
+                )
+                pending[fut] = (ki, mi, time.perf_counter(), trace.attempt(key_ids[ki], models[mi]))
+                return
+
+        def settle_loser(fut, ki, model, t0, att):
+            if fut.cancelled():
+                health.release(key_ids[ki], model)
+                trace.attempt_done(att, "cancelled")
+            elif fut.exception() is not None:
+                trace.attempt_done(att, self._record_failure(ki, model, fut.exception()))
+            else:
+                health.record_success(key_ids[ki], model)
+                # 진 스트림도 첫 토큰까지는 받았으므로 지연 시간 표본으로 사용
+                ttft = time.perf_counter() - t0
+                self.router.record_success(model, ttft if streaming else None)
+                trace.attempt_done(att, "lost", ttft)
+                _close_attempt(fut.result())
+
+        launch()
+        while pending and winner is None:
+            budget = attempt_timeout() if streaming else None
+            if streaming and budget is None:
+                break  # 마감 — 남은 후보는 아래에서 정리
+            done, _ = wait(
+                pending,
+                timeout     = min(HEDGE_DELAY, budget or HEDGE_DELAY) if queue else budget,
+                return_when = FIRST_COMPLETED,
+            )
+            for fut in done:
+                ki, mi, t0, att = pending.pop(fut)
+                if fut.exception() is None and winner is None:
+                    health.record_success(key_ids[ki], models[mi])
+                    trace.attempt_done(att, "ok", time.perf_counter() - t0)
+                    winner = (ki, mi, t0, fut.result())
+                else:
+                    settle_loser(fut, ki, models[mi], t0, att)
+            # 지연 시간 초과 또는 후보 실패 → 다음 후보 투입
+            if winner is None and queue:
+                launch()
+
+        # 진 후보 정리: 시작 전이면 취소, 진행 중이면 끝나는 즉시 기록하고 연결 닫기
+        for fut, (ki, mi, t0, att) in pending.items():
+            fut.cancel()
+            fut.add_done_callback(
+                lambda f, k=ki, m=models[mi], t=t0, a=att: settle_loser(f, k, m, t, a)
+            )
+        return winner
+
+    def _pick_hedge_pairs(self, order: list, models: list, profiles: dict) -> list:
+        """헤징 후보 선택 — 열린 조합 중 Key·Model이 서로 겹치지 않는 것을 우선"""
+        spent  = {
+            ki for ki in range(len(self.api_keys))
+            if self.limiter and self.limiter.day_exhausted(self.key_ids[ki])
+        }
+        usable = [
+            (ki, mi) for ki, mi in order
+            if ki not in spent and profiles[models[mi]]
+            and self.health.available(self.key_ids[ki], models[mi])
+        ]
+        picked, used_k, used_m = [], set(), set()
+        for ki, mi in usable:
+            if ki not in used_k and mi not in used_m:
+                picked.append((ki, mi))
+                used_k.add(ki)
+                used_m.add(mi)
+        picked += [p for p in usable if p not in picked]
+        return picked[:HEDGE_FANOUT]
+
+    # ── 백그라운드 작업 ──────────────────────────────────────
+    def idle_capacity(self, minute_reserve: int, day_reserve: float) -> bool:
+        """
+        사용자 요청에 쓰고도 남는 여유가 있는지 — 미리 받기 같은 백그라운드 요청용.
+        대기열이 비어 있고, 분당 토큰이 minute_reserve개보다 많으며 오늘 한도가
+        day_reserve 비율보다 많이 남은 Key가 하나라도 있으면 True (요청 한도를 끄면 항상 True).
+        """
+        if not self.api_keys:
+            return False
+        if not self.limiter:
+            return True
+        for kid in self.key_ids:
+            rs = self.limiter.status(kid)
+            if rs["queue"]:
+                return False
+            if rs["minute_left"] is not None and rs["minute_left"] <= minute_reserve:
+                continue
+            if rs["day_left"] is not None and rs["day_left"] <= rs["day_limit"] * day_reserve:
+                continue
+            return True
+        return False
+
+    # ── 추가 백엔드 ──────────────────────────────────────────
+    def _spill(
+        self, messages: list, session, on_delta, trace, attempt_timeout, cut_short, notify, on_reasoning,
+        reason: str,
+    ) -> tuple[str, str] | None:
+        """
+        OpenRouter가 포화 — 추가 백엔드로 넘김. (백엔드, 모델) 후보를 예상 시간 순으로 시도하고
+        동시 요청 상한이 찬 백엔드 · 차단 중인 조합 · 컨텍스트에 안 들어가는 모델은 건너뛴다.
+        세션 커서(OpenRouter Key/Model 위치)는 그대로 — 다음 질문은 다시 OpenRouter부터.
+        reason: 넘긴 이유 (throttled · daily_limit · blocked · no_keys) — 지표 라벨
+        cut_short(timeout): 마감 때문에 짧아진 시도인지 — 그 타임아웃은 차단으로 기록하지 않음
+        Returns: (answer, error) — 보낼 곳이 없었거나 모두 실패하면 None (호출자가 원래 경로로)
+        """
+        streaming = on_delta is not None
+        for backend, model in self.backends.candidates():
+            timeout = attempt_timeout()
+            if timeout is None:
+                return None
+            profile = self._profile(trace, model, backend.context_length(model), backend.info(model))
+            ki      = backend.next_key()
+            kid     = backend.key_ids[ki]
+            if not profile or not self.health.available(kid, model):
+                continue
+            if not backend.try_acquire():
+                continue  # 이 서버는 상한만큼 처리 중
+            served = False
+            try:
+                if not self.health.acquire(kid, model):
+                    continue  # 확인하는 사이 다른 세션이 차단시킴
+                att = trace.attempt(kid, model)
+                t0  = time.perf_counter()
+                try:
+                    result = self._open(
+                        backend.client(ki, self._make_client), model, messages, streaming, profile,
+                        None, timeout, on_reasoning,
+                    )
+                except FlightCancelled:
+                    self.health.release(kid, model)
+                    trace.attempt_done(att, "cancelled")
+                    raise
+                except Exception as e:
+                    kind, retry_after = classify_error(e)
+                    if kind == TIMEOUT and cut_short(timeout):
+                        self.health.release(kid, model)
+                    else:
+                        self.health.record_failure(kid, model, kind, retry_after)
+                        backend.router.record_failure(model, kind)
+                    trace.attempt_done(att, kind)
+                    notify(f"{KIND_LABELS[kind]} · {backend.name} · {model.split('/')[-1]} → 전환", "🔄")
+                    continue
+
+                self.health.record_success(kid, model)
+                trace.attempt_done(att, "ok", time.perf_counter() - t0)
+                trace.backend = backend.name
+                self.metrics.record_spillover(backend.name, reason)
+                notify(f"무료 한도 포화 → {backend.name} 서버로 전환", "🖥️")
+                answer, error = self._finish_attempt(
+                    session, result, kid, model, t0, on_delta, trace, on_reasoning, backend.router,
+                )
+                session.last_call = {**session.last_call, "backend": backend.name}
+                served = True
+                return answer, error
+            finally:
+                backend.release(served)
+        return None
+
+    # ── 호출 ─────────────────────────────────────────────────
+    def call(
+        self, messages: list, session, on_delta=None, hedge: bool = False, purpose: str = "chat",
+        on_wait=None, notify=None, queue_max_wait: float = QUEUE_MAX_WAIT,
+        deadline: float = REQUEST_DEADLINE, on_reasoning=None,
+    ) -> tuple[str, str]:
+        """
+        OpenRouter API 호출 + 자동 Key/Model 로테이션.
+        사용 가능한 무료 모델을 API에서 실시간으로 가져와 사용.
+        session:  로테이션 커서 · last_call · last_route를 읽고 쓰는 호출자 상태 (Session 참고)
+        on_delta: 주어지면 stream=True로 호출하고 누적 답변 텍스트를 계속 전달.
+                  첫 토큰 전에 실패하면 일반 호출과 똑같이 다음 Key/Model로 전환.
+        hedge:    True면 먼저 상위 HEDGE_FANOUT개 (Key, Model) 조합을 경쟁시키고,
+                  모두 실패했을 때만 순차 로테이션으로 넘어감.
+        모델 순서는 라우터가 실측 지연 시간으로 정한다 (ADAPTIVE_ROUTING=0이면 로테이션 커서 순).
+        헬스 레지스트리에서 차단 중인 조합, 컨텍스트 길이에 요청이 안 들어가는
+        모델은 요청 없이 건너뛴다. max_tokens · temperature · 추론 effort는 질문 유형과
+        모델별 남은 컨텍스트에 맞춘다 (ADAPTIVE_OUTPUT, profiles.py).
+        첫 토큰·전체 소요 시간은 session.last_call에 기록.
+        purpose:  지표 구분용 (chat · summary · batch) — 시도별 결과 · 토큰 · 지연 시간은 트레이스로 남김
+        on_wait:  Key 요청 한도가 모두 찼을 때 대기열에서 on_wait(순번, 예상 대기초)로 알림.
+                  queue_max_wait 안에 차례가 오지 않으면 예상 대기 시간과 함께 오류 반환.
+        deadline: 답변이 시작될 때까지(스트리밍은 첫 토큰, 일반 호출은 응답 전체) 쓸 수 있는 초 —
+                  대기열에서 기다린 시간은 빼고 잰다. 시도마다 남은 시간을 타임아웃으로 넘기고
+                  다 쓰면 로테이션을 멈춘다. 스트리밍 시도 1회는 ATTEMPT_TIMEOUT까지.
+        notify:   Key/Model 전환 알림 notify(문구, 아이콘) — 없으면 로그로만
+        on_reasoning: 추론 모델이 보낸 추론 과정(누적 텍스트)을 전달 — REASONING_DISPLAY=hide면 받지 않음
+        OpenRouter가 포화(요청 한도 · 일일 한도 · 모든 조합 차단)면 대기열에 서거나 실패하기 전에
+        추가 백엔드로 넘긴다 (backends.py, 미리 받기는 제외). 답한 백엔드는 session.last_call["backend"].
+        같은 요청(정규화한 메시지 + 스트리밍 여부, response_cache.flight_key)이 이미 진행 중이면
+        새로 보내지 않고 그 응답을 함께 받는다 (COALESCE_REQUESTS, singleflight.py). 부분 답변 · 대기열 순번 ·
+        전환 알림도 이 호출자의 콜백으로 전달되고, 결과 기록은 session에 복사된다.
+        합류한 호출의 설정이 더 넉넉하면(미리 받기에 사용자 질문이 합류 등) 진행 중인 호출이
+        그 설정을 이어받는다 (CallOptions.take_over).
+        Returns: (answer, error)
+        """
+        notify = notify or (lambda text, icon: log.info("%s %s", icon, text))
+        opts   = CallOptions(purpose, hedge, queue_max_wait, deadline)
+        if not COALESCE_REQUESTS:
+            return self._traced_call(messages, session, on_delta, opts, on_wait, notify, on_reasoning)
+
+        # 첫 호출자의 커서로 시작하는 공용 세션 — 끝나면 기다린 모든 호출자에게 복사.
+        # 커서는 여기(호출자 스레드)서 읽는다 — st.session_state는 다른 스레드에서 못 읽음
+        cursor = (session.key_idx, session.model_idx)
+
+        def start(f_on_delta, f_on_wait, f_notify, f_on_reasoning):
+            shared = Session(*cursor)
+            answer, error = self._traced_call(
+                messages, shared, f_on_delta if on_delta is not None else None,
+                opts, f_on_wait, f_notify, f_on_reasoning,
+            )
+            return answer, error, shared
+
+        key = flight_key(messages, streaming=on_delta is not None)
+        (answer, error, shared), joined = self.flights.call(
+            key, start, on_delta, on_wait, notify, on_reasoning,
+            context=opts, join=lambda running: running.take_over(opts),
+        )
+        if joined:
+            self.metrics.record_coalesced()
+        session.key_idx    = shared.key_idx
+        session.model_idx  = shared.model_idx
+        session.last_call  = shared.last_call and {**shared.last_call, **({"shared": True} if joined else {})}
+        session.last_route = shared.last_route
+        return answer, error
+
+    def _traced_call(
+        self, messages: list, session, on_delta, opts: CallOptions, on_wait, notify, on_reasoning=None,
+    ) -> tuple[str, str]:
+        """업스트림 호출 1건 — 트레이스를 열고 닫는다"""
+        trace = self.metrics.start_trace(
+            opts.purpose,
+            prompt_tokens = count_message_tokens(messages),
+            request_bytes = len(json.dumps(messages, ensure_ascii=False).encode()),
+        )
+        ticket = Ticket()
+        try:
+            answer, error = self._call(
+                messages, session, on_delta, opts, trace, ticket, on_wait, notify, on_reasoning,
+            )
+        except FlightCancelled:
+            trace.finish("cancelled")
+            raise
+        finally:
+            if self.limiter:
+                self.limiter.leave(ticket)
+        trace.finish("ok" if not error else "partial" if answer else "error")
+        return answer, error
+
+    def _call(
+        self, messages: list, session, on_delta, opts: CallOptions, trace, ticket: Ticket,
+        on_wait, notify, on_reasoning=None,
+    ) -> tuple[str, str]:
+        """
+        call 본체 — 시도마다 trace에 기록.
+        opts는 합류한 호출자가 넓힐 수 있으므로 판단할 때마다 다시 읽는다.
+        """
+        streaming = on_delta is not None
+        if ADAPTIVE_OUTPUT:
+            trace.kind = question_kind(messages, trace.purpose)
+
+        # 마감 — 스트리밍은 시도 1회를 ATTEMPT_TIMEOUT으로 끊어 다른 모델에 기회를 남김
+        def cap() -> float:
+            return ATTEMPT_TIMEOUT if streaming else opts.deadline
+
+        def time_left() -> float:
+            """마감까지 남은 초 (대기열에서 기다린 시간은 빼고 잼)"""
+            return opts.deadline - (trace.elapsed() - trace.queued)
+
+        def attempt_timeout() -> float | None:
+            """지금 시작할 시도의 타임아웃(초) — 남은 시간이 MIN_ATTEMPT_TIME보다 짧으면 None"""
+            left = time_left()
+            return min(left, cap()) if left >= MIN_ATTEMPT_TIME else None
+
+        def cut_short(timeout: float) -> bool:
+            """마감 때문에 평소보다 짧게 준 시도 — 타임아웃이어도 모델 탓으로 치지 않음"""
+            return timeout < cap() - MIN_ATTEMPT_TIME
+
+        def spill(reason: str) -> tuple[str, str] | None:
+            """OpenRouter 포화 — 추가 백엔드로 (미리 받기는 로컬 자리를 쓰지 않음)"""
+            if not self.backends or opts.purpose == "prefetch":
+                return None
+            return self._spill(
+                messages, session, on_delta, trace, attempt_timeout, cut_short, notify, on_reasoning, reason,
+            )
+
+        if not self.api_keys:
+            return spill("no_keys") or ("", "API Key가 설정되지 않았습니다.")
+
+        models       = self.models()  # 실시간 무료 모델 목록
+        health       = self.health
+        limiter      = self.limiter
+        key_ids      = self.key_ids
+        total_tries  = len(self.api_keys) * len(models)
+
+        profiles = self._profiles(models, trace)  # 모델별 생성 설정 — 안 들어가면 None
+        if not any(profiles.values()):
+            return "", "대화가 너무 길어 사용 가능한 모델의 컨텍스트 길이를 넘었습니다. 대화를 초기화해 주세요."
+
+        order = self._attempt_order(session, models)
+        if opts.hedge and HEDGE_FANOUT > 1:
+            pairs = self._pick_hedge_pairs(order, models, profiles)
+            if len(pairs) > 1:
+                trace.hedged = True
+                winner = self._race_attempts(
+                    pairs, models, messages, streaming, profiles, trace, ticket, attempt_timeout,
+                )
+                if winner is not None:
+                    wki, wmi, t0, result = winner
+                    # 이긴 조합에서 다음 질문을 시작
+                    session.key_idx   = wki
+                    session.model_idx = wmi
+                    return self._finish_attempt(
+                        session, result, key_ids[wki], models[wmi], t0, on_delta, trace, on_reasoning,
+                    )
+                notify("동시 요청 모두 실패 → 순차 전환", "🔄")
+
+        tries, waited = 0, 0.0
+        while tries < total_tries:
+            throttled = set()  # 열려 있지만 요청 한도가 찬 Key
+            spent     = set()  # 오늘 한도를 다 쓴 것으로 예측되는 Key
+            for ki, mi in order:
+                current_model = models[mi]
+                if tries >= total_tries:
+                    break
+                if not profiles[current_model]:
+                    continue  # 이 모델 컨텍스트에는 요청이 안 들어감
+                timeout = attempt_timeout()
+                if timeout is None:
+                    return "", DEADLINE_MESSAGE.format(seconds=opts.deadline)  # 마감 — 로테이션 중단
+                if ki in spent or (limiter and limiter.day_exhausted(key_ids[ki])):
+                    spent.add(ki)
+                    continue  # 보내 봐야 429 — 리셋까지 건너뜀
+                if not health.available(key_ids[ki], current_model):
+                    continue  # 차단 중 — 왕복 없이 건너뜀
+                if limiter and not limiter.try_acquire(key_ids[ki], ticket):
+                    throttled.add(key_ids[ki])
+                    continue  # 요청 한도 소진 — 한 바퀴 돈 뒤 대기열로
+                if not health.acquire(key_ids[ki], current_model):
+                    if limiter:
+                        limiter.refund(key_ids[ki])
+                    continue  # 확인하는 사이 다른 세션이 차단시킴
+
+                tries += 1
+                session.key_idx   = ki
+                session.model_idx = mi
+                self._sent(ki, current_model)
+                att = trace.attempt(key_ids[ki], current_model)
+                t0  = time.perf_counter()
+                try:
+                    result = self._open(
+                        self.client(ki), current_model, messages, streaming, profiles[current_model],
+                        self._on_headers(ki), timeout, on_reasoning,
+                    )
+                except FlightCancelled:
+                    health.release(key_ids[ki], current_model)  # 기다리는 세션이 모두 떠남 — 모델 탓이 아님
+                    trace.attempt_done(att, "cancelled")
+                    raise
+                except Exception as e:
+                    kind = self._record_failure(ki, current_model, e, cut_short=cut_short(timeout))
+                    trace.attempt_done(att, kind)
+                    if kind == OTHER:
+                        return "", f"API 오류 ({current_model.split('/')[-1]}): {str(e)[:200]}"
+                    notify(
+                        f"{KIND_LABELS[kind]} · KEY {ki+1} · {current_model.split('/')[-1]} → 전환",
+                        "🔑" if kind in (RATE_LIMITED, DAILY_LIMIT, PAYMENT) else "🔄",
+                    )
+                    continue
+
+                health.record_success(key_ids[ki], current_model)
+                trace.attempt_done(att, "ok", time.perf_counter() - t0)
+                return self._finish_attempt(
+                    session, result, key_ids[ki], current_model, t0, on_delta, trace, on_reasoning,
+                )
+
+            # 요청 한도 때문에 못 보냄 — 추가 백엔드에 자리가 있으면 그쪽으로,
+            # 없으면 모든 세션과 함께 줄을 서서 차례를 기다림
+            if throttled:
+                if (spilled := spill("throttled")) is not None:
+                    return spilled
+                t_queue = time.perf_counter()
+                budget  = opts.queue_max_wait
+                turn    = limiter.wait(ticket, sorted(throttled), budget - trace.queued, on_wait)
+                trace.queued += time.perf_counter() - t_queue
+                if turn or opts.queue_max_wait > budget:
+                    continue  # 차례가 왔거나, 기다리는 사이 합류한 호출자가 대기 시간을 늘림
+                return "", (
+                    "⏳ **요청이 많아 지금은 보낼 수 없습니다.**\n\n"
+                    "모든 Key의 요청 한도가 찼습니다. "
+                    f"약 {format_wait(limiter.eta(sorted(throttled)))} 후 다시 시도해 주세요."
+                )
+
+            if len(spent) == len(key_ids):
+                if (spilled := spill("daily_limit")) is not None:
+                    return spilled
+                return "", (
+                    "⏳ **오늘 무료 요청 한도를 모두 사용했습니다.**\n\n"
+                    f"모든 Key의 일일 한도가 찼습니다. 약 {format_wait(limiter.eta(key_ids))} 후 초기화됩니다."
+                )
+
+            # 한 바퀴 돌았는데 모두 차단 — 추가 백엔드로 넘기거나,
+            # 곧 풀리는 조합이 있으면 잠깐 기다렸다 재시도
+            if (spilled := spill("blocked")) is not None:
+                return spilled
+            soonest = max(
+                min(
+                    health.wait_time(key_ids[ki], models[mi])
+                    for ki, mi in order if profiles[models[mi]] and ki not in spent
+                ),
+                0.25,
+            )
+            if waited + soonest > HEALTH_MAX_WAIT or time_left() - soonest < MIN_ATTEMPT_TIME:
+                return "", NO_MODEL_MESSAGE.format(hint=f"약 {soonest:.0f}초 후 다시 시도하거나")
+            time.sleep(soonest)
+            waited += soonest
+
+        # 모든 조합을 한 번씩 시도했고 모두 실패
+        return spill("blocked") or ("", NO_MODEL_MESSAGE.format(hint="잠시 후 다시 시도하거나"))
@@ -0,0 +1,170 @@
+"""
+다음 질문 제안 · 미리 받기
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+시스템 프롬프트가 답변 끝에 [다음 단계 제안]을 붙이게 하고, 사용자는 그중 하나를
+그대로 다음 질문으로 보내는 경우가 많다.
+
+  parse_suggestions : 끝난 답변에서 [다음 단계 제안] 항목을 뽑음 (없으면 '3가지' 지식 항목)
+                      → 화면에서 한 번에 보내는 버튼으로
+  Prefetcher        : 사용자가 읽는 동안 상위 항목 1~2개의 답을 백그라운드로 받아
+                      응답 캐시에 넣어 둔다 — 그 항목을 보내면 캐시 적중으로 바로 표시
+
+미리 받기는
+  · Key 여유가 있을 때만 (Engine.idle_capacity — 대기열이 비었고 분당 · 일일 한도에 여유)
+  · 대기열을 서지 않고 (queue_max_wait=0), 헤징 없이
+  · 사용자가 다른 질문을 보내면 취소 — 다음 부분 답변 콜백에서 FlightCancelled를 던져
+    스트림을 닫는다 (합쳐진 요청이면 마지막 대기자가 떠날 때 업스트림도 중단)
+사용자가 아직 받는 중인 항목을 보내면 그 요청은 취소하지 않는다 — 같은 요청이라
+single-flight로 합쳐져 이어서 받고, 그때부터는 사용자 질문의 설정(대기열 · 마감 · 추가 백엔드)을 따른다.
+Streamlit에 의존하지 않는다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import logging
+import re
+import threading
+
+from engine import Session
+from response_cache import normalize
+from singleflight import FlightCancelled
+
+log = logging.getLogger("mentor.followups")
+
+MAX_SUGGESTIONS    = 3     # 버튼으로 보여줄 최대 항목 수
+MAX_QUESTION_CHARS = 120   # 이보다 긴 항목은 질문으로 쓰지 않음 (설명 문단)
+
+_SECTION = re.compile(r"다음\s*단계\s*제안|다음\s*단계|Next\s*Steps?", re.IGNORECASE)
+_FALLBACK_SECTION = re.compile(r"3\s*가지")
+_ITEM    = re.compile(r"^\s*(?:[-*•]|\d+[.)]|[①-⑨])\s+(.+)$")
+_HEADING = re.compile(r"^\s*(?:#{1,6}\s|\[[^\]]+\]\s*$|\*\*[^*]+\*\*\s*:?\s*$|---|___|\*\*\*)")
+
+
+def _clean(item: str) -> str:
+    """항목 → 질문 문장 — 굵게 · 코드 · 링크 표시를 걷어냄"""
+    item = re.sub(r"\[([^\]]+)\]\([^)]*\)", r"\1", item)
+    item = re.sub(r"[*_`]+", "", item)
+    return re.sub(r"\s+", " ", item).strip().rstrip(":")
+
+
+def _section_items(lines: list, heading) -> list:
+    """heading에 맞는 제목 줄 아래의 목록 항목 (다음 제목 · 구분선에서 끝)"""
+    items, inside = [], False
+    for line in lines:
+        if heading.search(line) and (_HEADING.match(line) or len(line.strip()) <= 40):
+            inside, items = True, []  # 같은 제목이 또 나오면 마지막 섹션 기준
+            continue
+        if not inside:
+            continue
+        m = _ITEM.match(line)
+        if m:
+            items.append(_clean(m.group(1)))
+        elif _HEADING.match(line) and items:
+            inside = False
+    return items
+
+
+def parse_suggestions(answer: str) -> list:
+    """답변 끝의 다음 단계 제안 → 질문 목록 (최대 MAX_SUGGESTIONS개, 없으면 빈 목록)"""
+    lines = answer.splitlines()
+    items = _section_items(lines, _SECTION) or _section_items(lines, _FALLBACK_SECTION)
+    seen, questions = set(), []
+    for item in items:
+        if 2 <= len(item) <= MAX_QUESTION_CHARS and normalize(item) not in seen:
+            seen.add(normalize(item))
+            questions.append(item)
+    return questions[:MAX_SUGGESTIONS]
+
+
+class _Job:
+    def __init__(self, question: str):
+        self.question  = question
+        self.cancelled = threading.Event()
+
+
+class Prefetcher:
+    """
+    세션(owner)별 미리 받기. start()로 작업을 띄우고, 사용자가 질문하면 claim()으로
+    나머지를 취소한다. thread-safe.
+    engine: Engine · cache: ResponseCache · record(outcome): 결과 집계 콜백
+    """
+
+    def __init__(
+        self, engine, cache, max_running: int = 4, minute_reserve: int = 2,
+        day_reserve: float = 0.2, record=lambda outcome: None,
+    ):
+        self.engine         = engine
+        self.cache          = cache
+        self.minute_reserve = minute_reserve
+        self.day_reserve    = day_reserve
+        self.record         = record
+        self._slots         = threading.BoundedSemaphore(max_running)
+        self._lock          = threading.Lock()
+        self._jobs: dict[str, list[_Job]] = {}   # owner → 최근 start()의 작업
+
+    def start(self, owner: str, requests: list, cursor: tuple = (0, 0)) -> int:
+        """
+        requests: [(질문, 요청 메시지)] — 앞에서부터 미리 받음. 이전 작업은 취소.
+        cursor: 호출자 세션의 (key_idx, model_idx). 띄운 작업 수를 반환.
+        """
+        self.claim(owner)
+        jobs = []
+        for question, messages in requests:
+            if self.cache.has(messages, self.engine.models()):
+                continue  # 이미 받아 둔 답
+            job = _Job(question)
+            jobs.append(job)
+            threading.Thread(
+                target=self._run, args=(job, messages, cursor), name="prefetch", daemon=True,
+            ).start()
+        with self._lock:
+            self._jobs[owner] = jobs
+        return len(jobs)
+
+    def claim(self, owner: str, question: str | None = None) -> bool:
+        """
+        사용자가 question을 보냄 — 그 질문이 아닌 작업은 모두 취소.
+        question을 미리 받고 있었으면(끝났든 진행 중이든) True.
+        """
+        with self._lock:
+            jobs = self._jobs.pop(owner, [])
+        key  = normalize(question) if question else None
+        used = False
+        for job in jobs:
+            if key is not None and normalize(job.question) == key:
+                used = True
+            else:
+                job.cancelled.set()
+        return used
+
+    def _run(self, job: _Job, messages: list, cursor: tuple) -> None:
+        if not self._slots.acquire(blocking=False):
+            self.record("skipped")  # 다른 세션의 미리 받기가 이미 많음
+            return
+        try:
+            if job.cancelled.is_set() or not self.engine.idle_capacity(self.minute_reserve, self.day_reserve):
+                self.record("skipped")
+                return
+
+            def on_delta(text):
+                if job.cancelled.is_set():
+                    raise FlightCancelled()
+
+            session = Session(*cursor)
+            try:
+                answer, error = self.engine.call(
+                    messages, session, on_delta=on_delta, purpose="prefetch", queue_max_wait=0,
+                    notify=lambda text, icon: log.debug("prefetch %s %s", icon, text),
+                )
+            except FlightCancelled:
+                self.record("cancelled")
+                return
+            if error or not answer or session.last_call is None:
+                self.record("error")
+                return
+            self.cache.put(messages, session.last_call["model"], answer)
+            self.record("ready")
+        except Exception:
+            log.exception("prefetch failed")
+            self.record("error")
+        finally:
+            self._slots.release()
@@ -0,0 +1,349 @@
+"""
+Key/Model 헬스 레지스트리
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+프로세스 전체(모든 브라우저 세션)가 공유하는 서킷 브레이커.
+한 세션이 429를 받으면 다른 세션은 같은 Key/Model로 왕복하지 않고 바로 건너뜀.
+
+차단 범위
+  (key, model) : 429 분당 한도
+  key          : 402 크레딧 부족 · 429 일일 한도 (한도 헤더의 일일 창, 헤더가 없으면 free-models-per-day)
+  model        : 404 모델 없음 · 502/503 과부하 · 타임아웃 · 연결 오류
+
+상태: closed → (실패) → open → (대기 종료) → half-open(탐침 1회) → closed / open
+대기 시간: Retry-After · X-RateLimit-Reset 헤더 우선, 없으면 지터 포함 지수 백오프.
+shared(state.SharedState)를 주면 열린 브레이커를 같은 호스트의 다른 워커 프로세스와 공유.
+
+app.py는 rerun마다 다시 실행되므로 상태를 가진 클래스는 이 모듈에 둔다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import email.utils
+import hashlib
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from ratelimit import daily_quota_headers
+
+# ── 오류 종류 ────────────────────────────────────────────────
+NOT_FOUND    = "not_found"     # 404
+RATE_LIMITED = "rate_limited"  # 429 (분당)
+DAILY_LIMIT  = "daily_limit"   # 429 (일일 한도 소진)
+PAYMENT      = "payment"       # 402
+OVERLOADED   = "overloaded"    # 502/503/529, 빈 응답
+TIMEOUT      = "timeout"
+CONNECTION   = "connection"
+OTHER        = "other"         # 400 등 — 요청 자체 문제, 차단하지 않음
+
+KIND_LABELS = {
+    NOT_FOUND:    "모델 없음",
+    RATE_LIMITED: "한도 초과",
+    DAILY_LIMIT:  "일일 한도 소진",
+    PAYMENT:      "크레딧 부족",
+    OVERLOADED:   "과부하",
+    TIMEOUT:      "시간 초과",
+    CONNECTION:   "연결 오류",
+    OTHER:        "오류",
+}
+
+_KEY_SCOPE   = {PAYMENT, DAILY_LIMIT}
+_MODEL_SCOPE = {NOT_FOUND, OVERLOADED, TIMEOUT, CONNECTION}
+_PAIR_SCOPE  = {RATE_LIMITED}
+
+
+def key_fingerprint(api_key: str) -> str:
+    """상태 저장·표시용 Key 식별자 (원문 Key를 남기지 않음)"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+# ── 오류 분류 ────────────────────────────────────────────────
+def _parse_retry_after(value: str) -> float | None:
+    """Retry-After: 초 또는 HTTP 날짜"""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _parse_reset(value) -> float | None:
+    """X-RateLimit-Reset: OpenRouter는 epoch 밀리초, 일부 서버는 epoch 초"""
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        return None
+    if ts > 1e12:
+        ts /= 1000
+    return max(0.0, ts - time.time())
+
+
+def error_headers(exc) -> dict:
+    """응답 헤더 + OpenRouter 오류 본문(metadata.headers)에 실린 한도 헤더"""
+    headers = {}
+    response = getattr(exc, "response", None)
+    if response is not None:
+        headers.update({k.lower(): v for k, v in response.headers.items()})
+    body = getattr(exc, "body", None)
+    if isinstance(body, dict):
+        body = body.get("error", body)
+        meta = body.get("metadata") if isinstance(body, dict) else None
+        if isinstance(meta, dict) and isinstance(meta.get("headers"), dict):
+            for k, v in meta["headers"].items():
+                headers.setdefault(k.lower(), v)
+    return headers
+
+
+class EmptyResponse(Exception):
+    """업스트림이 본문 없이 스트림을 끝냄 — 엔진이 직접 만드는 오류, 과부하로 분류"""
+
+
+def _daily_limit(headers: dict, err: str) -> bool:
+    """
+    429가 일일 한도 소진인지. 한도 헤더(응답 · 오류 본문 metadata.headers)가 있으면 그것으로 —
+    남은 수 0이고 리셋이 일일 창(ratelimit.daily_quota_headers)이면 일일, 아니면 분당.
+    헤더가 없을 때만 마지막 수단으로 메시지(free-models-per-day)를 본다.
+    """
+    if "x-ratelimit-remaining" in headers and "x-ratelimit-reset" in headers:
+        quota = daily_quota_headers(headers, time.time())
+        return quota is not None and quota[1] == 0
+    return "per-day" in err or "per day" in err
+
+
+def classify_error(exc: Exception) -> tuple[str, float | None]:
+    """
+    예외 → (오류 종류, 재시도 가능까지 남은 초 | None).
+    HTTP 상태 코드 · 헤더 · 오류 본문과 예외 타입으로 판단 — 메시지 속 숫자 · 단어로 추측하지 않음
+    (429 일일 한도만 한도 헤더가 없을 때 메시지를 마지막 수단으로 봄).
+    상태 코드도 알려진 타입도 아니면 OTHER.
+    """
+    import httpx   # 지연 import — 분류가 필요할 때만
+    import openai
+
+    # 스트림을 읽다 난 오류는 SDK가 감싸지 않은 httpx 예외로 올라옴
+    if isinstance(exc, (openai.APITimeoutError, httpx.TimeoutException, TimeoutError)):
+        return TIMEOUT, None
+    if isinstance(exc, (openai.APIConnectionError, httpx.TransportError)):
+        return CONNECTION, None
+    if isinstance(exc, EmptyResponse):
+        return OVERLOADED, None
+
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        return OTHER, None
+    err = str(exc)
+
+    headers = error_headers(exc)
+    wait = None
+    if headers.get("retry-after"):
+        wait = _parse_retry_after(str(headers["retry-after"]))
+    if wait is None and headers.get("x-ratelimit-reset"):
+        wait = _parse_reset(headers["x-ratelimit-reset"])
+
+    if status == 404:
+        return NOT_FOUND, wait
+    if status == 402:
+        return PAYMENT, wait
+    if status == 429:
+        return (DAILY_LIMIT if _daily_limit(headers, err) else RATE_LIMITED), wait
+    if status in (408, 502, 503, 504, 529):
+        return OVERLOADED, wait
+    return OTHER, None
+
+
+# ── 서킷 브레이커 ────────────────────────────────────────────
+@dataclass
+class Breaker:
+    failures:      int   = 0    # 연속 실패 횟수 (0 = closed)
+    open_until:    float = 0.0  # epoch 초 — 이 시각까지 차단
+    probe_started: float = 0.0  # half-open 탐침 시작 시각 (0 = 탐침 없음)
+    last_kind:     str   = ""
+
+    def state(self, now: float) -> str:
+        if self.failures == 0:
+            return "closed"
+        if now < self.open_until:
+            return "open"
+        return "half_open"
+
+
+class HealthRegistry:
+    """
+    (key, model) 단위 사용 가능 여부 판단 + 성공/실패 기록. thread-safe.
+    key는 key_fingerprint() 값, model은 모델 id.
+    """
+
+    def __init__(
+        self,
+        base_backoff:       float = 2.0,     # 첫 실패 후 차단(초)
+        max_backoff:        float = 300.0,   # 지수 백오프 상한
+        not_found_cooldown: float = 3600.0,  # 404 모델 차단(초)
+        daily_cooldown:     float = 3600.0,  # 일일 한도 — 리셋 시각을 모를 때
+        probe_timeout:      float = 60.0,    # 결과 없이 끝난 탐침을 풀어줄 시간
+        shared                    = None,    # state.SharedState — 프로세스 간 공유
+    ):
+        self.base_backoff       = base_backoff
+        self.max_backoff        = max_backoff
+        self.not_found_cooldown = not_found_cooldown
+        self.daily_cooldown     = daily_cooldown
+        self.probe_timeout      = probe_timeout
+        self._shared   = shared
+        self._seen     = None   # 마지막으로 읽은 shared.version()
+        self._lock     = threading.Lock()
+        self._breakers: dict[tuple, Breaker] = {}
+
+    def _pull(self) -> None:
+        """다른 프로세스가 브레이커를 바꿨으면 다시 읽음 (lock 안에서 호출). 탐침 예약은 로컬 값 유지."""
+        if self._shared is None:
+            return
+        version = self._shared.version()
+        if version == self._seen:
+            return
+        self._seen = version
+        breakers = {}
+        for scope, (failures, open_until, kind) in self._shared.breakers().items():
+            b = self._breakers.get(scope) or Breaker()
+            b.failures, b.open_until, b.last_kind = failures, open_until, kind
+            breakers[scope] = b
+        self._breakers = breakers
+
+    # 범위별 브레이커 키: ("key", k) · ("model", m) · ("pair", k, m)
+    @staticmethod
+    def _scopes(key: str, model: str) -> list[tuple]:
+        return [("key", key), ("model", model), ("pair", key, model)]
+
+    def _blocking(self, key: str, model: str, now: float) -> list[Breaker]:
+        """현재 이 조합을 막고 있거나 탐침 대상인 브레이커 목록"""
+        return [
+            b for s in self._scopes(key, model)
+            if (b := self._breakers.get(s)) is not None and b.failures
+        ]
+
+    def _probe_busy(self, b: Breaker, now: float) -> bool:
+        return b.probe_started and now - b.probe_started < self.probe_timeout
+
+    def available(self, key: str, model: str) -> bool:
+        """예약 없이 사용 가능 여부만 확인 (후보 고르기용)"""
+        now = time.time()
+        with self._lock:
+            self._pull()
+            return all(
+                b.state(now) == "half_open" and not self._probe_busy(b, now)
+                for b in self._blocking(key, model, now)
+            )
+
+    def acquire(self, key: str, model: str) -> bool:
+        """
+        요청 직전 호출. closed면 통과, half-open이면 탐침 1회만 허용(예약).
+        통과했으면 반드시 record_success / record_failure / release 중 하나를 호출.
+        """
+        now = time.time()
+        with self._lock:
+            self._pull()
+            blocking = self._blocking(key, model, now)
+            for b in blocking:
+                if b.state(now) == "open" or self._probe_busy(b, now):
+                    return False
+            for b in blocking:
+                b.probe_started = now
+            return True
+
+    def release(self, key: str, model: str) -> None:
+        """결과 없이 끝난 시도(취소 등)의 탐침 예약 해제"""
+        with self._lock:
+            for s in self._scopes(key, model):
+                if (b := self._breakers.get(s)) is not None:
+                    b.probe_started = 0.0
+
+    def record_success(self, key: str, model: str) -> None:
+        with self._lock:
+            self._pull()
+            cleared = [s for s in self._scopes(key, model) if self._breakers.pop(s, None)]
+            if cleared and self._shared is not None:
+                self._shared.clear_breakers(cleared)
+
+    def record_failure(self, key: str, model: str, kind: str, retry_after: float | None = None) -> None:
+        """오류 종류에 맞는 범위의 브레이커를 연다. OTHER는 기록하지 않음."""
+        if kind in _KEY_SCOPE:
+            scope = ("key", key)
+        elif kind in _MODEL_SCOPE:
+            scope = ("model", model)
+        elif kind in _PAIR_SCOPE:
+            scope = ("pair", key, model)
+        else:
+            self.release(key, model)
+            return
+
+        now = time.time()
+        with self._lock:
+            self._pull()
+            b = self._breakers.setdefault(scope, Breaker())
+            b.failures     += 1
+            b.last_kind     = kind
+            b.probe_started = 0.0
+            if retry_after is not None:
+                # 서버가 알려준 시각 + 동시 재시도 분산용 작은 지터
+                delay = retry_after + random.uniform(0, 1)
+            elif kind == NOT_FOUND:
+                delay = self.not_found_cooldown
+            elif kind == DAILY_LIMIT:
+                delay = self.daily_cooldown
+            else:
+                # equal jitter: [d/2, d]
+                d = min(self.max_backoff, self.base_backoff * 2 ** (b.failures - 1))
+                delay = random.uniform(d / 2, d)
+            b.open_until = now + delay
+            if self._shared is not None:
+                self._shared.put_breaker(scope, b.failures, b.open_until, kind)
+            # 좁은 범위의 탐침 예약도 함께 해제
+            for s in self._scopes(key, model):
+                if (other := self._breakers.get(s)) is not None:
+                    other.probe_started = 0.0
+
+    def wait_time(self, key: str, model: str) -> float:
+        """이 조합이 다시 열릴 때까지 남은 초 (0 = 지금 사용 가능)"""
+        now = time.time()
+        with self._lock:
+            self._pull()
+            return max(
+                [b.open_until - now for b in self._blocking(key, model, now)] + [0.0]
+            )
+
+    def model_blocked(self, model: str) -> bool:
+        """모델 단위 브레이커가 열려 있는지 (404 · 과부하 · 타임아웃) — 카탈로그 정리용"""
+        now = time.time()
+        with self._lock:
+            self._pull()
+            b = self._breakers.get(("model", model))
+            return b is not None and b.failures > 0 and b.state(now) == "open"
+
+    def key_status(self, key: str) -> tuple[str, float]:
+        """Key 단위 상태 (state, 남은 초) — 사이드바 표시용"""
+        now = time.time()
+        with self._lock:
+            self._pull()
+            b = self._breakers.get(("key", key))
+            if b is None or not b.failures:
+                return "closed", 0.0
+            return b.state(now), max(0.0, b.open_until - now)
+
+    def snapshot(self) -> list[dict]:
+        """열려 있거나 탐침 중인 브레이커 목록"""
+        now = time.time()
+        with self._lock:
+            self._pull()
+            return [
+                {
+                    "scope":    scope,
+                    "state":    b.state(now),
+                    "kind":     b.last_kind,
+                    "failures": b.failures,
+                    "wait":     max(0.0, b.open_until - now),
+                }
+                for scope, b in self._breakers.items()
+                if b.failures
+            ]
@@ -0,0 +1,131 @@
+"""
+세션 대화 기록 메모리 관리
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+브라우저 탭(세션)마다 st.session_state.messages에 답변 원문이 쌓여
+서버 RSS가 하루 종일 늘어나는 것을 막는다.
+
+  집계     : 세션별 messages가 차지하는 바이트(추정)를 메시지를 넣고 뺄 때마다 갱신
+  내리기   : 한 세션이 session_bytes를 넘으면 호출자(app.py)가 이미 저장소에 있고
+             요약에 들어간 앞부분을 메모리에서 뺀다 (msg_base를 앞으로 — 화면은 저장소에서 읽음)
+  유휴 정리 : idle_ttl 동안 실행이 없던 세션의 messages를 비우고 목록에서 뺀다.
+             그 세션이 돌아오면 touch()가 False를 돌려주고, 호출자가 저장소에서 다시 연다
+
+세션 쪽은 Holding 하나를 st.session_state에 들고 있고, 레지스트리는 유휴 정리 전까지만
+참조한다 — 탭을 닫아 사라진 세션도 idle_ttl 뒤에는 여기서 풀린다.
+Streamlit에 의존하지 않는다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+SWEEP_INTERVAL = 60  # 유휴 세션 정리 최소 간격(초)
+
+
+def message_bytes(msg: dict) -> int:
+    """메시지 dict 하나가 차지하는 메모리 추정 — dict + 값(원문 · timing 등) 얕은 크기"""
+    return sys.getsizeof(msg) + sum(sys.getsizeof(v) for v in msg.values())
+
+
+def process_rss() -> int | None:
+    """이 프로세스의 현재 RSS 바이트 (Linux /proc 기준, 없으면 None)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass(eq=False)  # 세션마다 하나 — 같음 비교 · 해시는 객체 기준
+class Holding:
+    """세션 1개의 대화 기록 — messages는 st.session_state.messages와 같은 list"""
+    messages:    list
+    bytes:       int   = 0
+    last_active: float = field(default_factory=time.time)
+    evicted:     bool  = False
+
+
+class SessionMemory:
+    """
+    session_bytes: 세션 하나가 메모리에 들고 있을 기록 상한 (0 = 내리지 않음)
+    idle_ttl:      이 시간(초) 동안 실행이 없던 세션은 기록을 비움 (0 = 정리 안 함)
+    thread-safe — 세션 스크립트 스레드들이 함께 쓴다.
+    """
+
+    def __init__(self, session_bytes: int, idle_ttl: float):
+        self.session_bytes = session_bytes
+        self.idle_ttl      = idle_ttl
+        self._lock         = threading.Lock()
+        self._held: set[Holding] = set()
+        self._last_sweep   = time.time()
+        self._evicted      = 0   # 유휴 정리한 세션 수 (누적)
+        self._spilled      = 0   # 메모리에서 내린 메시지 수 (누적)
+        self._spilled_b    = 0
+
+    def hold(self, messages: list, previous: Holding | None = None) -> Holding:
+        """세션이 새 기록(messages)을 열었음 — previous(이전 대화)는 놓는다"""
+        holding = Holding(messages, sum(message_bytes(m) for m in messages))
+        with self._lock:
+            if previous is not None:
+                self._held.discard(previous)
+            self._held.add(holding)
+        return holding
+
+    def add(self, holding: Holding, msg: dict) -> bool:
+        """messages에 msg가 추가됨. 세션 상한을 넘었으면 True (호출자가 앞부분을 내림)"""
+        with self._lock:
+            holding.bytes      += message_bytes(msg)
+            holding.last_active = time.time()
+            return bool(self.session_bytes) and holding.bytes > self.session_bytes
+
+    def spilled(self, holding: Holding, dropped: list) -> None:
+        """호출자가 messages 앞부분(dropped)을 메모리에서 뺐음"""
+        size = sum(message_bytes(m) for m in dropped)
+        with self._lock:
+            holding.bytes   -= size
+            self._spilled   += len(dropped)
+            self._spilled_b += size
+
+    def touch(self, holding: Holding) -> bool:
+        """
+        세션 실행 시작. 그 사이 유휴 정리됐으면 False — 호출자가 저장소에서 다시 연다.
+        겸사겸사 다른 유휴 세션을 정리한다 (SWEEP_INTERVAL마다).
+        """
+        now = time.time()
+        with self._lock:
+            if holding.evicted:
+                return False
+            holding.last_active = now
+            if self.idle_ttl and now - self._last_sweep >= SWEEP_INTERVAL:
+                self._sweep(now)
+        return True
+
+    def _sweep(self, now: float) -> None:
+        """lock 안에서 호출 — 유휴 세션의 기록을 비우고 놓는다"""
+        self._last_sweep = now
+        for holding in [h for h in self._held if now - h.last_active > self.idle_ttl]:
+            holding.messages.clear()  # session_state와 같은 list — 그 세션 메모리가 바로 풀림
+            holding.bytes   = 0
+            holding.evicted = True
+            self._held.discard(holding)
+            self._evicted  += 1
+
+    def status(self) -> dict:
+        """관리자 화면용 — 세션 수 · 총 바이트 · 가장 큰 세션 · 누적 내림/정리"""
+        with self._lock:
+            sizes = [h.bytes for h in self._held]
+            return {
+                "sessions":      len(sizes),
+                "bytes":         sum(sizes),
+                "largest":       max(sizes, default=0),
+                "session_limit": self.session_bytes,
+                "idle_ttl":      self.idle_ttl,
+                "spilled":       self._spilled,
+                "spilled_bytes": self._spilled_b,
+                "evicted":       self._evicted,
+                "rss":           process_rss(),
+            }
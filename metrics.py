@@ -0,0 +1,356 @@
+"""
+요청 지표 · 트레이스
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+call_openrouter 1회 = 트레이스 1개. 시도(Key × Model)마다 결과를 남긴다.
+
+  트레이스 : 목적(chat · summary) · 질문 유형 · 결과 · 최종 모델/Key(/추가 백엔드) · 첫 토큰 · 전체 시간 ·
+             프롬프트/답변/캐시 적중/추론 토큰(usage 없으면 추정) · 보낸 바이트 · 대기열 시간 · 시도 목록
+  시도     : Key · 모델 · 결과(ok · 오류 종류 · lost · cancelled) · 소요 · 첫 토큰
+
+내보내기
+  · Prometheus 텍스트 형식 — render_prometheus(), serve(port)로 /metrics 제공
+  · JSONL — 끝난 트레이스를 한 줄씩 모아 flush_interval마다 파일에 추가
+  · summary() — 최근 트레이스 기준 모델별 · Key별 p50/p95 · 오류율 (관리자 패널)
+
+Key 라벨은 key_fingerprint 값만 쓴다 (원문 Key를 남기지 않음).
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import atexit
+import json
+import logging
+import secrets
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger("mentor.metrics")
+
+HISTOGRAM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+# 이름: (종류, 설명)
+_METRICS = {
+    "mentor_requests_total":           ("counter",   "call_openrouter 호출 수 (목적 · 결과별)"),
+    "mentor_request_duration_seconds": ("histogram", "질문 1건 전체 소요 (모든 시도 포함)"),
+    "mentor_ttft_seconds":             ("histogram", "답변 첫 토큰까지 (성공한 시도 기준)"),
+    "mentor_attempts_total":           ("counter",   "업스트림 시도 수 (Key · 모델 · 결과별)"),
+    "mentor_tokens_total":             ("counter",   "토큰 수 (모델 · prompt/cached/completion/reasoning)"),
+    "mentor_sent_bytes_total":         ("counter",   "업스트림으로 보낸 요청 본문 바이트"),
+    "mentor_cache_hits_total":         ("counter",   "응답 캐시로 처리한 질문 수"),
+    "mentor_coalesced_total":          ("counter",   "진행 중인 같은 요청에 합류해 업스트림 호출 없이 받은 질문 수"),
+    "mentor_queue_wait_seconds":       ("histogram", "Key 요청 한도로 대기열에서 기다린 시간"),
+    "mentor_prefetch_total":           ("counter",   "다음 질문 미리 받기 (결과별: ready · skipped · cancelled · error · used)"),
+    "mentor_spillover_total":          ("counter",   "OpenRouter 포화로 추가 백엔드가 답한 질문 수 (백엔드 · 이유별)"),
+}
+
+
+@dataclass
+class Attempt:
+    key:      str
+    model:    str
+    started:  float                 # 트레이스 시작 기준(초)
+    outcome:  str          = "pending"
+    duration: float | None = None
+    ttft:     float | None = None
+
+
+@dataclass
+class Trace:
+    """요청 1건의 기록. MetricsRegistry.start_trace()로 만든다."""
+    purpose:           str
+    prompt_tokens:     int
+    request_bytes:     int
+    id:                str   = field(default_factory=lambda: secrets.token_hex(8))
+    ts:                float = field(default_factory=time.time)
+    outcome:           str   = ""
+    model:             str   = ""
+    key:               str   = ""
+    ttft:              float | None = None   # 요청 시작 → 첫 토큰
+    total:             float | None = None   # 요청 시작 → 끝 (모든 시도 포함)
+    completion_tokens: int   = 0
+    cached_tokens:     int | None = None   # 프롬프트 중 업스트림 캐시로 처리된 토큰 (usage에 있을 때만)
+    reasoning_tokens:  int | None = None   # completion 중 추론 토큰 (usage에 있을 때만)
+    kind:              str   = ""           # 질문 유형 (profiles.py) — ADAPTIVE_OUTPUT=0이면 빈 값
+    tokens_source:     str   = "estimate"   # usage · estimate
+    hedged:            bool  = False
+    backend:           str   = ""           # 추가 백엔드가 답했으면 그 이름 (backends.py)
+    queued:            float = 0.0          # 요청 한도 대기열에서 기다린 시간(초)
+    attempts:          list  = field(default_factory=list)
+    _t0:               float = field(default_factory=time.perf_counter, repr=False)
+    _registry:         object = field(default=None, repr=False)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def attempt(self, key: str, model: str) -> Attempt:
+        """시도 시작 — 보낸 바이트를 바로 집계"""
+        att = Attempt(key=key, model=model, started=self.elapsed())
+        self.attempts.append(att)
+        self._registry.inc("mentor_sent_bytes_total", {"model": model}, self.request_bytes)
+        return att
+
+    def attempt_done(self, att: Attempt, outcome: str, ttft: float | None = None) -> None:
+        """시도 결과 — 진 헤징 후보처럼 트레이스가 끝난 뒤에 와도 카운터에는 반영"""
+        att.outcome  = outcome
+        att.duration = self.elapsed() - att.started
+        att.ttft     = ttft
+        self._registry.inc(
+            "mentor_attempts_total", {"key": att.key, "model": att.model, "outcome": outcome},
+        )
+
+    def first_token(self) -> None:
+        """사용자 기준 첫 토큰 — 요청 시작(첫 시도 전)부터 잰다"""
+        self.ttft = self.elapsed()
+
+    def succeeded(self, key: str, model: str, completion_tokens: int, usage=None) -> None:
+        """이긴 시도의 결과. usage(응답의 토큰 집계)가 있으면 추정치 대신 사용."""
+        self.key, self.model = key, model
+        self.completion_tokens = completion_tokens
+        if usage is not None and getattr(usage, "completion_tokens", None) is not None:
+            self.prompt_tokens     = usage.prompt_tokens
+            self.completion_tokens = usage.completion_tokens
+            self.tokens_source     = "usage"
+            details = getattr(usage, "prompt_tokens_details", None)
+            if details is not None and getattr(details, "cached_tokens", None) is not None:
+                self.cached_tokens = details.cached_tokens
+            details = getattr(usage, "completion_tokens_details", None)
+            if details is not None and getattr(details, "reasoning_tokens", None) is not None:
+                self.reasoning_tokens = details.reasoning_tokens
+
+    def finish(self, outcome: str) -> None:
+        """ok · partial(스트림 중단) · error · cancelled(기다리는 세션이 모두 떠남)"""
+        self.outcome = outcome
+        self.total   = self.elapsed()
+        self._registry.record(self)
+
+    def to_dict(self) -> dict:
+        d = {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith("_")}
+        d["attempts"] = [asdict(a) for a in self.attempts]
+        return d
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: tuple, extra: dict = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _percentile(values: list, q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _new_stat() -> dict:
+    return {"attempts": 0, "errors": 0, "total": [], "ttft": [], "prompt": 0, "cached": 0}
+
+
+class MetricsRegistry:
+    """프로세스 공용 지표 저장소. thread-safe."""
+
+    def __init__(
+        self,
+        window:         int   = 2000,   # summary()가 보는 최근 트레이스 수
+        jsonl_path:     str | None = None,
+        flush_interval: float = 10.0,
+    ):
+        self._lock     = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._hists:    dict[tuple, list]  = {}   # [버킷별 누적 개수..., 합, 개수]
+        self._recent   = deque(maxlen=window)
+        self._pending: list[str] = []
+        self._server   = None
+        self.jsonl_path     = jsonl_path
+        self.flush_interval = flush_interval
+        if jsonl_path:
+            threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+            atexit.register(self.flush)  # 종료 직전 대기열도 남김
+
+    # ── 기록 ─────────────────────────────────────────────────
+    def start_trace(self, purpose: str, prompt_tokens: int, request_bytes: int) -> Trace:
+        return Trace(
+            purpose=purpose, prompt_tokens=prompt_tokens,
+            request_bytes=request_bytes, _registry=self,
+        )
+
+    def inc(self, name: str, labels: dict, value: float = 1) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: dict, value: float) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            h = self._hists.setdefault(key, [0] * len(HISTOGRAM_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if value <= bound:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def record(self, trace: Trace) -> None:
+        """끝난 트레이스를 카운터 · 히스토그램 · 최근 목록 · JSONL 대기열에 반영"""
+        self.inc("mentor_requests_total", {"purpose": trace.purpose, "outcome": trace.outcome})
+        self.observe("mentor_request_duration_seconds", {"purpose": trace.purpose}, trace.total)
+        if trace.queued:
+            self.observe("mentor_queue_wait_seconds", {"purpose": trace.purpose}, trace.queued)
+        if trace.model:
+            if trace.ttft is not None:
+                self.observe("mentor_ttft_seconds", {"model": trace.model}, trace.ttft)
+            self.inc("mentor_tokens_total", {"model": trace.model, "type": "prompt"}, trace.prompt_tokens)
+            if trace.cached_tokens:
+                self.inc(
+                    "mentor_tokens_total", {"model": trace.model, "type": "cached"}, trace.cached_tokens,
+                )
+            self.inc(
+                "mentor_tokens_total", {"model": trace.model, "type": "completion"},
+                trace.completion_tokens,
+            )
+            if trace.reasoning_tokens:
+                self.inc(
+                    "mentor_tokens_total", {"model": trace.model, "type": "reasoning"},
+                    trace.reasoning_tokens,
+                )
+        row = trace.to_dict()
+        with self._lock:
+            self._recent.append(row)
+            if self.jsonl_path:
+                self._pending.append(json.dumps(row, ensure_ascii=False))
+
+    def record_cache_hit(self) -> None:
+        self.inc("mentor_cache_hits_total", {})
+
+    def record_prefetch(self, outcome: str) -> None:
+        self.inc("mentor_prefetch_total", {"outcome": outcome})
+
+    def record_spillover(self, backend: str, reason: str) -> None:
+        self.inc("mentor_spillover_total", {"backend": backend, "reason": reason})
+
+    def record_coalesced(self) -> None:
+        self.inc("mentor_coalesced_total", {})
+
+    # ── JSONL ────────────────────────────────────────────────
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines:
+            return
+        try:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            log.warning("metrics flush failed: %s", e)
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    # ── Prometheus ───────────────────────────────────────────
+    def render_prometheus(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            hists    = {k: list(v) for k, v in self._hists.items()}
+        lines = []
+        for name, (kind, help_text) in _METRICS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind == "counter":
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+                continue
+            for (n, labels), h in sorted(hists.items()):
+                if n != name:
+                    continue
+                for bound, count in zip(HISTOGRAM_BUCKETS, h):
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, {'le': f'{bound:g}'})} {count}")
+                lines.append(f"{name}_bucket{_fmt_labels(labels, {'le': '+Inf'})} {h[-1]}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-2]:.6f}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> bool:
+        """/metrics HTTP 서버를 별도 스레드로 시작. 포트 사용 중이면 False."""
+        if self._server is not None:
+            return True
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            log.warning("metrics server not started on port %s: %s", port, e)
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return True
+
+    # ── 관리자 패널 ──────────────────────────────────────────
+    def summary(self, since: float = 3600.0) -> dict:
+        """
+        최근 since초 트레이스 기준
+          models / keys: {이름: {"requests", "errors", "error_rate", "p50", "p95", "ttft_p50", "cache_rate"}}
+        지연 시간은 이긴 시도의 전체 시간, 오류율은 시도 단위.
+        cache_rate는 usage에 캐시 토큰이 온 요청의 프롬프트 중 캐시 적중 비율 (없으면 None).
+        """
+        cutoff = time.time() - since
+        with self._lock:
+            rows = [r for r in self._recent if r["ts"] >= cutoff]
+        out = {"requests": len(rows), "models": {}, "keys": {}}
+        for group in ("model", "key"):
+            stats: dict[str, dict] = {}
+            for r in rows:
+                for a in r["attempts"]:
+                    s = stats.setdefault(a[group], _new_stat())
+                    if a["outcome"] in ("pending", "cancelled", "lost"):
+                        continue
+                    s["attempts"] += 1
+                    s["errors"]   += a["outcome"] != "ok"
+                if r[group] and r["total"] is not None:
+                    s = stats.setdefault(r[group], _new_stat())
+                    s["total"].append(r["total"])
+                    if r["ttft"] is not None:
+                        s["ttft"].append(r["ttft"])
+                    if r["cached_tokens"] is not None:
+                        s["prompt"] += r["prompt_tokens"]
+                        s["cached"] += r["cached_tokens"]
+            out[f"{group}s"] = {
+                name: {
+                    "attempts":   s["attempts"],
+                    "errors":     s["errors"],
+                    "error_rate": s["errors"] / s["attempts"] if s["attempts"] else 0.0,
+                    "p50":        statistics.median(s["total"]) if s["total"] else None,
+                    "p95":        _percentile(s["total"], 0.95),
+                    "ttft_p50":   statistics.median(s["ttft"]) if s["ttft"] else None,
+                    "cache_rate": s["cached"] / s["prompt"] if s["prompt"] else None,
+                }
+                for name, s in stats.items()
+            }
+        return out
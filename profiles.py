@@ -0,0 +1,114 @@
+"""
+생성 프로필 — 질문 유형 · 모델별 max_tokens · temperature · 추론 설정
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+모든 질문에 max_tokens 4096 · temperature 0.7을 주는 대신
+
+  질문 유형 : 마지막 사용자 질문을 규칙으로 분류
+              quick    — 인사 · 한 줄짜리 용어 정의("X란?" · "X가 뭐야?")만 → 짧은 답
+                         (형식 생략 지시) · 낮은 temperature
+              standard — 기본값 (멘토 답변 형식 · [다음 단계 제안] 유지)
+              deep     — 전략 · 분석 · 설계 · 코드 등 긴 답이 필요한 질문
+              summary  — 대화 요약 (purpose="summary")
+  추론 모델 : 카탈로그 supported_parameters에 reasoning이 있거나 id가 R1 · QwQ 등이면
+              질문 유형에 맞는 reasoning effort를 보내고, 추론 토큰 몫을 max_tokens에 더함
+              (OpenRouter는 추론 토큰도 max_tokens 안에서 센다)
+  남은 컨텍스트 : 모든 max_tokens는 그 모델에 남은 자리(context.output_budget) 이하
+
+짧은 질문(quick)만 답도 짧게 요청해 몇 초 안에 끝나게 한다 — 형식을 지키는 답은 상한을 줄이지 않는다.
+Streamlit에 의존하지 않는다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import re
+from dataclasses import dataclass
+
+# 질문 유형별 답변 토큰 · temperature · 추론 effort · 추가 지시
+QUESTION_PROFILES = {
+    "quick": dict(
+        answer_tokens = 800,
+        temperature   = 0.3,
+        effort        = "low",
+        hint          = "이번 질문은 간단하다. 정해진 답변 형식은 생략하고 핵심만 3~6문장으로 답하라.",
+    ),
+    # standard는 기준(4096) 그대로 — 멘토 형식(5개 섹션 · 지식 3가지 · [다음 단계 제안])이 잘리지 않도록.
+    # max_tokens는 상한일 뿐 답이 짧으면 일찍 끝나므로 줄여도 빨라지지 않는다
+    "standard": dict(answer_tokens=4096, temperature=0.7, effort="medium", hint=""),
+    "deep":     dict(answer_tokens=4096, temperature=0.7, effort="high",   hint=""),
+    "summary":  dict(answer_tokens=800,  temperature=0.2, effort="low",    hint=""),
+}
+
+# 추론 effort별로 max_tokens에 더해 줄 추론 토큰 몫
+REASONING_TOKENS = {"low": 1024, "medium": 2048, "high": 4096}
+
+# 카탈로그 메타데이터가 없을 때(백업 목록) 추론 모델로 볼 id 조각
+REASONING_ID_HINTS = ("-r1", "/r1", "qwq", "thinking", "reasoner", "reasoning")
+
+DEEP_MIN_CHARS = 300  # 이보다 길면 deep
+
+_DEEP_WORDS = re.compile(
+    r"전략|분석|설계|비교|로드맵|계획|코드|구현|아키텍처|단계별|자세히|심층|원리|방법론|장단점|"
+    r"최적화|보고서|리서치|커리큘럼|기획|strategy|analy|design|compare|implement|code|architecture|"
+    r"step[- ]by[- ]step|in detail",
+    re.IGNORECASE,
+)
+# quick은 질문 전체가 아래 형식일 때만 (fullmatch) — 짧다는 것만으로는 quick이 아님
+_GREETING = re.compile(
+    r"(?:안녕(?:하세요)?|고마워(?:요)?|감사(?:합니다|해요)?|ㅎㅇ|hi|hello|hey|thanks|thank you)\b[\s!.~?]*",
+    re.IGNORECASE,
+)
+_DEFINITION = re.compile(
+    r"(?!.*(?:차이|difference|\bvs\b))"  # "A와 B의 차이"는 비교 — 한 줄 정의가 아님
+    r"(?:[^\s?]+(?: [^\s?]+)? ?(?:이란|란|(?:이|가|의 뜻이) ?(?:뭐야|뭐예요|뭔가요|무엇인가요|뭐지))\s*\??"
+    r"|(?:what is|what's|who is|define)\b[^?\n]{1,40}\??)",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    kind:        str                # quick · standard · deep · summary
+    max_tokens:  int
+    temperature: float
+    reasoning:   dict | None = None  # OpenRouter reasoning 파라미터 (추론 모델만)
+    hint:        str         = ""    # 요청 끝에 붙일 system 지시
+
+
+def question_kind(messages: list, purpose: str = "chat") -> str:
+    """요청 메시지 → 질문 유형 (마지막 user 메시지 기준)"""
+    if purpose == "summary":
+        return "summary"
+    question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    text = question.strip()
+    if len(text) >= DEEP_MIN_CHARS or _DEEP_WORDS.search(text):
+        return "deep"
+    if _GREETING.fullmatch(text) or _DEFINITION.fullmatch(text):
+        return "quick"
+    return "standard"
+
+
+def supports_reasoning(model_id: str, info: dict | None) -> bool:
+    params = (info or {}).get("supported_parameters")
+    if params:
+        return "reasoning" in params or "include_reasoning" in params
+    return any(h in model_id.lower() for h in REASONING_ID_HINTS)
+
+
+def generation_profile(
+    kind: str, model_id: str, info: dict | None, room: int, show_reasoning: bool = True,
+) -> GenerationProfile:
+    """
+    질문 유형 · 모델 → 생성 설정. room: 이 모델에 남은 출력 자리 (output_budget 값).
+    show_reasoning=False면 추론 내용을 응답에서 빼 달라고 요청 (exclude).
+    """
+    p = QUESTION_PROFILES[kind]
+    if not supports_reasoning(model_id, info):
+        return GenerationProfile(
+            kind, min(room, p["answer_tokens"]), p["temperature"], hint=p["hint"],
+        )
+    return GenerationProfile(
+        kind,
+        min(room, p["answer_tokens"] + REASONING_TOKENS[p["effort"]]),
+        p["temperature"],
+        reasoning = {"effort": p["effort"], "exclude": not show_reasoning},
+        hint      = p["hint"],
+    )
@@ -0,0 +1,321 @@
+"""
+Key별 요청 한도 + 공정 대기열
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+프로세스 전체(모든 세션)가 공유. 업스트림 429를 맞기 전에 로컬에서 속도를 맞춘다.
+
+  분당 한도 : 토큰 버킷 — rpm개까지 몰아 쓰고 초당 rpm/60개씩 다시 참
+  일일 한도 : 리셋 시각에 0으로 돌아가는 카운터 (OpenRouter 무료 한도 기준).
+              보낸 요청 수로 세고, 응답 헤더(X-RateLimit-*)가 일일 창을 알려 주면
+              실제 한도 · 남은 수 · 리셋 시각으로 맞춘다. 429 일일 한도 소진을 받으면
+              그 Key는 리셋까지 소진으로 예측 — 다시 보내 보지 않고 건너뛴다.
+  모델별    : Key × 모델 오늘(UTC) 요청 수 (표시용)
+
+대기열: 모든 Key가 한도에 걸리면 요청은 표(Ticket)를 받고 FIFO로 줄을 선다.
+줄이 있는 동안에는 맨 앞 표만 Key를 가져갈 수 있어 나중에 온 요청이
+새치기하지 못한다. 기다리는 동안 on_wait(순번, 예상 대기초)로 알려 준다.
+
+shared(state.SharedState)를 주면 버킷(분당 토큰 · 일일 사용량)을 같은 호스트의
+다른 워커 프로세스와 함께 쓴다. 대기열 순서는 프로세스 안에서만 지킨다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+
+DAILY_WINDOW_MIN = 600  # X-RateLimit-Reset이 이보다 멀면 일일 창으로 본다(초) — 가까우면 분당 창
+
+
+def _next_utc_midnight(now: float) -> float:
+    day = datetime.fromtimestamp(now, timezone.utc).date() + timedelta(days=1)
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+
+
+def _utc_day(now: float) -> str:
+    return datetime.fromtimestamp(now, timezone.utc).date().isoformat()
+
+
+def daily_quota_headers(headers, now: float) -> tuple | None:
+    """
+    X-RateLimit-Limit · Remaining · Reset → (한도, 남은 수, 리셋 epoch 초).
+    리셋까지 DAILY_WINDOW_MIN초 이상 남은 일일 창일 때만, 아니면 None.
+    """
+    try:
+        limit     = int(headers["x-ratelimit-limit"])
+        remaining = int(headers["x-ratelimit-remaining"])
+        reset     = float(headers["x-ratelimit-reset"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if reset > 1e12:  # OpenRouter는 epoch 밀리초
+        reset /= 1000
+    if limit <= 0 or reset - now < DAILY_WINDOW_MIN:
+        return None
+    return limit, max(0, remaining), reset
+
+
+class KeyBucket:
+    """Key 1개의 분당 토큰 버킷 + 일일 카운터. RateLimiter의 lock 안에서만 사용."""
+
+    def __init__(self, rpm: int, rpd: int):
+        self.rpm       = rpm
+        self.rpd       = rpd
+        self.tokens    = float(rpm)
+        self.updated   = time.time()
+        self.day_used  = 0
+        self.day_reset = _next_utc_midnight(self.updated)
+        self.day_limit = 0   # 오늘 알게 된 실제 일일 한도 (0 = 모름 → rpd) — 리셋 때 비움
+        self.models: dict[str, int] = {}  # 오늘(UTC) 모델별 요청 수
+        self.models_day = _utc_day(self.updated)
+
+    @property
+    def day_cap(self) -> int:
+        """판단에 쓰는 일일 한도 (0 = 제한 없음)"""
+        return self.day_limit or self.rpd
+
+    def row(self) -> tuple:
+        return self.tokens, self.updated, self.day_used, self.day_reset, self.day_limit
+
+    def _refill(self, now: float) -> None:
+        if now >= self.day_reset:
+            # 헤더로 알게 된 한도는 다음 응답 헤더가 다시 알려 줌 —
+            # 429로 추정한 한도가 rpd=0(제한 없음)을 영구히 덮지 않도록 리셋 때 비운다
+            self.day_used  = 0
+            self.day_limit = 0
+            self.day_reset = _next_utc_midnight(now)
+        self.tokens  = min(float(self.rpm), self.tokens + (now - self.updated) * self.rpm / 60)
+        self.updated = now
+
+    def day_exhausted(self, now: float) -> bool:
+        self._refill(now)
+        return self.day_cap > 0 and self.day_used >= self.day_cap
+
+    def available(self, now: float) -> bool:
+        return not self.day_exhausted(now) and self.tokens >= 1
+
+    def take(self, now: float) -> bool:
+        if not self.available(now):
+            return False
+        self.tokens   -= 1
+        self.day_used += 1
+        return True
+
+    def refund(self, now: float) -> None:
+        self._refill(now)
+        self.tokens   = min(float(self.rpm), self.tokens + 1)
+        self.day_used = max(0, self.day_used - 1)
+
+    def observe(self, limit: int, remaining: int, reset_at: float) -> None:
+        """업스트림이 알려 준 일일 한도 상태가 우리 집계보다 우선"""
+        self.day_limit = limit
+        self.day_used  = limit - remaining
+        self.day_reset = reset_at
+
+    def exhaust(self, now: float, reset_at: float | None) -> None:
+        """
+        429 일일 한도 소진 — 리셋 시각까지 소진으로 예측.
+        한도를 모르면(rpd=0 · 헤더 없음) 지금 사용량을 오늘만의 한도로 — 리셋 뒤에는 다시 제한 없음.
+        """
+        self._refill(now)
+        if not self.day_cap:
+            self.day_limit = max(self.day_used, 1)
+        self.day_used = max(self.day_used, self.day_cap)
+        if reset_at:
+            self.day_reset = reset_at
+
+    def count_model(self, model: str, now: float) -> None:
+        day = _utc_day(now)
+        if day != self.models_day:
+            self.models, self.models_day = {}, day
+        self.models[model] = self.models.get(model, 0) + 1
+
+    def next_token_in(self, now: float) -> float:
+        """다음 토큰까지 남은 초 (일일 한도 소진이면 자정까지)"""
+        if self.day_exhausted(now):
+            return self.day_reset - now
+        return max(0.0, (1 - self.tokens) * 60 / self.rpm)
+
+
+class Ticket:
+    """요청 1건의 대기 순번표"""
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.id = next(self._ids)
+
+
+class RateLimiter:
+    """
+    keys: key_fingerprint 목록. rpm · rpd가 0이면 그 한도는 검사하지 않음.
+    try_acquire / refund 로 시도 단위 토큰을, wait 로 대기열을 다룬다. thread-safe.
+    """
+
+    def __init__(self, keys: list, rpm: int = 20, rpd: int = 50, shared=None):
+        self.rpm      = rpm
+        self.rpd      = rpd
+        self._shared  = shared
+        self._cond    = threading.Condition()
+        self._buckets = {k: KeyBucket(rpm or 10 ** 9, rpd) for k in keys}
+        self._queue: deque[Ticket] = deque()
+
+    # ── 공유 버킷 (lock 안에서 호출) ─────────────────────────
+    def _load(self, key: str, row: tuple | None) -> None:
+        if row is not None:
+            b = self._buckets[key]
+            b.tokens, b.updated, b.day_used, b.day_reset, b.day_limit = row
+
+    def _pull(self, keys: list) -> None:
+        """다른 프로세스가 쓴 토큰까지 반영된 버킷으로 갱신 (읽기 전용)"""
+        if self._shared is not None:
+            for k in keys:
+                self._load(k, self._shared.bucket(k))
+
+    def _apply(self, key: str, fn):
+        """버킷에 fn(bucket)을 적용. 공유 중이면 최신 행을 잠근 채 읽고 고쳐 씀."""
+        b = self._buckets[key]
+        if self._shared is None:
+            return fn(b)
+
+        def mutate(row):
+            self._load(key, row)
+            result = fn(b)
+            return b.row(), result
+
+        return self._shared.update_bucket(key, mutate)
+
+    def try_acquire(self, key: str, ticket: Ticket) -> bool:
+        """
+        이 Key로 요청 1회를 보낼 수 있으면 토큰을 쓰고 True.
+        줄이 있으면 맨 앞 표만 가져갈 수 있고, 가져가면 줄에서 빠진다.
+        """
+        now = time.time()
+        with self._cond:
+            if self._queue and self._queue[0] is not ticket:
+                return False
+            if not self._apply(key, lambda b: b.take(now)):
+                return False
+            if self._queue:
+                self._queue.popleft()
+                self._cond.notify_all()
+            return True
+
+    def refund(self, key: str) -> None:
+        """토큰을 썼지만 요청을 보내지 않았을 때 (헬스 레지스트리가 막은 경우 등)"""
+        with self._cond:
+            now = time.time()
+            self._apply(key, lambda b: b.refund(now))
+            self._cond.notify_all()
+
+    def count_model(self, key: str, model: str) -> None:
+        """요청을 실제로 보냄 — 모델별 오늘 사용량에 추가"""
+        now = time.time()
+        with self._cond:
+            self._buckets[key].count_model(model, now)
+            if self._shared is not None:
+                self._shared.count_model(key, model, _utc_day(now))
+
+    def observe(self, key: str, headers) -> None:
+        """응답 · 오류 헤더에 일일 한도 정보가 있으면 반영"""
+        now   = time.time()
+        quota = daily_quota_headers(headers, now)
+        if quota is None:
+            return
+        with self._cond:
+            self._apply(key, lambda b: b.observe(*quota))
+            self._cond.notify_all()
+
+    def exhaust(self, key: str, reset_in: float | None = None) -> None:
+        """429 일일 한도 소진 — reset_in: 헤더로 알게 된 리셋까지 남은 초"""
+        now = time.time()
+        with self._cond:
+            self._apply(key, lambda b: b.exhaust(now, now + reset_in if reset_in else None))
+            self._cond.notify_all()
+
+    def day_exhausted(self, key: str) -> bool:
+        """오늘 한도를 다 쓴 것으로 예측되는 Key — 로테이션에서 보내 보지 않고 건너뜀"""
+        now = time.time()
+        with self._cond:
+            self._pull([key])
+            return self._buckets[key].day_exhausted(now)
+
+    def leave(self, ticket: Ticket) -> None:
+        """요청이 끝났거나 중단됨 — 줄에 남아 있으면 뺀다"""
+        with self._cond:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+    def _eta(self, position: int, keys: list, now: float) -> float:
+        """순번(0부터) 앞의 요청이 모두 토큰을 받고 내 차례가 올 때까지 예상 초"""
+        live = [self._buckets[k] for k in keys if not self._buckets[k].day_exhausted(now)]
+        if not live:
+            return min(self._buckets[k].day_reset for k in keys) - now
+        ready = sum(int(b.tokens) for b in live)
+        rate  = sum(b.rpm for b in live) / 60
+        return max(min(b.next_token_in(now) for b in live), (position + 1 - ready) / rate)
+
+    def wait(self, ticket: Ticket, keys: list, timeout: float, on_wait=None) -> bool:
+        """
+        줄을 서서 맨 앞이 되고 keys 중 하나에 토큰이 생길 때까지 대기.
+        on_wait(순번, 예상 대기초)는 lock 밖에서 약 1초마다 호출.
+        timeout 안에 차례가 안 오거나, 모든 Key가 일일 한도로 막혀 있으면 줄에서 빠지고 False.
+        """
+        deadline = time.time() + timeout
+        try:
+            while True:
+                now = time.time()
+                with self._cond:
+                    if ticket not in self._queue:
+                        self._queue.append(ticket)
+                    position = self._queue.index(ticket)
+                    self._pull(keys)
+                    if position == 0 and any(self._buckets[k].available(now) for k in keys):
+                        return True
+                    if all(self._buckets[k].day_exhausted(now) for k in keys):
+                        self._queue.remove(ticket)
+                        self._cond.notify_all()
+                        return False
+                    eta = self._eta(position, keys, now)
+                if now + eta > deadline or now >= deadline:
+                    self.leave(ticket)
+                    return False
+                if on_wait is not None:
+                    on_wait(position + 1, eta)
+                with self._cond:
+                    self._cond.wait(timeout=min(1.0, max(0.05, eta)))
+        except BaseException:
+            self.leave(ticket)  # rerun 등으로 스크립트가 중단되면 뒷사람을 막지 않도록
+            raise
+
+    def eta(self, keys: list) -> float:
+        """지금 줄을 서면 예상 대기초 — 대기 불가 안내용"""
+        now = time.time()
+        with self._cond:
+            self._pull(keys)
+            return self._eta(len(self._queue), keys, now)
+
+    def status(self, key: str) -> dict:
+        """
+        사이드바 표시용 — 분당 남은 수 · 오늘 쓴 수 · 일일 한도 · 남은 수 ·
+        리셋까지 남은 초 · 모델별 오늘 요청 수 · 대기열 길이 (한도가 없으면 None)
+        """
+        now = time.time()
+        with self._cond:
+            self._pull([key])
+            b = self._buckets[key]
+            b._refill(now)
+            if self._shared is not None:
+                models = self._shared.model_counts(key, _utc_day(now))
+            else:
+                models = dict(b.models) if b.models_day == _utc_day(now) else {}
+            return {
+                "minute_left": int(b.tokens) if self.rpm else None,
+                "day_used":    b.day_used,
+                "day_limit":   b.day_cap or None,
+                "day_left":    max(0, b.day_cap - b.day_used) if b.day_cap else None,
+                "reset_in":    max(0.0, b.day_reset - now),
+                "models":      models,
+                "queue":       len(self._queue),
+            }
@@ -0,0 +1,228 @@
+"""
+응답 캐시 (SQLite)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+같은 질문에는 무료 한도를 쓰지 않고 저장된 답을 바로 돌려준다.
+
+  · 정확 일치: 시스템 프롬프트 + 정규화한 대화(요약 포함) + 모델 → sha256 키
+  · 유사 일치: 대화 첫 질문만 — 글자 bigram Jaccard ≥ near_threshold 이면 적중
+  · 축출: TTL이 지난 항목 삭제 + 전체 크기가 max_bytes를 넘으면 LRU 순 삭제
+
+정규화: NFKC · 소문자 · 공백 축약 · 끝 문장부호 제거
+  ("SEO 전략 알려줘?" == "seo  전략 알려줘")
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    prompt_hash TEXT NOT NULL,   -- 시스템 프롬프트 해시 (유사 일치 범위)
+    model       TEXT NOT NULL,
+    question    TEXT,            -- 첫 턴일 때만: 정규화한 질문 (유사 일치용)
+    answer      TEXT NOT NULL,
+    bytes       INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    last_used   REAL NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_lru   ON responses(last_used);
+CREATE INDEX IF NOT EXISTS idx_responses_first ON responses(prompt_hash, question)
+    WHERE question IS NOT NULL;
+"""
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?!.~…")
+
+
+def _bigrams(text: str) -> set:
+    s = text.replace(" ", "")
+    return {s[i:i + 2] for i in range(len(s) - 1)} or {s}
+
+
+def _similarity(a: str, b: str) -> float:
+    ga, gb = _bigrams(a), _bigrams(b)
+    return len(ga & gb) / len(ga | gb)
+
+
+def _split(messages: list) -> tuple[str, list]:
+    """(시스템 프롬프트, 나머지 메시지) — 요약 등 추가 system 메시지는 대화 쪽에 포함"""
+    if messages and messages[0]["role"] == "system":
+        return messages[0]["content"], messages[1:]
+    return "", messages
+
+
+def _first_question(conversation: list) -> str | None:
+    """대화가 첫 질문 하나뿐이면 정규화한 질문, 아니면 None"""
+    if len(conversation) == 1 and conversation[0]["role"] == "user":
+        return normalize(conversation[0]["content"])
+    return None
+
+
+def _sha(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+
+def _request_parts(messages: list) -> tuple[str, list]:
+    """키에 쓰는 요청 부분 — (시스템 프롬프트 해시, 정규화한 대화)"""
+    system, conversation = _split(messages)
+    return (
+        hashlib.sha256(system.encode()).hexdigest(),
+        [(m["role"], normalize(m["content"])) for m in conversation],
+    )
+
+
+def flight_key(messages: list, streaming: bool) -> str:
+    """
+    진행 중인 같은 요청 합치기(singleflight)용 키 — 응답 캐시 키와 같은 정규화, 모델은 빼고
+    스트리밍 여부만 넣는다. 모델은 호출이 고르므로, 카탈로그가 갱신돼 모델 목록이 바뀌어도
+    같은 요청은 같은 키.
+    """
+    return _sha(*_request_parts(messages), "stream" if streaming else "plain")
+
+
+class ResponseCache:
+    """
+    디스크 기반 응답 캐시. 프로세스 안에서 연결 하나를 lock으로 공유 (thread-safe).
+    lookup / put 외에 stats()로 적중률·절약 바이트를 제공.
+    """
+
+    def __init__(
+        self,
+        path:           str,
+        max_bytes:      int   = 50 * 1024 * 1024,
+        ttl:            float = 7 * 24 * 3600,
+        near_threshold: float = 0.9,   # 0이면 유사 일치 끔
+        near_scan:      int   = 500,   # 유사 일치 때 비교할 최근 항목 수
+    ):
+        self.max_bytes      = max_bytes
+        self.ttl            = ttl
+        self.near_threshold = near_threshold
+        self.near_scan      = near_scan
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lookups = self._hits = self._near_hits = self._bytes_saved = 0
+
+    @staticmethod
+    def make_key(messages: list, model: str) -> str:
+        return _sha(*_request_parts(messages), model)
+
+    def lookup(self, messages: list, models: list) -> tuple[str, str] | None:
+        """
+        models(선호 순) 중 하나로 저장된 답이 있으면 (answer, model).
+        정확 일치를 먼저 보고, 첫 질문이면 유사 일치까지 확인.
+        """
+        now = time.time()
+        system, conversation = _split(messages)
+        keys = {self.make_key(messages, m): m for m in models}
+        with self._lock:
+            self._lookups += 1
+            rows = self._db.execute(
+                f"SELECT key, answer, model FROM responses "
+                f"WHERE key IN ({','.join('?' * len(keys))}) AND created > ?",
+                [*keys, now - self.ttl],
+            ).fetchall()
+            if rows:
+                rows.sort(key=lambda r: models.index(r[2]))
+                return self._hit(rows[0][0], rows[0][1], rows[0][2], now)
+
+            question = _first_question(conversation)
+            if question is None or self.near_threshold <= 0:
+                return None
+            candidates = self._db.execute(
+                "SELECT key, answer, model, question FROM responses "
+                "WHERE prompt_hash = ? AND question IS NOT NULL AND created > ? "
+                "ORDER BY last_used DESC LIMIT ?",
+                (hashlib.sha256(system.encode()).hexdigest(), now - self.ttl, self.near_scan),
+            ).fetchall()
+            best, best_score = None, self.near_threshold
+            for key, answer, model, cand in candidates:
+                if model not in keys.values():
+                    continue
+                score = _similarity(question, cand)
+                if score >= best_score:
+                    best, best_score = (key, answer, model), score
+            if best is None:
+                return None
+            self._near_hits += 1
+            return self._hit(*best, now)
+
+    def has(self, messages: list, models: list) -> bool:
+        """정확 일치 답이 있는지만 확인 (적중 통계 · LRU 순서에 반영 안 함 — 미리 받기용)"""
+        keys = [self.make_key(messages, m) for m in models]
+        with self._lock:
+            return self._db.execute(
+                f"SELECT 1 FROM responses WHERE key IN ({','.join('?' * len(keys))}) AND created > ? LIMIT 1",
+                [*keys, time.time() - self.ttl],
+            ).fetchone() is not None
+
+    def _hit(self, key: str, answer: str, model: str, now: float) -> tuple[str, str]:
+        self._hits += 1
+        self._bytes_saved += len(answer.encode())
+        self._db.execute(
+            "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key),
+        )
+        return answer, model
+
+    def put(self, messages: list, model: str, answer: str) -> None:
+        """정상 완료된 답변만 저장. 저장 후 TTL·용량 기준으로 축출."""
+        now = time.time()
+        system, conversation = _split(messages)
+        size = len(answer.encode())
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, prompt_hash, model, question, answer, bytes, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.make_key(messages, model),
+                    hashlib.sha256(system.encode()).hexdigest(),
+                    model, _first_question(conversation), answer, size, now, now,
+                ),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 90%까지 LRU 순으로 삭제 — 매 put마다 축출하지 않도록 여유를 둔다
+        excess = total - int(self.max_bytes * 0.9)
+        freed  = 0
+        doomed = []
+        for key, size in self._db.execute("SELECT key, bytes FROM responses ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM responses"
+            ).fetchone()
+            return {
+                "lookups":     self._lookups,
+                "hits":        self._hits,
+                "near_hits":   self._near_hits,
+                "hit_rate":    self._hits / self._lookups if self._lookups else 0.0,
+                "bytes_saved": self._bytes_saved,
+                "entries":     entries,
+                "bytes":       size,
+            }
@@ -0,0 +1,167 @@
+"""
+지연 시간 기반 모델 라우터
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+실제 요청 결과로 모델별 EWMA 통계를 유지하고 예상 응답 시간이 짧은 순으로
+모델을 고른다. 프로세스 전체(모든 세션)가 공유.
+
+통계 (모델별 EWMA)
+  ttft          첫 토큰까지(초) — 스트리밍 호출에서만
+  tps           초당 출력 토큰
+  error_rate    404 · 과부하 · 연결 오류 비율
+  timeout_rate  타임아웃 비율
+한도 문제(분당 · 일일 한도, 크레딧)는 Key 사정이고 요청 자체 오류는 모델 탓이
+아니므로 제외 — 그쪽은 헬스 레지스트리가 차단으로 처리.
+
+예상 시간 = (ttft + expected_tokens / tps + 실패 비용) / 성공 확률
+  실패 비용 = error_rate × ERROR_COST + timeout_rate × TIMEOUT_COST
+
+탐색: 실패율은 마지막 기록 이후 half_life마다 절반으로 줄어 회복한 모델이
+자연히 다시 올라오고, 추가로 explore 확률만큼 1순위가 아닌 모델
+(표본이 적거나 오래된 모델 우선)을 맨 앞에 세워 다시 측정한다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from health import DAILY_LIMIT, OTHER, PAYMENT, RATE_LIMITED, TIMEOUT
+
+ERROR_COST   = 2.0    # 실패 한 번에 잃는 시간(초) — 빠른 오류 응답 + 전환
+TIMEOUT_COST = 30.0   # 타임아웃 한 번에 잃는 시간(초)
+MIN_SAMPLES  = 3      # 이보다 표본이 적으면 탐색 우선 대상
+
+_NOT_MODEL_FAULT = {RATE_LIMITED, PAYMENT, DAILY_LIMIT, OTHER}
+
+
+@dataclass
+class ModelStats:
+    ttft:         float | None = None
+    tps:          float | None = None
+    error_rate:   float = 0.0
+    timeout_rate: float = 0.0
+    samples:      int   = 0      # 성공 + 실패 기록 수
+    updated:      float = 0.0    # 마지막 기록 시각 (epoch 초)
+
+
+class LatencyRouter:
+    """
+    rank(models) → 예상 시간 순 모델 목록 (+ 탐색으로 앞세운 모델).
+    record_success / record_failure 로 통계를 갱신. thread-safe.
+    """
+
+    def __init__(
+        self,
+        alpha:           float = 0.3,    # EWMA 가중치 (클수록 최근 값 위주)
+        explore:         float = 0.1,    # 탐색 확률
+        half_life:       float = 600.0,  # 실패율 반감기(초)
+        stale_after:     float = 900.0,  # 이보다 오래 측정 안 된 모델은 탐색 우선
+        expected_tokens: int   = 600,    # 답변 길이 가정 (토큰)
+        prior_ttft:      float = 3.0,    # 측정 전 모델의 가정값
+        prior_tps:       float = 30.0,
+    ):
+        self.alpha           = alpha
+        self.explore         = explore
+        self.half_life       = half_life
+        self.stale_after     = stale_after
+        self.expected_tokens = expected_tokens
+        self.prior_ttft      = prior_ttft
+        self.prior_tps       = prior_tps
+        self._lock  = threading.Lock()
+        self._stats: dict[str, ModelStats] = {}
+
+    # ── 기록 ─────────────────────────────────────────────────
+    def _ewma(self, old: float | None, new: float) -> float:
+        return new if old is None else self.alpha * new + (1 - self.alpha) * old
+
+    def _decay(self, s: ModelStats, now: float) -> None:
+        """마지막 기록 이후 지난 시간만큼 실패율을 줄임"""
+        if s.updated:
+            f = 0.5 ** ((now - s.updated) / self.half_life)
+            s.error_rate   *= f
+            s.timeout_rate *= f
+        s.updated = now
+
+    def record_success(
+        self, model: str, ttft: float | None, total: float | None = None, tokens: int = 0,
+    ) -> None:
+        """
+        ttft:   첫 토큰까지(초). 일반 호출처럼 모를 때는 None
+        total:  전체 소요(초) — tokens와 함께 주면 생성 속도를 갱신
+        """
+        now = time.time()
+        with self._lock:
+            s = self._stats.setdefault(model, ModelStats())
+            self._decay(s, now)
+            s.samples     += 1
+            s.error_rate   = self._ewma(s.error_rate, 0.0)
+            s.timeout_rate = self._ewma(s.timeout_rate, 0.0)
+            if ttft is not None:
+                s.ttft = self._ewma(s.ttft, ttft)
+            if total is not None and tokens > 0:
+                gen = total - (ttft or 0.0)
+                if gen > 0.2:  # 너무 짧은 생성 구간은 속도 추정이 불안정
+                    s.tps = self._ewma(s.tps, tokens / gen)
+
+    def record_failure(self, model: str, kind: str) -> None:
+        if kind in _NOT_MODEL_FAULT:
+            return
+        now = time.time()
+        with self._lock:
+            s = self._stats.setdefault(model, ModelStats())
+            self._decay(s, now)
+            s.samples     += 1
+            s.error_rate   = self._ewma(s.error_rate, 0.0 if kind == TIMEOUT else 1.0)
+            s.timeout_rate = self._ewma(s.timeout_rate, 1.0 if kind == TIMEOUT else 0.0)
+
+    # ── 선택 ─────────────────────────────────────────────────
+    def _score(self, s: ModelStats | None, now: float) -> float:
+        """예상 응답 시간(초) — 작을수록 좋음"""
+        if s is None:
+            s = ModelStats()
+        f = 0.5 ** ((now - s.updated) / self.half_life) if s.updated else 1.0
+        err, tmo = s.error_rate * f, s.timeout_rate * f
+        ttft = s.ttft if s.ttft is not None else self.prior_ttft
+        tps  = s.tps  if s.tps  is not None else self.prior_tps
+        ok   = max(0.05, 1.0 - err - tmo)
+        return (ttft + self.expected_tokens / tps + err * ERROR_COST + tmo * TIMEOUT_COST) / ok
+
+    def rank(self, models: list) -> tuple[list, str | None]:
+        """
+        models를 예상 시간 순으로 정렬. 같으면 입력 순서(카탈로그 선호 순) 유지.
+        Returns: (정렬된 모델 목록, 탐색으로 앞세운 모델 | None)
+        """
+        now = time.time()
+        with self._lock:
+            scores = {m: self._score(self._stats.get(m), now) for m in models}
+            under  = [
+                m for m in models
+                if (s := self._stats.get(m)) is None
+                or s.samples < MIN_SAMPLES or now - s.updated > self.stale_after
+            ]
+        ranked = sorted(models, key=scores.__getitem__)
+        if len(ranked) < 2 or random.random() >= self.explore:
+            return ranked, None
+        pick = random.choice([m for m in under if m != ranked[0]] or ranked[1:])
+        ranked.remove(pick)
+        return [pick, *ranked], pick
+
+    def snapshot(self, models: list) -> list[dict]:
+        """사이드바 표시용 — 예상 시간 순"""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for m in models:
+                s = self._stats.get(m)
+                f = 0.5 ** ((now - s.updated) / self.half_life) if s and s.updated else 1.0
+                rows.append({
+                    "model":        m,
+                    "score":        self._score(s, now),
+                    "ttft":         s.ttft if s else None,
+                    "tps":          s.tps if s else None,
+                    "error_rate":   s.error_rate * f if s else 0.0,
+                    "timeout_rate": s.timeout_rate * f if s else 0.0,
+                    "samples":      s.samples if s else 0,
+                })
+        return sorted(rows, key=lambda r: r["score"])
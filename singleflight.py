@@ -0,0 +1,167 @@
+"""
+진행 중인 같은 요청 합치기 (single-flight)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+수업 · 팀에서 여러 세션이 몇 초 사이에 같은 첫 질문을 보내면 업스트림 호출 1번을 함께 쓴다.
+응답 캐시는 답이 끝난 뒤부터 적중하므로, 그 전에 겹친 요청은 여기서 합친다.
+
+  · 같은 키(정규화한 요청)로 진행 중인 호출이 있으면 새로 보내지 않고 합류
+  · 업스트림 호출은 별도 스레드(flight)에서 돌고, 부분 답변 · 추론 과정 · 대기열 순번 · 전환 알림을
+    기록만 한다. 대기자는 각자 자기 스레드에서 그 기록을 받아 자기 화면에 그린다
+    (Streamlit 호출은 그 세션의 스크립트 스레드에서만 가능). 늦게 합류해도 그때까지의 답변부터 받음
+  · 결과 · 예외는 모든 대기자에게 똑같이 전달
+  · 합류자는 진행 중인 호출의 설정(context)을 join 콜백으로 고칠 수 있다 — 엔진은 더 넉넉한 설정으로 넓힘
+  · 대기자가 떠나면(rerun · 중단 등 예외) 그 대기자만 빠진다.
+    모두 떠나면 업스트림 호출도 다음 콜백에서 FlightCancelled로 중단
+
+끝난 호출은 바로 목록에서 빠진다 — 이후 같은 질문은 응답 캐시가 맡는다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import threading
+
+
+class FlightCancelled(Exception):
+    """모든 대기자가 떠나 업스트림 호출을 중단함"""
+
+
+class Flight:
+    """진행 중인 호출 1건. 필드는 cond 안에서만 읽고 쓴다."""
+
+    def __init__(self):
+        self.cond      = threading.Condition()
+        self.text      = ""      # 누적 부분 답변
+        self.version   = 0       # text가 바뀐 횟수
+        self.reasoning = ""      # 누적 추론 과정 (추론 모델)
+        self.wait_info = None    # 대기열 (순번, 예상 대기초)
+        self.notices   = []      # 전환 알림 (문구, 아이콘)
+        self.result    = None
+        self.error     = None    # 호출이 던진 예외
+        self.done      = False
+        self.cancelled = False
+        self.waiters   = 0
+        self.context   = None    # 첫 호출자가 넘긴 설정 — 합류자가 join으로 고칠 수 있음
+
+
+class SingleFlight:
+    """
+    call(key, start, on_delta, on_wait, notify, on_reasoning) → (start의 반환값, 합류 여부).
+    start(on_delta, on_wait, notify, on_reasoning)는 실제 호출 — 첫 요청만 flight 스레드에서 실행된다.
+    context는 첫 호출자의 설정으로 flight에 남고, 합류자는 join(그 context)으로 고칠 수 있다.
+    thread-safe.
+    """
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._flights: dict[str, Flight] = {}
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def call(
+        self, key: str, start, on_delta=None, on_wait=None, notify=None, on_reasoning=None,
+        context=None, join=None,
+    ):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                with flight.cond:
+                    if flight.cancelled:  # 마지막 대기자가 막 떠남 — 새로 보냄
+                        flight = None
+                    else:
+                        flight.waiters += 1
+                        if join is not None:
+                            join(flight.context)
+            joined = flight is not None
+            if not joined:
+                flight = self._flights[key] = Flight()
+                flight.waiters = 1
+                flight.context = context
+        if not joined:
+            threading.Thread(
+                target=self._run, args=(key, flight, start), name="single-flight", daemon=True,
+            ).start()
+        return self._follow(key, flight, on_delta, on_wait, notify, on_reasoning), joined
+
+    # ── flight 스레드 ────────────────────────────────────────
+    def _run(self, key: str, flight: Flight, start) -> None:
+        # 기록은 이 스레드만 쓰므로 이전 값(version · notices)은 lock 밖에서 읽어도 된다
+        def publish(**changes):
+            with flight.cond:
+                if flight.cancelled:
+                    raise FlightCancelled()
+                for name, value in changes.items():
+                    setattr(flight, name, value)
+                flight.cond.notify_all()
+
+        def on_delta(text):
+            publish(text=text, version=flight.version + 1)
+
+        def on_wait(position, eta):
+            publish(wait_info=(position, eta))
+
+        def notify(text, icon):
+            publish(notices=flight.notices + [(text, icon)])
+
+        def on_reasoning(text):
+            publish(reasoning=text)
+
+        try:
+            result, error = start(on_delta, on_wait, notify, on_reasoning), None
+        except BaseException as e:
+            result, error = None, e
+        self._forget(key, flight)
+        with flight.cond:
+            flight.result, flight.error, flight.done = result, error, True
+            flight.cond.notify_all()
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    # ── 대기자 ───────────────────────────────────────────────
+    def _follow(self, key: str, flight: Flight, on_delta, on_wait, notify, on_reasoning):
+        """flight가 끝날 때까지 기록을 받아 이 대기자의 콜백으로 전달 (콜백은 lock 밖에서)"""
+        version, notices, wait_info, reasoning = 0, 0, None, ""
+        try:
+            while True:
+                with flight.cond:
+                    while not flight.done and (
+                        flight.version, len(flight.notices), flight.wait_info, flight.reasoning,
+                    ) == (version, notices, wait_info, reasoning):
+                        flight.cond.wait()
+                    done       = flight.done
+                    text       = flight.text
+                    new_notes  = flight.notices[notices:]
+                    changed    = flight.version != version
+                    new_wait   = flight.wait_info != wait_info
+                    thought    = flight.reasoning != reasoning
+                    version, notices, wait_info = flight.version, len(flight.notices), flight.wait_info
+                    reasoning  = flight.reasoning
+                if notify is not None:
+                    for note in new_notes:
+                        notify(*note)
+                if new_wait and on_wait is not None and not text and wait_info is not None:
+                    on_wait(*wait_info)
+                if thought and on_reasoning is not None:
+                    on_reasoning(reasoning)
+                if changed and on_delta is not None:
+                    on_delta(text)
+                if done:
+                    break
+        except BaseException:
+            self._leave(key, flight)
+            raise
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _leave(self, key: str, flight: Flight) -> None:
+        """대기자 1명이 결과를 기다리지 않고 떠남 — 마지막이었으면 호출 중단"""
+        with flight.cond:
+            flight.waiters -= 1
+            if flight.waiters or flight.done:
+                return
+            flight.cancelled = True
+        self._forget(key, flight)  # 이후 같은 요청은 새로 보냄
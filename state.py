@@ -0,0 +1,141 @@
+"""
+프로세스 간 공유 상태 (SQLite)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+한 호스트에서 streamlit 워커 여러 개 · 배치 작업이 같은 Key를 쓸 때
+각자 따로 세던 상태를 파일 하나로 맞춘다.
+
+  breakers : 헬스 레지스트리의 열린 서킷 브레이커 (범위 · 연속 실패 · 차단 종료 시각)
+             → 한 워커가 받은 429/404를 다른 워커도 바로 피함
+  buckets  : 요청 한도의 Key별 분당 토큰 · 일일 사용량 · 헤더로 알게 된 일일 한도
+             → 워커 수와 상관없이 Key 한도를 함께 나눠 씀 (재시작해도 일일 사용량 유지)
+  usage    : Key × 모델별 오늘(UTC) 요청 수 — 표시용
+
+모델 카탈로그는 스냅샷 파일(MODEL_CATALOG_PATH)을 공유한다 (catalog.py).
+
+각 프로세스는 메모리 사본을 쓰고, 다른 연결이 커밋했을 때만(PRAGMA data_version)
+다시 읽는다. 버킷은 BEGIN IMMEDIATE 트랜잭션 안에서 읽고 고쳐 써서 토큰이 겹쳐 나가지 않는다.
+대기열 순서 · half-open 탐침 예약은 프로세스 안에서만 관리한다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS breakers (
+    scope      TEXT PRIMARY KEY,   -- JSON: ["key", k] · ["model", m] · ["pair", k, m]
+    failures   INTEGER NOT NULL,
+    open_until REAL NOT NULL,      -- epoch 초
+    kind       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    key       TEXT PRIMARY KEY,    -- key_fingerprint
+    tokens    REAL NOT NULL,       -- 분당 버킷에 남은 토큰
+    updated   REAL NOT NULL,       -- tokens를 마지막으로 채운 시각
+    day_used  INTEGER NOT NULL,
+    day_reset REAL NOT NULL,       -- day_used가 0이 되는 시각 (업스트림 리셋 시각 · 모르면 다음 UTC 자정)
+    day_limit INTEGER NOT NULL DEFAULT 0  -- 응답 헤더로 알게 된 일일 한도 (0 = 모름)
+);
+CREATE TABLE IF NOT EXISTS usage (
+    key   TEXT NOT NULL,
+    model TEXT NOT NULL,
+    day   TEXT NOT NULL,           -- UTC 날짜 (YYYY-MM-DD)
+    count INTEGER NOT NULL,
+    PRIMARY KEY (key, model)
+);
+"""
+
+
+class SharedState:
+    """공유 상태 파일 하나에 대한 연결. 프로세스 안에서는 lock으로 공유 (thread-safe)."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path  = path
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(buckets)")}
+        if "day_limit" not in columns:  # 이전 버전 파일
+            self._db.execute("ALTER TABLE buckets ADD COLUMN day_limit INTEGER NOT NULL DEFAULT 0")
+
+    def version(self) -> int:
+        """다른 연결(다른 프로세스)이 커밋할 때마다 바뀌는 값 — 이 연결의 쓰기로는 바뀌지 않음"""
+        with self._lock:
+            return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    # ── 서킷 브레이커 ────────────────────────────────────────
+    def breakers(self) -> dict:
+        """{scope 튜플: (failures, open_until, kind)}"""
+        with self._lock:
+            rows = self._db.execute("SELECT scope, failures, open_until, kind FROM breakers").fetchall()
+        return {tuple(json.loads(scope)): (failures, until, kind) for scope, failures, until, kind in rows}
+
+    def put_breaker(self, scope: tuple, failures: int, open_until: float, kind: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO breakers (scope, failures, open_until, kind) VALUES (?, ?, ?, ?)",
+                (json.dumps(scope, ensure_ascii=False), failures, open_until, kind),
+            )
+
+    def clear_breakers(self, scopes: list) -> None:
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM breakers WHERE scope = ?",
+                [(json.dumps(s, ensure_ascii=False),) for s in scopes],
+            )
+
+    # ── 요청 한도 버킷 ───────────────────────────────────────
+    def bucket(self, key: str) -> tuple | None:
+        """(tokens, updated, day_used, day_reset, day_limit) — 아직 없으면 None"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT tokens, updated, day_used, day_reset, day_limit FROM buckets WHERE key = ?", (key,),
+            ).fetchone()
+
+    def update_bucket(self, key: str, mutate):
+        """
+        버킷 행을 잠근 채 mutate(행 | None) → (새 행, 결과)를 적용하고 결과를 반환.
+        여러 프로세스가 동시에 토큰을 가져가도 한 번에 하나씩 처리된다.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT tokens, updated, day_used, day_reset, day_limit FROM buckets WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                new_row, result = mutate(row)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated, day_used, day_reset, day_limit) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, *new_row),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return result
+
+    # ── 모델별 사용량 ────────────────────────────────────────
+    def count_model(self, key: str, model: str, day: str) -> None:
+        """오늘(day) 이 Key × 모델 요청 1회 추가 — 날짜가 바뀌었으면 1부터"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO usage (key, model, day, count) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (key, model) DO UPDATE SET "
+                "count = CASE WHEN day = excluded.day THEN count + 1 ELSE 1 END, day = excluded.day",
+                (key, model, day),
+            )
+
+    def model_counts(self, key: str, day: str) -> dict:
+        """{모델: 오늘 요청 수}"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT model, count FROM usage WHERE key = ? AND day = ?", (key, day),
+            ).fetchall()
+        return dict(rows)
@@ -0,0 +1,138 @@
+"""
+대화 저장소 (SQLite)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+대화를 서버 메모리(session_state)가 아닌 디스크에 메시지 단위로 쌓는다.
+재시작 · 재배포 후에도 URL의 대화 id(?c=...)로 이어서 볼 수 있다.
+
+  conversations : 대화 id · 누적 요약 · 요약에 반영된 메시지 수
+  messages      : (대화 id, 순번) 당 한 행 — 추가만 하고 고치지 않음
+
+대화 id는 추측하기 어려운 무작위 토큰이며 URL을 아는 사람은 그 대화를 볼 수 있다.
+WAL 모드라 여러 세션이 동시에 읽고 쓸 수 있다.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id           TEXT PRIMARY KEY,
+    created      REAL NOT NULL,
+    updated      REAL NOT NULL,
+    summary      TEXT NOT NULL DEFAULT '',
+    summary_upto INTEGER NOT NULL DEFAULT 0   -- messages 순번 < summary_upto 는 요약에 반영됨
+);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    seq             INTEGER NOT NULL,          -- 대화 안에서 0부터
+    role            TEXT NOT NULL,
+    content         TEXT NOT NULL,
+    meta            TEXT,                      -- JSON (timing 등), 없으면 NULL
+    created         REAL NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+) WITHOUT ROWID;
+"""
+
+_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def new_conversation_id() -> str:
+    return secrets.token_urlsafe(12)
+
+
+def valid_conversation_id(cid) -> bool:
+    """URL에서 받은 값이 대화 id 형식인지 (형식만 — 존재 여부는 따지지 않음)"""
+    return isinstance(cid, str) and bool(_ID_PATTERN.match(cid))
+
+
+class ConversationStore:
+    """
+    대화 저장소. 프로세스 안에서 연결 하나를 lock으로 공유 (thread-safe).
+    메시지는 {"role", "content", ...meta} 형식의 dict로 주고받는다.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def append(self, cid: str, message: dict) -> int:
+        """메시지 한 개를 대화 끝에 추가하고 순번을 반환. 대화가 없으면 만든다."""
+        now  = time.time()
+        meta = {k: v for k, v in message.items() if k not in ("role", "content")}
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO conversations (id, created, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET updated = excluded.updated",
+                    (cid, now, now),
+                )
+                seq = self._db.execute(
+                    "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conversation_id = ?",
+                    (cid,),
+                ).fetchone()[0]
+                self._db.execute(
+                    "INSERT INTO messages (conversation_id, seq, role, content, meta, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        cid, seq, message["role"], message["content"],
+                        json.dumps(meta, ensure_ascii=False) if meta else None, now,
+                    ),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return seq
+
+    def count(self, cid: str) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (cid,),
+            ).fetchone()[0]
+
+    def page(self, cid: str, start: int, end: int | None = None) -> list:
+        """순번 start 이상 end 미만 메시지 (end=None이면 끝까지)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content, meta FROM messages "
+                "WHERE conversation_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (cid, start, end if end is not None else 2 ** 62),
+            ).fetchall()
+        return [
+            {"role": role, "content": content, **(json.loads(meta) if meta else {})}
+            for role, content, meta in rows
+        ]
+
+    def load_state(self, cid: str) -> dict:
+        """이어 보기용 — 누적 요약 · 요약 경계 · 메시지 수 (없는 대화면 빈 상태)"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, summary_upto FROM conversations WHERE id = ?", (cid,),
+            ).fetchone()
+            count = self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (cid,),
+            ).fetchone()[0]
+        summary, upto = row if row else ("", 0)
+        return {"summary": summary, "summary_upto": upto, "count": count}
+
+    def save_summary(self, cid: str, summary: str, summary_upto: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO conversations (id, created, updated, summary, summary_upto) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                "updated = excluded.updated, summary = excluded.summary, "
+                "summary_upto = excluded.summary_upto",
+                (cid, now, now, summary, summary_upto),
+            )